@@ -0,0 +1,136 @@
+import os
+import csv
+import glob
+import time
+import argparse
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from pose_estimation import ACTION_LEVELS, DEFAULT_CHUNK_SIZE, score_csv_file
+
+def find_capture_files(input_path, pattern='*_pos.csv'):
+    """
+    Find the capture CSV files to score.
+    input_path is either a directory, searched for files matching pattern, or a glob.
+    """
+    input_path = os.path.expanduser(input_path)
+    if os.path.isdir(input_path):
+        input_path = os.path.join(input_path, pattern)
+    return sorted(glob.glob(input_path, recursive=True))
+
+def capture_root(input_path):
+    """
+    The directory that the files found by find_capture_files are named relative to:
+    input_path itself if it is a directory, else the directory part of a glob before
+    its first wildcard.
+    """
+    input_path = os.path.expanduser(input_path)
+    if os.path.isdir(input_path):
+        return input_path
+    wildcard = min((input_path.index(c) for c in '*?[' if c in input_path), default=len(input_path))
+    return os.path.dirname(input_path[:wildcard]) or '.'
+
+def result_path_for(csv_file_path, output_dir, output_format='columnar', root=None):
+    # PLNS01P01R01_pos.csv -> <output_dir>/PLNS01P01R01_pos_ergonomic_risk_scores[.csv]
+    # Files in subdirectories of root keep them in their name, so that captures with
+    # the same name in different directories do not overwrite each other:
+    # S01/PLNS01P01R01_pos.csv -> <output_dir>/S01__PLNS01P01R01_pos_ergonomic_risk_scores
+    relative_path = os.path.relpath(csv_file_path, root) if root else os.path.basename(csv_file_path)
+    stem = os.path.splitext(relative_path)[0].replace(os.sep, '__')
+    extension = '.csv' if output_format == 'csv' else ''
+    return os.path.join(output_dir, f'{stem}_ergonomic_risk_scores{extension}')
+
+def score_capture_file(csv_file_path, output_path, chunk_size):
+    """
+    Score one capture file in a worker process.
+    Returns the scoring summary together with the worker's pid and the elapsed time.
+    """
+    start_time = time.perf_counter()
+    summary = score_csv_file(csv_file_path, output_path, chunk_size)
+    summary['seconds'] = time.perf_counter() - start_time
+    summary['worker'] = os.getpid()
+    return summary
+
+def write_summary(summary_path, summaries):
+    """
+    Write the merged summary, one row per scored capture file.
+    """
+    with open(summary_path, mode='w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['File', 'Frames', 'Mean Risk Score', 'Max Risk Score'] +
+                        list(ACTION_LEVELS) + ['Seconds', 'Frames/s'])
+        for csv_file_path, summary in sorted(summaries.items()):
+            frames = summary['frames']
+            writer.writerow([csv_file_path, frames,
+                             f"{summary['score_sum'] / frames:.3f}" if frames else '',
+                             summary['max_score']] +
+                            summary['action_level_counts'].tolist() +
+                            [f"{summary['seconds']:.3f}",
+                             f"{frames / summary['seconds']:.1f}" if summary['seconds'] else ''])
+
+def main(input_path, output_dir, pattern='*_pos.csv', workers=None, chunk_size=DEFAULT_CHUNK_SIZE,
+         output_format='columnar'):
+    csv_file_paths = find_capture_files(input_path, pattern)
+    if not csv_file_paths:
+        print(f"No capture files found for {input_path}")
+        return
+    root = capture_root(input_path)
+    result_paths = {csv_file_path: result_path_for(csv_file_path, output_dir, output_format, root)
+                    for csv_file_path in csv_file_paths}
+    if len(set(result_paths.values())) < len(result_paths):
+        raise ValueError("Several capture files map to the same result path; rename them or score them separately")
+    os.makedirs(output_dir, exist_ok=True)
+    print(f"Scoring {len(csv_file_paths)} capture files...")
+
+    start_time = time.perf_counter()
+    summaries = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(score_capture_file, csv_file_path, result_paths[csv_file_path],
+                            chunk_size): csv_file_path
+            for csv_file_path in csv_file_paths
+        }
+        for future in as_completed(futures):
+            csv_file_path = futures[future]
+            try:
+                summaries[csv_file_path] = future.result()
+            except Exception as e:
+                print(f"An error occurred while processing {csv_file_path}: {e}")
+                continue
+            print(f"Scored {csv_file_path}: {summaries[csv_file_path]['frames']} frames")
+    elapsed = time.perf_counter() - start_time
+
+    write_summary(os.path.join(output_dir, 'ergonomic_risk_summary.csv'), summaries)
+
+    # Report the throughput of every worker process
+    worker_frames = defaultdict(int)
+    worker_seconds = defaultdict(float)
+    for summary in summaries.values():
+        worker_frames[summary['worker']] += summary['frames']
+        worker_seconds[summary['worker']] += summary['seconds']
+    for worker in sorted(worker_frames):
+        print(f"Worker {worker}: {worker_frames[worker]} frames, "
+              f"{worker_frames[worker] / max(worker_seconds[worker], 1e-9):.1f} frames/s")
+    total_frames = sum(worker_frames.values())
+    print(f"Scored {total_frames} frames from {len(summaries)} files in {elapsed:.2f} s "
+          f"({total_frames / max(elapsed, 1e-9):.1f} frames/s overall)")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Calculate ergonomic risk scores for a directory of capture CSV files.')
+    parser.add_argument('input_path', help='Directory or glob of input CSV files containing pose data')
+    parser.add_argument('--output-dir', default='ergonomic_risk_scores',
+                        help='Directory to write the per-file results and the merged summary to')
+    parser.add_argument('--pattern', default='*_pos.csv',
+                        help='File pattern to match when input_path is a directory')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of worker processes (defaults to the number of CPUs)')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help='Number of frames to parse and score at a time')
+    parser.add_argument('--format', choices=['columnar', 'csv'], default='columnar',
+                        help='Output format of the per-file results')
+
+    # Parse the command-line arguments
+    args = parser.parse_args()
+
+    main(args.input_path, os.path.expanduser(args.output_dir), args.pattern, args.workers, args.chunk_size,
+         args.format)
@@ -0,0 +1,269 @@
+from itertools import islice
+import numpy as np
+
+from landmarks import CSV_LANDMARK_MAPPING, NUM_LANDMARKS
+
+# Number of frames whose rotation matrices are materialized at a time
+DEFAULT_BLOCK_SIZE = 4096
+
+# Per-axis templates of an elementary rotation: R = fixed + cos(angle) * cos_part + sin(angle) * sin_part
+_ROTATION_FIXED = np.array([np.diag([1.0, 0.0, 0.0]), np.diag([0.0, 1.0, 0.0]), np.diag([0.0, 0.0, 1.0])])
+_ROTATION_COS = np.array([np.diag([0.0, 1.0, 1.0]), np.diag([1.0, 0.0, 1.0]), np.diag([1.0, 1.0, 0.0])])
+_ROTATION_SIN = np.array([
+    [[0, 0, 0], [0, 0, -1], [0, 1, 0]],
+    [[0, 0, 1], [0, 0, 0], [-1, 0, 0]],
+    [[0, -1, 0], [1, 0, 0], [0, 0, 0]],
+], dtype=np.float64)
+
+class BvhSkeleton:
+    """
+    Joint hierarchy of a BVH file, precomputed for forward kinematics.
+    Joints are kept in file order (parents before children); end sites are joints
+    named '<parent>_Nub' without channels, as in pymo. The channel layout of a MOTION
+    frame is resolved once into index arrays: for every joint, the columns of its
+    position channels and of its three rotation channels with their axes in the
+    order they are applied.
+    """
+    def __init__(self, joint_names, parents, offsets, channels):
+        self.joint_names = list(joint_names)
+        self.parents = np.asarray(parents, dtype=np.intp)
+        self.offsets = np.asarray(offsets, dtype=np.float64).reshape(-1, 3)
+        self.channels = [list(joint_channels) for joint_channels in channels]
+        self.num_channels = sum(len(joint_channels) for joint_channels in self.channels)
+
+        num_joints = len(self.joint_names)
+        self._position_joints = []
+        self._position_axes = []
+        self._position_columns = []
+        # Joints without rotation channels rotate by 0 degrees, i.e. not at all
+        self._rotation_axes = np.zeros((num_joints, 3), dtype=np.intp)
+        self._rotation_columns = np.full((num_joints, 3), -1, dtype=np.intp)
+        column = 0
+        for joint, joint_channels in enumerate(self.channels):
+            rotation = 0
+            for channel in joint_channels:
+                axis = 'XYZ'.index(channel[0].upper())
+                if channel[1:].lower() == 'position':
+                    self._position_joints.append(joint)
+                    self._position_axes.append(axis)
+                    self._position_columns.append(column)
+                elif channel[1:].lower() == 'rotation':
+                    if rotation == 3:
+                        raise ValueError(f"Joint {self.joint_names[joint]} has more than three rotation channels")
+                    self._rotation_axes[joint, rotation] = axis
+                    self._rotation_columns[joint, rotation] = column
+                    rotation += 1
+                else:
+                    raise ValueError(f"Unknown BVH channel: {channel}")
+                column += 1
+
+        # Joints grouped by depth in the hierarchy; each level is transformed in one batch
+        depths = np.zeros(num_joints, dtype=np.intp)
+        for joint in range(num_joints):
+            if self.parents[joint] >= 0:
+                if self.parents[joint] >= joint:
+                    raise ValueError("BVH joints must come after their parents")
+                depths[joint] = depths[self.parents[joint]] + 1
+        self._levels = [np.flatnonzero(depths == depth) for depth in range(1, depths.max(initial=0) + 1)]
+        self._roots = np.flatnonzero(self.parents < 0)
+
+    def joint_index(self, joint_name):
+        return self.joint_names.index(joint_name)
+
+    def local_transforms(self, motion):
+        """
+        Local rotation matrices (N_frames, N_joints, 3, 3) and translations
+        (N_frames, N_joints, 3) of an (N_frames, N_channels) block of MOTION frames.
+        """
+        motion = np.asarray(motion, dtype=np.float64)
+        num_frames = len(motion)
+
+        translations = np.broadcast_to(self.offsets, (num_frames,) + self.offsets.shape).copy()
+        translations[:, self._position_joints, self._position_axes] += motion[:, self._position_columns]
+
+        # One batched product of the three elementary rotations of every joint,
+        # composed in channel order (the first listed rotation is the outermost)
+        angles = np.where(self._rotation_columns >= 0,
+                          np.radians(motion[:, np.maximum(self._rotation_columns, 0)]), 0.0)
+        cos = np.cos(angles)[..., None, None]
+        sin = np.sin(angles)[..., None, None]
+        elementary = (_ROTATION_FIXED[self._rotation_axes] + cos * _ROTATION_COS[self._rotation_axes] +
+                      sin * _ROTATION_SIN[self._rotation_axes])
+        rotations = elementary[:, :, 0] @ elementary[:, :, 1] @ elementary[:, :, 2]
+        return rotations, translations
+
+    def forward_kinematics(self, motion, block_size=DEFAULT_BLOCK_SIZE):
+        """
+        World positions (N_frames, N_joints, 3) of every joint for an
+        (N_frames, N_channels) array of MOTION frames. Frames are processed in blocks
+        of block_size so the rotation matrices of long takes never all exist at once.
+        """
+        motion = np.asarray(motion, dtype=np.float64).reshape(-1, self.num_channels)
+        positions = np.empty((len(motion), len(self.joint_names), 3))
+        for start in range(0, len(motion), block_size):
+            positions[start:start + block_size] = self._forward_kinematics_block(motion[start:start + block_size])
+        return positions
+
+    def _forward_kinematics_block(self, motion):
+        rotations, translations = self.local_transforms(motion)
+        world_rotations = np.empty_like(rotations)
+        world_positions = np.empty_like(translations)
+        world_rotations[:, self._roots] = rotations[:, self._roots]
+        world_positions[:, self._roots] = translations[:, self._roots]
+        for joints in self._levels:
+            parent_rotations = world_rotations[:, self.parents[joints]]
+            world_rotations[:, joints] = parent_rotations @ rotations[:, joints]
+            world_positions[:, joints] = (world_positions[:, self.parents[joints]] +
+                                          np.einsum('fjab,fjb->fja', parent_rotations, translations[:, joints]))
+        return world_positions
+
+    def landmark_layout(self):
+        """
+        Joint indices and PoseLandmark indices for positions_to_landmarks: the joints
+        named like the capture CSV columns in CSV_LANDMARK_MAPPING.
+        """
+        joints = []
+        landmarks = []
+        for joint_name, pose_landmark in CSV_LANDMARK_MAPPING.items():
+            if joint_name in self.joint_names:
+                joints.append(self.joint_index(joint_name))
+                landmarks.append(pose_landmark)
+        return np.array(joints, dtype=np.intp), np.array(landmarks, dtype=np.intp)
+
+    def positions_to_landmarks(self, positions):
+        """
+        Lay out (N_frames, N_joints, 3) world positions like landmarks_to_array and
+        read_landmark_chunks do for the capture CSV files: an (N_frames, N_landmarks, 3)
+        array indexed by PoseLandmark, with NaN for landmarks without a joint.
+        """
+        joints, landmarks = self.landmark_layout()
+        result = np.full((len(positions), NUM_LANDMARKS, 3), np.nan)
+        result[:, landmarks] = positions[:, joints]
+        return result
+
+    def landmarks(self, motion, block_size=DEFAULT_BLOCK_SIZE):
+        """
+        Forward kinematics of MOTION frames straight into the scorer's landmark layout.
+        Only the joints on the way to a mapped landmark need to be transformed, but the
+        hierarchy is small, so all joints are.
+        """
+        return self.positions_to_landmarks(self.forward_kinematics(motion, block_size))
+
+def parse_bvh_hierarchy(lines):
+    """
+    Parse the HIERARCHY section of a BVH file from an iterator of lines.
+    Consumes lines up to and including the MOTION keyword and returns a BvhSkeleton.
+    """
+    joint_names = []
+    parents = []
+    offsets = []
+    channels = []
+    stack = []
+    pending_name = None
+    for line in lines:
+        tokens = line.split()
+        if not tokens:
+            continue
+        keyword = tokens[0].upper()
+        if keyword == 'HIERARCHY':
+            continue
+        if keyword == 'MOTION':
+            if stack:
+                raise ValueError("Unbalanced braces in BVH hierarchy")
+            return BvhSkeleton(joint_names, parents, offsets, channels)
+        if keyword in ('ROOT', 'JOINT'):
+            pending_name = tokens[1]
+        elif keyword == 'END':
+            pending_name = f'{joint_names[stack[-1]]}_Nub'
+        elif keyword == '{':
+            joint_names.append(pending_name)
+            parents.append(stack[-1] if stack else -1)
+            offsets.append((0.0, 0.0, 0.0))
+            channels.append(())
+            stack.append(len(joint_names) - 1)
+        elif keyword == '}':
+            stack.pop()
+        elif keyword == 'OFFSET':
+            offsets[stack[-1]] = tuple(float(value) for value in tokens[1:4])
+        elif keyword == 'CHANNELS':
+            channels[stack[-1]] = tuple(tokens[2:2 + int(tokens[1])])
+        else:
+            raise ValueError(f"Unexpected line in BVH hierarchy: {line.strip()}")
+    raise ValueError("BVH file has no MOTION section")
+
+class BvhMotionReader:
+    """
+    Streaming reader of a BVH file. The HIERARCHY is parsed once on opening; iterating
+    the reader then yields the MOTION frames as (N_frames, N_channels) float64 blocks
+    of up to block_size frames, parsing one block at a time. Memory is bounded by
+    the block size, so captures larger than RAM can be processed as a pipeline.
+    """
+    def __init__(self, bvh_file_path, block_size=DEFAULT_BLOCK_SIZE):
+        self.block_size = block_size
+        self._file = open(bvh_file_path)
+        try:
+            self.skeleton = parse_bvh_hierarchy(self._file)
+            self.num_frames = int(self._read_header_value('Frames'))
+            self.frame_time = float(self._read_header_value('Frame Time'))
+        except Exception:
+            self._file.close()
+            raise
+
+    def _read_header_value(self, name):
+        line = next(self._file, '')
+        key, _, value = line.partition(':')
+        if key.strip().lower() != name.lower():
+            raise ValueError(f"Expected '{name}:' in BVH MOTION header, got: {line.strip()}")
+        return value
+
+    def __iter__(self):
+        remaining = self.num_frames
+        while remaining > 0:
+            lines = [line for line in islice(self._file, min(self.block_size, remaining)) if line.strip()]
+            if not lines:
+                return
+            block = np.loadtxt(lines, dtype=np.float64, ndmin=2)
+            if block.shape[1] != self.skeleton.num_channels:
+                raise ValueError(f"BVH frame has {block.shape[1]} values, expected {self.skeleton.num_channels}")
+            remaining -= len(block)
+            yield block
+
+    def positions(self):
+        """
+        Yield the world positions (N_frames, N_joints, 3) of every block of frames.
+        """
+        for motion in self:
+            yield self.skeleton.forward_kinematics(motion, self.block_size)
+
+    def landmarks(self):
+        """
+        Yield every block of frames in the scorer's landmark layout (see BvhSkeleton.landmarks).
+        """
+        for motion in self:
+            yield self.skeleton.landmarks(motion, self.block_size)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def read_bvh_header(bvh_file_path):
+    """
+    Read only the header of a BVH file. Returns (skeleton, num_frames, frame_time).
+    """
+    with BvhMotionReader(bvh_file_path) as reader:
+        return reader.skeleton, reader.num_frames, reader.frame_time
+
+def read_bvh(bvh_file_path, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Read a whole BVH file. Returns (skeleton, motion, frame_time), where motion is the
+    (N_frames, N_channels) array of MOTION frames.
+    """
+    with BvhMotionReader(bvh_file_path, block_size) as reader:
+        blocks = list(reader)
+        motion = np.concatenate(blocks) if blocks else np.empty((0, reader.skeleton.num_channels))
+        return reader.skeleton, motion, reader.frame_time
@@ -0,0 +1,83 @@
+import os
+import logging
+import argparse
+
+from bvh_kinematics import DEFAULT_BLOCK_SIZE, BvhMotionReader
+from pose_estimation import ACTION_LEVELS, COMPONENT_NAMES, score_landmark_chunks
+from risk_rules import RULA_RULE_TABLE, RULE_TABLES
+
+logger = logging.getLogger(__name__)
+
+def score_bvh_file(bvh_file_path, output_path='ergonomic_risk_scores', block_size=DEFAULT_BLOCK_SIZE,
+                   trace_path=None, smoothing=None, exposure=None, rule_table=RULA_RULE_TABLE):
+    """
+    Score every frame of a BVH capture without an intermediate position CSV file.
+    MOTION frames are streamed in blocks of block_size, converted to landmarks with
+    forward kinematics and scored block by block, so memory does not grow with the
+    length of the capture. See score_landmark_chunks for the output and the summary.
+    """
+    with BvhMotionReader(bvh_file_path, block_size) as reader:
+        logger.info("%s: %d joints, %d frames at %.1f fps", bvh_file_path, len(reader.skeleton.joint_names),
+                    reader.num_frames, 1.0 / reader.frame_time if reader.frame_time else 0.0)
+        return score_landmark_chunks(reader.landmarks(), output_path, trace_path, smoothing, exposure, rule_table)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Process a BVH file and calculate ergonomic risk scores.')
+    parser.add_argument('bvh_file_path', help='Path to the input BVH file')
+    parser.add_argument('--output', default='ergonomic_risk_scores',
+                        help='Path to write the risk scores to. Outputs are written as a columnar '
+                             'directory of binary columns by default, which is compact and fast to load '
+                             'for long captures; paths ending in .csv are written as CSV text instead')
+    parser.add_argument('--block-size', type=int, default=DEFAULT_BLOCK_SIZE,
+                        help='Number of frames to parse and score at a time')
+    parser.add_argument('--rules', choices=sorted(RULE_TABLES), default='rula',
+                        help='Rule table to score the frames with; rula3d also uses the z coordinate')
+    parser.add_argument('--smoothing', choices=['none', 'median', 'ema'], default='none',
+                        help='Temporal smoothing applied to the frame-level risk scores')
+    parser.add_argument('--window', type=int, default=5,
+                        help='Window of the rolling median or EMA, in frames')
+    parser.add_argument('--min-frames', type=int, default=1,
+                        help='Frames a new action level must persist before it is reported')
+    parser.add_argument('--exposure', default=None,
+                        help='Write time-at-risk per action level and component to this CSV file, '
+                             'using the frame time of the BVH file')
+    parser.add_argument('--exposure-hop', type=float, default=60.0,
+                        help='Seconds between exposure records')
+    parser.add_argument('--exposure-window', type=float, default=None,
+                        help='Seconds covered by each exposure record (a multiple of --exposure-hop; '
+                             'defaults to tumbling windows of --exposure-hop)')
+    parser.add_argument('--trace', default=None,
+                        help='Write per-frame trace records (JSON lines) to this file')
+    parser.add_argument('-v', '--verbose', action='count', default=0,
+                        help='Log progress (-v) or per-block diagnostics (-vv)')
+
+    # Parse the command-line arguments
+    args = parser.parse_args()
+    logging.basicConfig(level=[logging.WARNING, logging.INFO, logging.DEBUG][min(args.verbose, 2)],
+                        format='%(levelname)s %(name)s: %(message)s')
+
+    rule_table = RULE_TABLES[args.rules]
+    if args.exposure and (rule_table.component_names != COMPONENT_NAMES or rule_table.action_levels != ACTION_LEVELS):
+        parser.error("--exposure is only available for the RULA-based rules")
+    bvh_file_path = os.path.expanduser(args.bvh_file_path)
+
+    smoothing = None
+    if args.smoothing != 'none' or args.min_frames > 1:
+        from risk_smoothing import RiskSmoothingStage
+        smoothing = RiskSmoothingStage(args.smoothing, args.window, args.min_frames,
+                                       rule_table.action_level_thresholds)
+
+    exposure = None
+    if args.exposure:
+        from bvh_kinematics import read_bvh_header
+        from risk_exposure import ExposureStage
+        _, _, frame_time = read_bvh_header(bvh_file_path)
+        fps = 1.0 / frame_time
+        hop_frames = max(int(round(args.exposure_hop * fps)), 1)
+        window_frames = hop_frames * max(int(round((args.exposure_window or args.exposure_hop) / args.exposure_hop)), 1)
+        exposure = ExposureStage(os.path.expanduser(args.exposure), fps, hop_frames, window_frames)
+
+    summary = score_bvh_file(bvh_file_path, args.output, args.block_size, args.trace, smoothing, exposure, rule_table)
+    if exposure is not None:
+        exposure.close()
+    logger.info("Processed %d frames", summary['frames'])
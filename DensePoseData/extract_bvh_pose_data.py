@@ -1,38 +1,182 @@
-from pymo.parsers import BVHParser
-from pymo.preprocessing import *
-from pymo.viz_tools import *
 import os
+import glob
+import time
+import hashlib
+import argparse
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-def extract_pose_data_from_bvh(bvh_file_path):
+from bvh_kinematics import read_bvh
+
+# Bumped whenever the cached positions change for the same BVH file
+CACHE_VERSION = 2
+
+# Default directory for cached joint positions
+DEFAULT_CACHE_DIR = '.bvh_position_cache'
+
+def file_sha1(path, block_size=1 << 20):
+    """
+    SHA-1 of a file's contents, read in blocks.
+    """
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+def cache_path_for(bvh_file_path, cache_dir):
+    # One cache file per BVH path: <cache_dir>/<stem>-<hash of the absolute path>.npz
+    stem = os.path.splitext(os.path.basename(bvh_file_path))[0]
+    path_hash = hashlib.sha1(os.path.abspath(bvh_file_path).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(cache_dir, f'{stem}-{path_hash}.npz')
+
+def compute_joint_positions(bvh_file_path, render_path=None):
+    """
+    Parse a BVH file and compute the world position of every joint with the
+    vectorized forward kinematics of bvh_kinematics.
+    Returns (positions, joint_names, frame_time): positions is an
+    (N_frames, N_joints, 3) float32 array in the order of joint_names.
+    If render_path is given, an animation of the capture is rendered there as well
+    with pymo (for debugging/verification only; it is slow).
+    """
+    skeleton, motion, frame_time = read_bvh(bvh_file_path)
+    positions = skeleton.forward_kinematics(motion).astype(np.float32)
+
+    if render_path:
+        from pymo.parsers import BVHParser
+        from pymo.viz_tools import render_mp4_from_bvh
+        parsed_data = BVHParser().parse(bvh_file_path)
+        render_mp4_from_bvh(parsed_data.skeleton, parsed_data.values, render_path)
+
+    return positions, skeleton.joint_names, frame_time
+
+def load_cached_positions(cache_path, bvh_file_path):
+    """
+    Return the cached (positions, joint_names, frame_time) of a BVH file, or None if
+    there is no valid cache entry. An entry is valid when the file's size and mtime
+    are unchanged or, failing that, when its contents still have the cached SHA-1;
+    the mtime of such an entry is refreshed so the next lookup skips the hashing.
+    """
+    if not os.path.exists(cache_path):
+        return None
     try:
-        # Parse the BVH file
-        parser = BVHParser()
-        parsed_data = parser.parse(bvh_file_path)
-
-        # Preprocess the data
-        # This can include filtering, down-sampling, etc.
-        # For now, we'll just convert it to a pandas DataFrame for easy manipulation
-        pp = MocapParameterizer('position')
-        processed_data = pp.fit_transform([parsed_data])
-
-        # Visualize the pose data (optional, for debugging/verification)
-        # This will create a simple animation of the motion capture data
-        skel = parsed_data.skeleton
-        anim = parsed_data.values
-        render_mp4_from_bvh(skel, anim, 'output_animation.mp4')
-
-        return processed_data
-    except Exception as e:
-        print(f"An error occurred while processing the BVH file: {e}")
+        with np.load(cache_path) as cache:
+            entry = {name: cache[name] for name in cache.files}
+    except (OSError, ValueError, EOFError):
         return None
+    if int(entry['version']) != CACHE_VERSION:
+        return None
+
+    stat = os.stat(bvh_file_path)
+    if int(entry['size']) != stat.st_size:
+        return None
+    if int(entry['mtime_ns']) != stat.st_mtime_ns:
+        if str(entry['sha1']) != file_sha1(bvh_file_path):
+            return None
+        entry['mtime_ns'] = np.int64(stat.st_mtime_ns)
+        save_cached_positions(cache_path, entry)
+    return entry['positions'], entry['joint_names'].tolist(), float(entry['frame_time'])
+
+def save_cached_positions(cache_path, entry):
+    # Write to a temporary file first so readers never see a partial entry
+    os.makedirs(os.path.dirname(cache_path) or '.', exist_ok=True)
+    temporary_path = f'{cache_path}.{os.getpid()}.tmp'
+    with open(temporary_path, 'wb') as file:
+        np.savez(file, **entry)
+    os.replace(temporary_path, cache_path)
+
+def extract_pose_data_from_bvh(bvh_file_path, cache_dir=DEFAULT_CACHE_DIR, render_path=None):
+    """
+    Joint positions of a BVH file as (positions, joint_names, frame_time), from the
+    cache in cache_dir if it is up to date, otherwise computed and cached.
+    Pass cache_dir=None to always compute. Rendering (render_path) forces a compute.
+    Returns the result and whether it came from the cache.
+    """
+    cache_path = cache_path_for(bvh_file_path, cache_dir) if cache_dir else None
+    if cache_path and not render_path:
+        cached = load_cached_positions(cache_path, bvh_file_path)
+        if cached is not None:
+            return cached, True
+
+    stat = os.stat(bvh_file_path)
+    positions, joint_names, frame_time = compute_joint_positions(bvh_file_path, render_path)
+    if cache_path:
+        save_cached_positions(cache_path, {
+            'version': np.int64(CACHE_VERSION),
+            'size': np.int64(stat.st_size),
+            'mtime_ns': np.int64(stat.st_mtime_ns),
+            'sha1': np.str_(file_sha1(bvh_file_path)),
+            'positions': positions,
+            'joint_names': np.array(joint_names),
+            'frame_time': np.float64(frame_time),
+        })
+    return (positions, joint_names, frame_time), False
+
+def extract_capture_file(bvh_file_path, cache_dir, render_dir=None):
+    """
+    Extract one BVH file in a worker process.
+    Returns the number of frames and joints, whether the cache was used and the elapsed time.
+    """
+    start_time = time.perf_counter()
+    render_path = None
+    if render_dir:
+        stem = os.path.splitext(os.path.basename(bvh_file_path))[0]
+        render_path = os.path.join(render_dir, f'{stem}.mp4')
+    (positions, joint_names, _), cached = extract_pose_data_from_bvh(bvh_file_path, cache_dir, render_path)
+    return {
+        'frames': len(positions),
+        'joints': len(joint_names),
+        'cached': cached,
+        'seconds': time.perf_counter() - start_time,
+    }
+
+def main(input_path, cache_dir=DEFAULT_CACHE_DIR, pattern='*.bvh', workers=None, render_dir=None):
+    input_path = os.path.expanduser(input_path)
+    if os.path.isdir(input_path):
+        input_path = os.path.join(input_path, pattern)
+    bvh_file_paths = sorted(glob.glob(input_path, recursive=True))
+    if not bvh_file_paths:
+        print(f"No BVH files found for {input_path}")
+        return
+    if render_dir:
+        os.makedirs(render_dir, exist_ok=True)
+
+    start_time = time.perf_counter()
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(extract_capture_file, bvh_file_path, cache_dir, render_dir): bvh_file_path
+            for bvh_file_path in bvh_file_paths
+        }
+        for future in as_completed(futures):
+            bvh_file_path = futures[future]
+            try:
+                results[bvh_file_path] = result = future.result()
+            except Exception as e:
+                print(f"Failed to extract pose data for {bvh_file_path}: {e}")
+                continue
+            print(f"Pose data {'loaded from cache' if result['cached'] else 'extracted'} for {bvh_file_path}: "
+                  f"{result['frames']} frames, {result['joints']} joints")
+
+    cached = sum(result['cached'] for result in results.values())
+    print(f"Extracted {len(results)} of {len(bvh_file_paths)} BVH files ({cached} from cache) "
+          f"in {time.perf_counter() - start_time:.2f} s")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Extract joint positions from BVH files.')
+    parser.add_argument('input_path', nargs='?', default='.',
+                        help='Directory or glob of BVH files (defaults to the current directory)')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR,
+                        help='Directory for the cached joint positions')
+    parser.add_argument('--pattern', default='*.bvh',
+                        help='File pattern to match when input_path is a directory')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of worker processes (defaults to the number of CPUs)')
+    parser.add_argument('--render-dir', default=None,
+                        help='Render an MP4 animation of every file to this directory (slow, for debugging)')
+
+    # Parse the command-line arguments
+    args = parser.parse_args()
 
-# Example usage:
-# Replace 'path_to_bvh_file.bvh' with the actual path to a BVH file
-# Assuming the AirplaneRiveting dataset is extracted in the current directory
-bvh_files = [file for file in os.listdir('.') if file.endswith('.bvh')]
-for bvh_file in bvh_files:
-    pose_data = extract_pose_data_from_bvh(bvh_file)
-    if pose_data is not None:
-        print(f"Pose data extracted for {bvh_file}")
-    else:
-        print(f"Failed to extract pose data for {bvh_file}")
+    main(args.input_path, os.path.expanduser(args.cache_dir), args.pattern, args.workers,
+         os.path.expanduser(args.render_dir) if args.render_dir else None)
@@ -1,28 +1,20 @@
-import ijson
 import pandas as pd
 
+from detectron.datasets.json_index import IndexedCOCO
+
 # Function to read and convert the first few entries of a large JSON file into a pandas DataFrame
 def inspect_json_file_to_df(file_path, num_entries=5):
     print(f"Opening file: {file_path}")  # Diagnostic print
-    data = {'images': [], 'annotations': []}  # Initialize a dictionary to hold our data
-
-    with open(file_path, 'rb') as file:
-        print("File opened successfully.")  # Diagnostic print
-
-        # Use ijson to iteratively parse the JSON file and add data to our dictionary
-        images = ijson.items(file, 'images.item')
-        for i, image in enumerate(images):
-            if i >= num_entries:
-                break
-            data['images'].append(image)
-
-        # Move back to the beginning of the file to parse annotations
-        file.seek(0)
-        annotations = ijson.items(file, 'annotations.item')
-        for i, annotation in enumerate(annotations):
-            if i >= num_entries:
-                break
-            data['annotations'].append(annotation)
+
+    # The byte-offset index is built in a single pass over the file the first time
+    # (and saved next to it), after which any entry is read without parsing the rest
+    coco = IndexedCOCO(file_path)
+    print("File indexed successfully.")  # Diagnostic print
+
+    data = {
+        'images': coco.loadImgs(coco.getImgIds()[:num_entries]),
+        'annotations': coco.loadAnns(coco.getAnnIds()[:num_entries]),
+    }
 
     # Convert the lists in our dictionary to pandas DataFrames
     images_df = pd.DataFrame(data['images'])
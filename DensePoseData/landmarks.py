@@ -0,0 +1,38 @@
+from enum import IntEnum
+
+# The 33 landmarks of a MediaPipe pose, numbered like mediapipe.solutions.pose.PoseLandmark
+# so that landmark arrays can be laid out without importing MediaPipe
+PoseLandmark = IntEnum('PoseLandmark', [(name, index) for index, name in enumerate((
+    'NOSE',
+    'LEFT_EYE_INNER', 'LEFT_EYE', 'LEFT_EYE_OUTER',
+    'RIGHT_EYE_INNER', 'RIGHT_EYE', 'RIGHT_EYE_OUTER',
+    'LEFT_EAR', 'RIGHT_EAR',
+    'MOUTH_LEFT', 'MOUTH_RIGHT',
+    'LEFT_SHOULDER', 'RIGHT_SHOULDER',
+    'LEFT_ELBOW', 'RIGHT_ELBOW',
+    'LEFT_WRIST', 'RIGHT_WRIST',
+    'LEFT_PINKY', 'RIGHT_PINKY',
+    'LEFT_INDEX', 'RIGHT_INDEX',
+    'LEFT_THUMB', 'RIGHT_THUMB',
+    'LEFT_HIP', 'RIGHT_HIP',
+    'LEFT_KNEE', 'RIGHT_KNEE',
+    'LEFT_ANKLE', 'RIGHT_ANKLE',
+    'LEFT_HEEL', 'RIGHT_HEEL',
+    'LEFT_FOOT_INDEX', 'RIGHT_FOOT_INDEX',
+))])
+
+# Number of landmarks in a MediaPipe pose; batch arrays are indexed by PoseLandmark
+NUM_LANDMARKS = len(PoseLandmark)
+
+# Mapping of CSV column names to MediaPipe PoseLandmark enum names
+CSV_LANDMARK_MAPPING = {
+    'RightShoulder': PoseLandmark.RIGHT_SHOULDER,  # Add mapping for right shoulder
+    'RightArm': PoseLandmark.RIGHT_ELBOW,
+    'RightForeArm': PoseLandmark.RIGHT_WRIST,
+    'RightHand': PoseLandmark.RIGHT_INDEX,  # Assuming RightHand corresponds to RIGHT_INDEX
+    'LeftShoulder': PoseLandmark.LEFT_SHOULDER,  # Add mapping for left shoulder
+    'LeftArm': PoseLandmark.LEFT_ELBOW,
+    'LeftForeArm': PoseLandmark.LEFT_WRIST,
+    'LeftHand': PoseLandmark.LEFT_INDEX,  # Assuming LeftHand corresponds to LEFT_INDEX
+    # ... other mappings as needed, following the same pattern
+}
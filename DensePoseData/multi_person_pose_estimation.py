@@ -0,0 +1,301 @@
+import os
+import time
+import logging
+import argparse
+import numpy as np
+import cv2
+
+from pose_estimation import ACTION_LEVELS, COMPONENT_NAMES, NUM_LANDMARKS, calculate_ergonomic_risk_batch, mp_pose
+from risk_output import open_risk_writer
+
+logger = logging.getLogger(__name__)
+
+def box_iou(boxes_a, boxes_b):
+    """
+    Intersection over union of every pair of (x1, y1, x2, y2) boxes, as an (N_a, N_b) array.
+    """
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(boxes_a[:, 2:] - boxes_a[:, :2], axis=1)
+    area_b = np.prod(boxes_b[:, 2:] - boxes_b[:, :2], axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.nan_to_num(intersection / (area_a[:, None] + area_b[None, :] - intersection))
+
+class HogPersonDetector:
+    """
+    Person boxes from OpenCV's built-in HOG people detector; needs no model files.
+    """
+    def __init__(self, score_threshold=0.5):
+        self.score_threshold = score_threshold
+        self.hog = cv2.HOGDescriptor()
+        self.hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+
+    def __call__(self, frame):
+        rects, weights = self.hog.detectMultiScale(frame, winStride=(8, 8))
+        if len(rects) == 0:
+            return np.zeros((0, 4))
+        rects = np.asarray(rects, dtype=np.float64)
+        boxes = np.concatenate([rects[:, :2], rects[:, :2] + rects[:, 2:]], axis=1)
+        return boxes[np.ravel(weights) >= self.score_threshold]
+
+class DetectronPersonDetector:
+    """
+    Person boxes from a Detectron model (e.g. DensePose or Keypoint R-CNN) through
+    im_detect_all. Caffe2 and Detectron are only imported when this detector is used.
+    """
+    def __init__(self, cfg_file, weights, score_threshold=0.7, gpu_id=0):
+        from caffe2.python import workspace
+        from detectron.core.config import assert_and_infer_cfg, cfg, merge_cfg_from_file
+        from detectron.utils.io import cache_url
+        import detectron.core.test_engine as infer_engine
+        import detectron.utils.c2 as c2_utils
+        import detectron.utils.keypoints as keypoint_utils
+
+        c2_utils.import_detectron_ops()
+        workspace.GlobalInit(['caffe2', '--caffe2_log_level=0'])
+        merge_cfg_from_file(cfg_file)
+        cfg.NUM_GPUS = 1
+        weights = cache_url(weights, cfg.DOWNLOAD_CACHE)
+        assert_and_infer_cfg(cache_urls=False)
+
+        self.score_threshold = score_threshold
+        self.gpu_id = gpu_id
+        self.infer_engine = infer_engine
+        self.c2_utils = c2_utils
+        self.person_index = keypoint_utils.get_person_class_index()
+        self.model = infer_engine.initialize_model_from_cfg(weights, gpu_id=gpu_id)
+
+    def __call__(self, frame):
+        with self.c2_utils.NamedCudaScope(self.gpu_id):
+            cls_boxes, _, _, _ = self.infer_engine.im_detect_all(self.model, frame, None)
+        boxes = cls_boxes[self.person_index]
+        return boxes[boxes[:, 4] >= self.score_threshold, :4]
+
+class MediaPipeCropLandmarks:
+    """
+    Per-person landmark extraction: runs MediaPipe pose on a padded crop around every
+    person box and maps the landmarks back to coordinates normalized to the full frame,
+    so the scoring thresholds mean the same as in single-person mode.
+    """
+    def __init__(self, padding=0.1, model_complexity=1):
+        self.padding = padding
+        self.pose = mp_pose.Pose(static_image_mode=True, model_complexity=model_complexity)
+
+    def __call__(self, frame, boxes):
+        height, width = frame.shape[:2]
+        landmarks = np.full((len(boxes), NUM_LANDMARKS, 3), np.nan)
+        padding = (boxes[:, 2:] - boxes[:, :2]) * self.padding
+        crops = np.concatenate([boxes[:, :2] - padding, boxes[:, 2:] + padding], axis=1)
+        crops = np.clip(np.round(crops), 0, [width, height, width, height]).astype(int)
+        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        for index, (x1, y1, x2, y2) in enumerate(crops):
+            if x2 <= x1 or y2 <= y1:
+                continue
+            results = self.pose.process(rgb[y1:y2, x1:x2])
+            if results.pose_landmarks is None:
+                continue
+            crop_landmarks = np.array([(landmark.x, landmark.y, landmark.z)
+                                       for landmark in results.pose_landmarks.landmark])
+            landmarks[index, :, 0] = (x1 + crop_landmarks[:, 0] * (x2 - x1)) / width
+            landmarks[index, :, 1] = (y1 + crop_landmarks[:, 1] * (y2 - y1)) / height
+            landmarks[index, :, 2] = crop_landmarks[:, 2]
+        return landmarks
+
+    def close(self):
+        self.pose.close()
+
+class IouTracker:
+    """
+    Lightweight tracker that greedily matches person boxes to the tracks of the
+    previous frame by IoU. Tracks that go unmatched for more than max_missed
+    frames are ended.
+    """
+    def __init__(self, iou_threshold=0.3, max_missed=15):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.next_track_id = 0
+        self.track_ids = np.zeros(0, dtype=np.int64)
+        self.boxes = np.zeros((0, 4))
+        self.missed = np.zeros(0, dtype=np.int64)
+
+    def update(self, boxes):
+        """
+        Assign a track id to every box; returns (track_ids, ended_track_ids).
+        """
+        iou = box_iou(self.boxes, boxes)
+        detection_track_ids = np.full(len(boxes), -1, dtype=np.int64)
+        matched_tracks = np.zeros(len(self.track_ids), dtype=bool)
+        for track_index, box_index in zip(*np.unravel_index(np.argsort(-iou, axis=None), iou.shape)):
+            if iou[track_index, box_index] < self.iou_threshold:
+                break
+            if matched_tracks[track_index] or detection_track_ids[box_index] >= 0:
+                continue
+            matched_tracks[track_index] = True
+            detection_track_ids[box_index] = self.track_ids[track_index]
+
+        # Start tracks for unmatched boxes
+        new_tracks = detection_track_ids < 0
+        detection_track_ids[new_tracks] = np.arange(self.next_track_id, self.next_track_id + new_tracks.sum())
+        self.next_track_id += int(new_tracks.sum())
+
+        # Age unmatched tracks and end the ones that have been missing for too long
+        missed = self.missed[~matched_tracks] + 1
+        ended = missed > self.max_missed
+        ended_track_ids = self.track_ids[~matched_tracks][ended]
+        self.track_ids = np.concatenate([detection_track_ids, self.track_ids[~matched_tracks][~ended]])
+        self.boxes = np.concatenate([boxes, self.boxes[~matched_tracks][~ended]])
+        self.missed = np.concatenate([np.zeros(len(boxes), dtype=np.int64), missed[~ended]])
+        return detection_track_ids, ended_track_ids
+
+class TrackState:
+    """
+    Output and streaming state of one tracked person: a risk writer plus its own
+    smoothing and exposure stages.
+    """
+    def __init__(self, output_path, smoothing=None, exposure=None):
+        self.writer = open_risk_writer(output_path, ACTION_LEVELS, COMPONENT_NAMES)
+        self.smoothing = smoothing
+        self.exposure = exposure
+
+    def write(self, frame_numbers, ergonomic_risk_scores, action_level_codes, components):
+        if self.smoothing is not None:
+            ergonomic_risk_scores, action_level_codes = self.smoothing(ergonomic_risk_scores)
+        self.writer.write(frame_numbers, ergonomic_risk_scores, action_level_codes, components)
+        if self.exposure is not None:
+            self.exposure(action_level_codes, components)
+
+    def close(self):
+        self.writer.close()
+        if self.exposure is not None:
+            self.exposure.close()
+
+class MultiPersonRiskScorer:
+    """
+    Score all tracked people of a frame in one vectorized call and route each
+    person's results to the state of their track. Every track is written to
+    '<output_dir>/track_<id>' (with '.csv' for the csv format), and gets its own
+    RiskSmoothingStage and ExposureStage when smoothing_options / exposure_options
+    (keyword arguments of those stages, without the path) are given.
+    """
+    def __init__(self, output_dir, output_format='columnar', smoothing_options=None, exposure_options=None):
+        os.makedirs(output_dir, exist_ok=True)
+        self.output_dir = output_dir
+        self.output_format = output_format
+        self.smoothing_options = smoothing_options
+        self.exposure_options = exposure_options
+        self.tracks = {}
+
+    def _track(self, track_id):
+        if track_id not in self.tracks:
+            smoothing = exposure = None
+            if self.smoothing_options is not None:
+                from risk_smoothing import RiskSmoothingStage
+                smoothing = RiskSmoothingStage(**self.smoothing_options)
+            if self.exposure_options is not None:
+                from risk_exposure import ExposureStage
+                exposure = ExposureStage(os.path.join(self.output_dir, f'track_{track_id}_exposure.csv'),
+                                         **self.exposure_options)
+            extension = '.csv' if self.output_format == 'csv' else ''
+            self.tracks[track_id] = TrackState(os.path.join(self.output_dir, f'track_{track_id}{extension}'),
+                                               smoothing, exposure)
+        return self.tracks[track_id]
+
+    def __call__(self, frame_number, track_ids, landmarks):
+        """
+        Score the (N_people, N_landmarks, 3) landmarks of one frame.
+        """
+        if not len(track_ids):
+            return
+        ergonomic_risk_scores, action_level_codes, components = calculate_ergonomic_risk_batch(
+            landmarks, return_components=True)
+        frame_numbers = np.array([frame_number])
+        for index, track_id in enumerate(track_ids.tolist()):
+            self._track(track_id).write(frame_numbers, ergonomic_risk_scores[index:index + 1],
+                                        action_level_codes[index:index + 1], components[index:index + 1])
+
+    def end_tracks(self, track_ids):
+        for track_id in track_ids.tolist():
+            if track_id in self.tracks:
+                self.tracks.pop(track_id).close()
+
+    def close(self):
+        self.end_tracks(np.array(list(self.tracks)))
+
+def run_multi_person(source, detector, landmark_extractor, scorer, tracker=None, max_frames=None):
+    """
+    Detect, track and score every person in a video file or camera, frame by frame.
+    """
+    tracker = tracker or IouTracker()
+    capture = cv2.VideoCapture(source)
+    frame_number = 0
+    people = 0
+    start_time = time.perf_counter()
+    try:
+        while max_frames is None or frame_number < max_frames:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            boxes = detector(frame)
+            track_ids, ended_track_ids = tracker.update(boxes)
+            scorer(frame_number, track_ids, landmark_extractor(frame, boxes))
+            scorer.end_tracks(ended_track_ids)
+            frame_number += 1
+            people += len(boxes)
+    finally:
+        capture.release()
+        scorer.close()
+    elapsed = time.perf_counter() - start_time
+    logger.info("Scored %d people over %d frames in %.2f s (%.1f frames/s, %d tracks)",
+                people, frame_number, elapsed, frame_number / max(elapsed, 1e-9), tracker.next_track_id)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Calculate ergonomic risk scores for every person in a video.')
+    parser.add_argument('source', help='Camera index or path to a video file')
+    parser.add_argument('--output-dir', default='multi_person_ergonomic_risk_scores',
+                        help='Directory to write one result per track to')
+    parser.add_argument('--format', choices=['columnar', 'csv'], default='columnar',
+                        help='Output format of the per-track results')
+    parser.add_argument('--detector', choices=['hog', 'detectron'], default='hog',
+                        help='Person detector: OpenCV HOG or a Detectron model')
+    parser.add_argument('--cfg', default=None, help='Detectron config file (/path/to/model_config.yaml)')
+    parser.add_argument('--wts', default=None, help='Detectron weights file (/path/to/model_weights.pkl)')
+    parser.add_argument('--score-threshold', type=float, default=None,
+                        help='Minimum detection score of a person box')
+    parser.add_argument('--max-frames', type=int, default=None, help='Stop after this many frames')
+    parser.add_argument('--smoothing', choices=['none', 'median', 'ema'], default='none',
+                        help='Temporal smoothing applied to the frame-level risk scores of every track')
+    parser.add_argument('--window', type=int, default=5,
+                        help='Window of the rolling median or EMA, in frames')
+    parser.add_argument('--min-frames', type=int, default=1,
+                        help='Frames a new action level must persist before it is reported')
+    parser.add_argument('--exposure-hop', type=float, default=None,
+                        help='Write per-track exposure records every this many seconds')
+
+    # Parse the command-line arguments
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s %(name)s: %(message)s')
+
+    source = int(args.source) if args.source.isdigit() else os.path.expanduser(args.source)
+    if args.detector == 'detectron':
+        detector = DetectronPersonDetector(args.cfg, args.wts, args.score_threshold or 0.7)
+    else:
+        detector = HogPersonDetector(args.score_threshold or 0.5)
+
+    smoothing_options = None
+    if args.smoothing != 'none' or args.min_frames > 1:
+        smoothing_options = {'method': args.smoothing, 'window': args.window, 'min_frames': args.min_frames}
+    exposure_options = None
+    if args.exposure_hop:
+        capture = cv2.VideoCapture(source)
+        fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+        capture.release()
+        exposure_options = {'fps': fps, 'hop_frames': max(int(round(args.exposure_hop * fps)), 1)}
+
+    scorer = MultiPersonRiskScorer(os.path.expanduser(args.output_dir), args.format,
+                                   smoothing_options, exposure_options)
+    landmark_extractor = MediaPipeCropLandmarks()
+    try:
+        run_multi_person(source, detector, landmark_extractor, scorer, max_frames=args.max_frames)
+    finally:
+        landmark_extractor.close()
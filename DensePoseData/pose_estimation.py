@@ -1,13 +1,38 @@
 import math
+import json
+import logging
+import numpy as np
 import cv2
 import mediapipe as mp
 import csv
 import os
 import argparse
 from collections import namedtuple
+from contextlib import nullcontext
+from itertools import islice
+from operator import itemgetter
+
+from landmarks import CSV_LANDMARK_MAPPING, NUM_LANDMARKS
+from risk_output import open_risk_writer
+from risk_rules import ACTION_LEVELS, COMPONENT_NAMES, RULA_RULE_TABLE, RULE_TABLES, calculate_angle_batch
 
 mp_pose = mp.solutions.pose
 
+logger = logging.getLogger(__name__)
+
+# Per-frame sub-scores of every component, as returned by calculate_ergonomic_risk_batch
+COMPONENT_DTYPE = RULA_RULE_TABLE.component_dtype
+
+# Number of frames parsed and scored at a time when streaming a CSV file
+DEFAULT_CHUNK_SIZE = 16384
+
+# Mimic the MediaPipe pose_landmarks and landmark structures for landmarks read from CSV files
+class Landmarks:
+    def __init__(self):
+        self.landmark = {}
+
+LandmarkPoint = namedtuple('LandmarkPoint', ['x', 'y', 'z'])
+
 def calculate_angle(p1, p2, p3):
     """
     Calculate the angle between three points.
@@ -18,10 +43,10 @@ def calculate_angle(p1, p2, p3):
     if p1 is None or p2 is None or p3 is None:
         return 0
 
-    # Get the coordinates of the points
-    x1, y1, _ = p1
-    x2, y2, _ = p2
-    x3, y3, _ = p3
+    # Get the coordinates of the points (any z coordinate is ignored)
+    x1, y1 = p1[0], p1[1]
+    x2, y2 = p2[0], p2[1]
+    x3, y3 = p3[0], p3[1]
 
     # Calculate the vectors from point 2 to point 1 and point 3
     vector21 = (x1 - x2, y1 - y2)
@@ -36,7 +61,7 @@ def calculate_angle(p1, p2, p3):
     # Protect against division by zero in case of collinear points
     try:
         angle = math.acos(dot_product / (magnitude21 * magnitude23))
-    except ValueError:
+    except (ValueError, ZeroDivisionError):
         # If the points are collinear, the angle is either 0 or 180 degrees
         angle = math.pi if dot_product < 0 else 0
     angle_degrees = math.degrees(angle)
@@ -91,33 +116,14 @@ def extract_landmarks_from_csv_row(row):
     Extract landmarks from a CSV row and create a pose_landmarks object.
     The CSV columns are named with the pattern 'JointName.x', 'JointName.y', and 'JointName.z'.
     """
-    class Landmarks:
-        def __init__(self):
-            self.landmark = {}
-
     pose_landmarks = Landmarks()
 
-    # Mapping of CSV column names to MediaPipe PoseLandmark enum names
-    landmark_mapping = {
-        'RightShoulder': mp_pose.PoseLandmark.RIGHT_SHOULDER,  # Add mapping for right shoulder
-        'RightArm': mp_pose.PoseLandmark.RIGHT_ELBOW,
-        'RightForeArm': mp_pose.PoseLandmark.RIGHT_WRIST,
-        'RightHand': mp_pose.PoseLandmark.RIGHT_INDEX,  # Assuming RightHand corresponds to RIGHT_INDEX
-        'LeftShoulder': mp_pose.PoseLandmark.LEFT_SHOULDER,  # Add mapping for left shoulder
-        'LeftArm': mp_pose.PoseLandmark.LEFT_ELBOW,
-        'LeftForeArm': mp_pose.PoseLandmark.LEFT_WRIST,
-        'LeftHand': mp_pose.PoseLandmark.LEFT_INDEX,  # Assuming LeftHand corresponds to LEFT_INDEX
-        # ... other mappings as needed, following the same pattern
-    }
-
     # Extract landmarks using the mapping
-    for landmark_name, pose_landmark in landmark_mapping.items():
+    for landmark_name, pose_landmark in CSV_LANDMARK_MAPPING.items():
         x_column = f'{landmark_name}.x'
         y_column = f'{landmark_name}.y'
         z_column = f'{landmark_name}.z'
         if x_column in row and y_column in row and z_column in row:
-            # Create a namedtuple to mimic the MediaPipe landmark structure
-            LandmarkPoint = namedtuple('LandmarkPoint', ['x', 'y', 'z'])
             # Convert the CSV string values to float and create the LandmarkPoint
             pose_landmarks.landmark[pose_landmark] = LandmarkPoint(
                 x=float(row[x_column]),
@@ -130,6 +136,39 @@ def extract_landmarks_from_csv_row(row):
 
     return pose_landmarks
 
+def read_landmark_chunks(csv_file, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Stream landmarks from an open CSV file in fixed-size chunks.
+    Column indices are resolved once from the header, then each chunk of up to
+    chunk_size rows is parsed straight into an (N_frames, N_landmarks, 3) float array
+    laid out like landmarks_to_array. Only one chunk is held in memory at a time.
+    """
+    csv_reader = csv.reader(csv_file)
+    header = next(csv_reader, None)
+    if header is None:
+        return
+    column_index = {name: index for index, name in enumerate(header)}
+
+    # Resolve the columns of every mapped landmark that has all three coordinates
+    pose_landmarks = []
+    columns = []
+    for landmark_name, pose_landmark in CSV_LANDMARK_MAPPING.items():
+        axis_columns = [f'{landmark_name}.{axis}' for axis in 'xyz']
+        if all(column in column_index for column in axis_columns):
+            pose_landmarks.append(pose_landmark)
+            columns.extend(column_index[column] for column in axis_columns)
+    get_columns = itemgetter(*columns) if columns else (lambda row: ())
+
+    while True:
+        rows = list(islice(csv_reader, chunk_size))
+        if not rows:
+            return
+        landmarks = np.full((len(rows), NUM_LANDMARKS, 3), np.nan)
+        if pose_landmarks:
+            values = np.array([get_columns(row) for row in rows], dtype=np.float64)
+            landmarks[:, pose_landmarks] = values.reshape(len(rows), len(pose_landmarks), 3)
+        yield landmarks
+
 def calculate_ergonomic_risk(pose_landmarks):
     """
     Calculate ergonomic risk based on pose landmarks.
@@ -138,7 +177,7 @@ def calculate_ergonomic_risk(pose_landmarks):
     """
     # Initialize the ergonomic risk score
     ergonomic_risk_score = 0
-    print("Initial ergonomic risk score:", ergonomic_risk_score)  # Diagnostic print
+    logger.debug("Initial ergonomic risk score: %s", ergonomic_risk_score)
 
     # Helper function to get a landmark if it exists, otherwise return None
     def get_landmark(landmark):
@@ -150,47 +189,47 @@ def calculate_ergonomic_risk(pose_landmarks):
     right_wrist = get_landmark(mp_pose.PoseLandmark.RIGHT_WRIST)
     right_pinky = get_landmark(mp_pose.PoseLandmark.RIGHT_PINKY)
 
-    # Diagnostic print to confirm the presence of landmarks
-    print(f"Right shoulder: {right_shoulder}, Right elbow: {right_elbow}, Right wrist: {right_wrist}, Right pinky: {right_pinky}")
+    # Diagnostics to confirm the presence of landmarks
+    logger.debug("Right shoulder: %s, Right elbow: %s, Right wrist: %s, Right pinky: %s", right_shoulder, right_elbow, right_wrist, right_pinky)
 
     right_elbow_angle = 0  # Initialize to default value
     # Check if required landmarks are available before calculating angles
     if right_shoulder and right_elbow and right_wrist:
         right_elbow_angle = calculate_angle(right_shoulder, right_elbow, right_wrist)
-        print(f"Calculated right elbow angle: {right_elbow_angle}")  # Diagnostic print
+        logger.debug("Calculated right elbow angle: %s", right_elbow_angle)
 
         # Assign scores based on RULA criteria for the right upper arm
         # Adjusted to match RULA scoring system
         if right_elbow_angle < 60:
             ergonomic_risk_score += 1
-            print("Right elbow angle < 60, adding 1 to risk score")  # Diagnostic print
+            logger.debug("Right elbow angle < 60, adding 1 to risk score")
         elif 60 <= right_elbow_angle < 100:
             ergonomic_risk_score += 2
-            print("60 <= Right elbow angle < 100, adding 2 to risk score")  # Diagnostic print
+            logger.debug("60 <= Right elbow angle < 100, adding 2 to risk score")
         elif 100 <= right_elbow_angle < 140:
             ergonomic_risk_score += 3
-            print("100 <= Right elbow angle < 140, adding 3 to risk score")  # Diagnostic print
+            logger.debug("100 <= Right elbow angle < 140, adding 3 to risk score")
         else:
             ergonomic_risk_score += 4
-            print("Right elbow angle >= 140, adding 4 to risk score")  # Diagnostic print
-        print(f"Right elbow angle: {right_elbow_angle}, Ergonomic risk score updated to: {ergonomic_risk_score}")
+            logger.debug("Right elbow angle >= 140, adding 4 to risk score")
+        logger.debug("Right elbow angle: %s, Ergonomic risk score updated to: %s", right_elbow_angle, ergonomic_risk_score)
 
         # Adjust score for wrist posture based on RULA criteria
         # Adjusted to match RULA scoring system
         if right_wrist and right_pinky and is_ulnar_deviation(right_wrist, right_pinky, right_elbow):
             ergonomic_risk_score += 2  # Add score for ulnar deviation
-            print("Ulnar deviation detected for right wrist, adding 2 to risk score")  # Diagnostic print
+            logger.debug("Ulnar deviation detected for right wrist, adding 2 to risk score")
         else:
-            print("No ulnar deviation detected for right wrist, no addition to risk score")  # Diagnostic print
-        print(f"Right wrist posture check, Ergonomic risk score updated to: {ergonomic_risk_score}")
+            logger.debug("No ulnar deviation detected for right wrist, no addition to risk score")
+        logger.debug("Right wrist posture check, Ergonomic risk score updated to: %s", ergonomic_risk_score)
 
     # Adjust score for lower arm posture based on RULA criteria
     # Adjusted to match RULA scoring system
     lower_arm_angle_threshold = 60  # Threshold angle for lower arm posture
     if right_elbow_angle and (right_elbow_angle < lower_arm_angle_threshold or right_elbow_angle > (180 - lower_arm_angle_threshold)):
         ergonomic_risk_score += 2  # Add score if the lower arm angle is too acute or too obtuse
-        print(f"Lower arm posture adjustment, adding 2 to risk score")  # Diagnostic print
-        print(f"Lower arm posture adjustment for right arm, Ergonomic risk score updated to: {ergonomic_risk_score}")
+        logger.debug("Lower arm posture adjustment, adding 2 to risk score")
+        logger.debug("Lower arm posture adjustment for right arm, Ergonomic risk score updated to: %s", ergonomic_risk_score)
 
     # Calculate neck angle for flexion/extension
     # Adjusted to match RULA scoring system
@@ -213,7 +252,7 @@ def calculate_ergonomic_risk(pose_landmarks):
             ergonomic_risk_score += 2
         else:
             ergonomic_risk_score += 3
-        print(f"Neck angle: {neck_angle}, Ergonomic risk score updated to: {ergonomic_risk_score}")
+        logger.debug("Neck angle: %s, Ergonomic risk score updated to: %s", neck_angle, ergonomic_risk_score)
 
     # Calculate trunk flexion/extension angle if landmarks are available
     # Adjusted to match RULA scoring system
@@ -222,7 +261,7 @@ def calculate_ergonomic_risk(pose_landmarks):
     left_hip = get_landmark(mp_pose.PoseLandmark.LEFT_HIP)
     if left_shoulder and right_hip and left_hip:
         pelvis = ((left_hip.x + right_hip.x) / 2, (left_hip.y + right_hip.y) / 2)  # Midpoint of hips as pelvis
-        trunk_flexion_extension_angle = calculate_angle(left_shoulder, (left_shoulder.x, pelvis.y), pelvis)
+        trunk_flexion_extension_angle = calculate_angle(left_shoulder, (left_shoulder.x, pelvis[1]), pelvis)
         # Trunk scoring based on flexion/extension and twist
         # Adjusted to match RULA scoring system
         if trunk_flexion_extension_angle < 20:
@@ -231,7 +270,7 @@ def calculate_ergonomic_risk(pose_landmarks):
             ergonomic_risk_score += 2
         else:
             ergonomic_risk_score += 3
-        print(f"Trunk flexion/extension angle: {trunk_flexion_extension_angle}, Ergonomic risk score updated to: {ergonomic_risk_score}")
+        logger.debug("Trunk flexion/extension angle: %s, Ergonomic risk score updated to: %s", trunk_flexion_extension_angle, ergonomic_risk_score)
 
     # Calculate leg support score based on the position of the feet relative to the hips
     # Adjusted to match RULA scoring system
@@ -242,7 +281,7 @@ def calculate_ergonomic_risk(pose_landmarks):
         left_foot_supported = is_foot_supported(left_foot, left_hip)
         leg_support_score = 1 if right_foot_supported and left_foot_supported else 2
         ergonomic_risk_score += leg_support_score
-        print(f"Leg support score added: {leg_support_score}, Ergonomic risk score updated to: {ergonomic_risk_score}")
+        logger.debug("Leg support score added: %s, Ergonomic risk score updated to: %s", leg_support_score, ergonomic_risk_score)
 
     # Adjust score for shoulder elevation, arm abduction, leaning, or arm support
     # Adjusted to match RULA scoring system
@@ -255,7 +294,7 @@ def calculate_ergonomic_risk(pose_landmarks):
         if right_elbow and is_leaning_or_supporting(right_shoulder, right_elbow):
             ergonomic_risk_score += 2  # Adjusted to add score if leaning or arm is supported
 
-        print(f"Shoulder elevation/abduction/leaning/support adjustment for right side, Ergonomic risk score updated to: {ergonomic_risk_score}")
+        logger.debug("Shoulder elevation/abduction/leaning/support adjustment for right side, Ergonomic risk score updated to: %s", ergonomic_risk_score)
 
     # Continue with the rest of the ergonomic risk calculations...
     # (The rest of the function remains unchanged)
@@ -292,7 +331,7 @@ def calculate_ergonomic_risk(pose_landmarks):
         if left_elbow and is_leaning_or_supporting(left_shoulder, left_elbow):
             ergonomic_risk_score += 1  # Adjusted to add score if leaning or arm is supported
 
-        print(f"Shoulder elevation/abduction/leaning/support adjustment for left side, Ergonomic risk score updated to: {ergonomic_risk_score}")
+        logger.debug("Shoulder elevation/abduction/leaning/support adjustment for left side, Ergonomic risk score updated to: %s", ergonomic_risk_score)
 
     # Determine action level based on ergonomic risk score
     if ergonomic_risk_score >= 7:
@@ -306,41 +345,172 @@ def calculate_ergonomic_risk(pose_landmarks):
 
     return ergonomic_risk_score, action_level
 
-def main(csv_file_path):
-    # Initialize CSV file for storing results
-    with open('ergonomic_risk_scores.csv', mode='w', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow(['Frame', 'Ergonomic Risk Score', 'Action Level'])
-
-        # Load the CSV file containing pose data
-        with open(csv_file_path, mode='r') as csv_file:
-            csv_reader = csv.DictReader(csv_file)
-            frame_number = 0
-            print("Starting CSV data processing loop...")  # Confirm entry into the loop
-
-            for row in csv_reader:
-                # Extract landmarks from the CSV row
-                pose_landmarks = extract_landmarks_from_csv_row(row)
+def landmarks_to_array(pose_landmarks_list):
+    """
+    Convert a sequence of pose_landmarks objects into an (N_frames, N_landmarks, 3) array.
+    Landmarks that are missing from a frame are filled with NaN.
+    """
+    landmarks = np.full((len(pose_landmarks_list), NUM_LANDMARKS, 3), np.nan)
+    for frame_index, pose_landmarks in enumerate(pose_landmarks_list):
+        for pose_landmark, point in pose_landmarks.landmark.items():
+            if point is not None:
+                landmarks[frame_index, pose_landmark] = (point.x, point.y, point.z)
+    return landmarks
+
+def calculate_ergonomic_risk_batch(landmarks, return_components=False):
+    """
+    Calculate ergonomic risk for many frames at once.
+    landmarks is an (N_frames, N_landmarks, 3) array indexed by MediaPipe PoseLandmark,
+    with NaN for landmarks that are missing from a frame (see landmarks_to_array).
+    Applies the same rules as calculate_ergonomic_risk, compiled from the rule table in
+    risk_rules.RULA_RULES, and returns a tuple of (scores, action_level_codes); the
+    codes index ACTION_LEVELS.
+    With return_components, the per-component sub-scores that add up to each score
+    are returned as a third element, a structured array with COMPONENT_DTYPE.
+    """
+    return RULA_RULE_TABLE(landmarks, return_components)
 
-                # Calculate the ergonomic risk score using the extracted landmarks
-                ergonomic_risk_score, action_level = calculate_ergonomic_risk(pose_landmarks)
+def write_trace_records(trace_file, frame_numbers, ergonomic_risk_scores, action_level_codes, components,
+                        action_levels=ACTION_LEVELS):
+    """
+    Write one JSON line per frame with the score, action level and component sub-scores.
+    Only called when tracing is enabled, so default runs do no per-frame formatting.
+    """
+    for frame_number, ergonomic_risk_score, action_level_code, frame_components in zip(
+            frame_numbers.tolist(), ergonomic_risk_scores.tolist(), action_level_codes.tolist(), components.tolist()):
+        trace_file.write(json.dumps({
+            'frame': frame_number,
+            'score': ergonomic_risk_score,
+            'action_level': action_levels[action_level_code],
+            'components': dict(zip(components.dtype.names, frame_components)),
+        }) + '\n')
+
+def score_landmark_chunks(landmark_chunks, output_path='ergonomic_risk_scores', trace_path=None,
+                          smoothing=None, exposure=None, rule_table=RULA_RULE_TABLE):
+    """
+    Score a stream of (N_frames, N_landmarks, 3) landmark chunks and write the per-frame
+    results to output_path, either as CSV or, for paths not ending in .csv, as a columnar
+    directory (see risk_output). Frames are numbered across chunks.
+    Frames are scored with rule_table (see risk_rules), the RULA-based rules by default.
+    If trace_path is given, per-frame trace records are also written there (see write_trace_records).
+    If smoothing is given (a risk_smoothing.RiskSmoothingStage), the written scores and action
+    levels are the smoothed ones; the component sub-scores are always the raw per-frame ones.
+    If exposure is given (a risk_exposure.ExposureStage), it is fed every scored chunk.
+    Returns a summary dict with the number of frames, the sum and maximum of the
+    risk scores and the number of frames at each action level.
+    """
+    summary = {
+        'frames': 0,
+        'score_sum': 0,
+        'max_score': 0,
+        'action_level_counts': np.zeros(len(rule_table.action_levels), dtype=np.int64),
+    }
 
-                # Print the frame number, ergonomic risk score, and action level to the console
-                print(f"Frame: {frame_number}, Ergonomic Risk Score: {ergonomic_risk_score}, Action Level: {action_level}")
+    # Initialize the output for storing results; paths not ending in .csv get the columnar format
+    with open_risk_writer(output_path, rule_table.action_levels, rule_table.component_names) as writer, \
+            (open(trace_path, mode='w') if trace_path else nullcontext()) as trace_file:
+        # Score each chunk before the next one is read
+        for landmarks in landmark_chunks:
+            if len(landmarks) == 0:
+                continue
+            ergonomic_risk_scores, action_level_codes, components = rule_table(
+                landmarks, return_components=True)
+            if smoothing is not None:
+                ergonomic_risk_scores, action_level_codes = smoothing(ergonomic_risk_scores)
+
+            # Write the actual risk scores and action levels along with the component sub-scores
+            frame_number = summary['frames']
+            frame_numbers = np.arange(frame_number, frame_number + len(landmarks))
+            writer.write(frame_numbers, ergonomic_risk_scores, action_level_codes, components)
+            if trace_file:
+                write_trace_records(trace_file, frame_numbers, ergonomic_risk_scores, action_level_codes,
+                                    components, rule_table.action_levels)
+            if exposure is not None:
+                exposure(action_level_codes, components)
+            logger.debug("Scored frames %d to %d", frame_number, frame_number + len(landmarks) - 1)
+
+            summary['frames'] += len(landmarks)
+            summary['score_sum'] += int(ergonomic_risk_scores.sum())
+            summary['max_score'] = max(summary['max_score'], int(ergonomic_risk_scores.max()))
+            summary['action_level_counts'] += np.bincount(action_level_codes,
+                                                         minlength=len(rule_table.action_levels))
+
+    return summary
+
+def score_csv_file(csv_file_path, output_path='ergonomic_risk_scores', chunk_size=DEFAULT_CHUNK_SIZE,
+                   trace_path=None, smoothing=None, exposure=None, rule_table=RULA_RULE_TABLE):
+    """
+    Score every frame of a pose CSV file, streamed in chunks of chunk_size frames, and
+    write the per-frame results to output_path (see score_landmark_chunks).
+    Returns the summary dict of score_landmark_chunks.
+    """
+    with open(csv_file_path, mode='r', newline='') as csv_file:
+        return score_landmark_chunks(read_landmark_chunks(csv_file, chunk_size), output_path, trace_path,
+                                     smoothing, exposure, rule_table)
 
-                # Write the actual risk score and action level to the CSV
-                writer.writerow([frame_number, ergonomic_risk_score, action_level])
-                frame_number += 1
+def main(csv_file_path, output_path='ergonomic_risk_scores', chunk_size=DEFAULT_CHUNK_SIZE, trace_path=None,
+         smoothing=None, exposure=None, rule_table=RULA_RULE_TABLE):
+    logger.info("Starting CSV data processing loop...")  # Confirm entry into the loop
+    summary = score_csv_file(csv_file_path, output_path, chunk_size, trace_path, smoothing, exposure, rule_table)
+    logger.info("Processed %d frames", summary['frames'])
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Process a CSV file and calculate ergonomic risk scores.')
     parser.add_argument('csv_file_path', help='Path to the input CSV file containing pose data')
+    parser.add_argument('--output', default='ergonomic_risk_scores',
+                        help='Path to write the risk scores to. Outputs are written as a columnar '
+                             'directory of binary columns by default, which is compact and fast to load '
+                             'for long captures; paths ending in .csv are written as CSV text instead')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help='Number of frames to parse and score at a time')
+    parser.add_argument('--rules', choices=sorted(RULE_TABLES), default='rula',
+                        help='Rule table to score the frames with; rula3d also uses the z coordinate')
+    parser.add_argument('--smoothing', choices=['none', 'median', 'ema'], default='none',
+                        help='Temporal smoothing applied to the frame-level risk scores')
+    parser.add_argument('--window', type=int, default=5,
+                        help='Window of the rolling median or EMA, in frames')
+    parser.add_argument('--min-frames', type=int, default=1,
+                        help='Frames a new action level must persist before it is reported')
+    parser.add_argument('--exposure', default=None,
+                        help='Write time-at-risk per action level and component to this CSV file')
+    parser.add_argument('--fps', type=float, default=30.0,
+                        help='Frame rate of the capture, used for exposure durations')
+    parser.add_argument('--exposure-hop', type=float, default=60.0,
+                        help='Seconds between exposure records')
+    parser.add_argument('--exposure-window', type=float, default=None,
+                        help='Seconds covered by each exposure record (a multiple of --exposure-hop; '
+                             'defaults to tumbling windows of --exposure-hop)')
+    parser.add_argument('--trace', default=None,
+                        help='Write per-frame trace records (JSON lines) to this file')
+    parser.add_argument('-v', '--verbose', action='count', default=0,
+                        help='Log progress (-v) or per-frame diagnostics (-vv)')
 
     # Parse the command-line arguments
     args = parser.parse_args()
+    logging.basicConfig(level=[logging.WARNING, logging.INFO, logging.DEBUG][min(args.verbose, 2)],
+                        format='%(levelname)s %(name)s: %(message)s')
+
+    rule_table = RULE_TABLES[args.rules]
+    if args.exposure and (rule_table.component_names != COMPONENT_NAMES or rule_table.action_levels != ACTION_LEVELS):
+        parser.error("--exposure is only available for the RULA-based rules")
 
     # Expand the user's home directory if the tilde is used in the CSV file path
     csv_file_path = os.path.expanduser(args.csv_file_path)
 
+    smoothing = None
+    if args.smoothing != 'none' or args.min_frames > 1:
+        from risk_smoothing import RiskSmoothingStage
+        smoothing = RiskSmoothingStage(args.smoothing, args.window, args.min_frames,
+                                       rule_table.action_level_thresholds)
+
+    exposure = None
+    if args.exposure:
+        from risk_exposure import ExposureStage
+        hop_frames = max(int(round(args.exposure_hop * args.fps)), 1)
+        window_frames = hop_frames * max(int(round((args.exposure_window or args.exposure_hop) / args.exposure_hop)), 1)
+        exposure = ExposureStage(os.path.expanduser(args.exposure), args.fps, hop_frames, window_frames)
+
     # Call the main function with the provided CSV file path
-    main(csv_file_path)
+    main(csv_file_path, args.output, args.chunk_size, args.trace, smoothing, exposure, rule_table)
+    if exposure is not None:
+        exposure.close()
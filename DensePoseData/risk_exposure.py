@@ -0,0 +1,199 @@
+import csv
+from collections import deque
+import numpy as np
+
+from risk_rules import ACTION_LEVELS, COMPONENT_NAMES
+
+# Sub-score of each component in a neutral posture; frames above it count as exposure
+COMPONENT_BASELINES = {
+    'right_upper_arm': 1,
+    'neck': 1,
+    'trunk': 1,
+    'legs': 1,
+    'left_upper_arm': 1,
+}
+
+# Exposure channels: one per action level, then one per component
+EXPOSURE_CHANNELS = tuple(ACTION_LEVELS) + COMPONENT_NAMES
+
+def exposure_channels(action_level_codes, components):
+    """
+    Build the (N_frames, N_channels) boolean exposure matrix for EXPOSURE_CHANNELS:
+    whether each frame is at each action level and whether each component sub-score
+    is above its neutral baseline.
+    """
+    channels = np.empty((len(action_level_codes), len(EXPOSURE_CHANNELS)), dtype=bool)
+    channels[:, :len(ACTION_LEVELS)] = action_level_codes[:, None] == np.arange(len(ACTION_LEVELS))
+    for index, component_name in enumerate(COMPONENT_NAMES):
+        channels[:, len(ACTION_LEVELS) + index] = components[component_name] > COMPONENT_BASELINES.get(component_name, 0)
+    return channels
+
+class ExposureSummary:
+    """
+    Exposure of a contiguous span of frames, per channel: the number of exposed
+    frames, the longest exposed streak and the exposed streaks touching the start
+    (prefix) and the end (suffix) of the span. Summaries of adjacent spans merge
+    in constant time, which is what keeps the windowed aggregation incremental.
+    """
+    def __init__(self, num_channels, length=0):
+        self.length = length
+        self.count = np.zeros(num_channels, dtype=np.int64)
+        self.longest = np.zeros(num_channels, dtype=np.int64)
+        self.prefix = np.zeros(num_channels, dtype=np.int64)
+        self.suffix = np.zeros(num_channels, dtype=np.int64)
+
+    @classmethod
+    def from_frames(cls, channels):
+        """
+        Summarize an (N_frames, N_channels) boolean exposure matrix.
+        """
+        length, num_channels = channels.shape
+        summary = cls(num_channels, length)
+        if length == 0:
+            return summary
+        not_exposed = ~channels
+        any_not_exposed = not_exposed.any(axis=0)
+        summary.count = channels.sum(axis=0)
+        summary.prefix = np.where(any_not_exposed, not_exposed.argmax(axis=0), length)
+        summary.suffix = np.where(any_not_exposed, not_exposed[::-1].argmax(axis=0), length)
+
+        # Length of the exposed streak ending at every frame
+        frame_index = np.arange(length)[:, None]
+        last_not_exposed = np.maximum.accumulate(np.where(channels, -1, frame_index), axis=0)
+        summary.longest = (frame_index - last_not_exposed).max(axis=0)
+        return summary
+
+    def merge(self, other):
+        """
+        Return the summary of this span followed directly by other.
+        """
+        merged = ExposureSummary(len(self.count), self.length + other.length)
+        merged.count = self.count + other.count
+        merged.longest = np.maximum(np.maximum(self.longest, other.longest), self.suffix + other.prefix)
+        merged.prefix = np.where(self.prefix == self.length, self.length + other.prefix, self.prefix)
+        merged.suffix = np.where(other.suffix == other.length, other.length + self.suffix, other.suffix)
+        return merged
+
+class ExposureAggregator:
+    """
+    Incremental time-at-risk aggregation over a stream of exposure matrices.
+    Frames are grouped into panes of hop_frames; every completed pane emits a record
+    for the window of the last window_frames (a multiple of hop_frames). With
+    window_frames == hop_frames the windows are tumbling, otherwise sliding.
+    Only the pane summaries of one window are kept, so each frame costs constant
+    time and memory does not grow with the session. Session totals are kept as well.
+    """
+    def __init__(self, fps, hop_frames, window_frames=None, channel_names=EXPOSURE_CHANNELS):
+        window_frames = window_frames or hop_frames
+        if window_frames % hop_frames:
+            raise ValueError("window_frames must be a multiple of hop_frames")
+        self.fps = fps
+        self.hop_frames = hop_frames
+        self.channel_names = list(channel_names)
+        self.panes = deque(maxlen=window_frames // hop_frames)
+        self.pane = ExposureSummary(len(self.channel_names))
+        self.session = ExposureSummary(len(self.channel_names))
+        self.frames = 0
+
+    def __call__(self, channels):
+        """
+        Add the exposure matrix of the next frames and return the records of
+        every window completed by them.
+        """
+        records = []
+        start = 0
+        while start < len(channels):
+            end = start + min(self.hop_frames - self.pane.length, len(channels) - start)
+            segment = ExposureSummary.from_frames(channels[start:end])
+            self.pane = self.pane.merge(segment)
+            self.session = self.session.merge(segment)
+            self.frames += end - start
+            if self.pane.length == self.hop_frames:
+                records.append(self._close_pane())
+            start = end
+        return records
+
+    def flush(self):
+        """
+        Return the record of the window ending with a final, partial pane, if any.
+        """
+        return [self._close_pane()] if self.pane.length else []
+
+    def _close_pane(self):
+        self.panes.append(self.pane)
+        self.pane = ExposureSummary(len(self.channel_names))
+        window = self.panes[0]
+        for pane in list(self.panes)[1:]:
+            window = window.merge(pane)
+        return self._record(self.frames - window.length, self.frames, window)
+
+    def session_record(self):
+        return self._record(0, self.frames, self.session)
+
+    def _record(self, start_frame, end_frame, summary):
+        """
+        Record of frames [start_frame, end_frame): exposed frames, exposed seconds and
+        the longest exposed streak in seconds for every channel.
+        """
+        return {
+            'start_frame': start_frame,
+            'end_frame': end_frame,
+            'frames': dict(zip(self.channel_names, summary.count.tolist())),
+            'seconds': dict(zip(self.channel_names, (summary.count / self.fps).tolist())),
+            'longest_streak_seconds': dict(zip(self.channel_names, (summary.longest / self.fps).tolist())),
+        }
+
+class ExposureCsvWriter:
+    """
+    Write exposure records as CSV, one row per window.
+    """
+    def __init__(self, path, channel_names=EXPOSURE_CHANNELS):
+        self.channel_names = list(channel_names)
+        self._file = open(path, mode='w', newline='')
+        self._writer = csv.writer(self._file)
+        header = ['Start Frame', 'End Frame']
+        for channel_name in self.channel_names:
+            header += [f'{channel_name} Frames', f'{channel_name} Seconds', f'{channel_name} Longest Streak Seconds']
+        self._writer.writerow(header)
+
+    def write(self, records):
+        for record in records:
+            row = [record['start_frame'], record['end_frame']]
+            for channel_name in self.channel_names:
+                row += [record['frames'][channel_name], f"{record['seconds'][channel_name]:.3f}",
+                        f"{record['longest_streak_seconds'][channel_name]:.3f}"]
+            self._writer.writerow(row)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class ExposureStage:
+    """
+    Streaming exposure stage for the scoring loop: aggregates the action-level codes
+    and component sub-scores of every chunk and writes completed window records to
+    a CSV file as they are produced. Closing the stage flushes the last partial window
+    and appends a row with the totals of the whole session.
+    """
+    def __init__(self, path, fps, hop_frames, window_frames=None):
+        self.aggregator = ExposureAggregator(fps, hop_frames, window_frames)
+        self.writer = ExposureCsvWriter(path)
+
+    def __call__(self, action_level_codes, components):
+        self.writer.write(self.aggregator(exposure_channels(action_level_codes, components)))
+
+    def close(self):
+        self.writer.write(self.aggregator.flush())
+        self.writer.write([self.aggregator.session_record()])
+        self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,115 @@
+import os
+import csv
+import json
+import numpy as np
+
+# Name of the metadata file inside a columnar risk score directory
+COLUMNAR_META_FILE = 'meta.json'
+
+class CsvRiskWriter:
+    """
+    Write per-frame risk results as CSV rows with the action level spelled out.
+    Any per-component sub-scores are written as extra columns after the action level.
+    """
+    def __init__(self, path, action_levels, component_names=()):
+        self.action_levels = action_levels
+        self.component_names = list(component_names)
+        self._file = open(path, mode='w', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(['Frame', 'Ergonomic Risk Score', 'Action Level'] + self.component_names)
+
+    def write(self, frame_numbers, scores, action_level_codes, components=None):
+        columns = [np.asarray(frame_numbers).tolist(), np.asarray(scores).tolist(),
+                   [self.action_levels[code] for code in action_level_codes]]
+        columns += [components[name].tolist() for name in self.component_names]
+        self._writer.writerows(zip(*columns))
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class ColumnarRiskWriter:
+    """
+    Write per-frame risk results as a directory of raw binary columns.
+    Every column is stored in its own '<column>.bin' file: the frame index as int64,
+    the score and each per-component sub-score as int8, and the action level as an
+    int8 code into the action level names kept in meta.json. The metadata is only
+    written on a successful close, so load_risk_scores only accepts complete outputs.
+    """
+    def __init__(self, path, action_levels, component_names=()):
+        self.path = path
+        self.action_levels = list(action_levels)
+        self.component_names = list(component_names)
+        self.columns = [('frame', np.int64), ('score', np.int8), ('action_level', np.int8)]
+        self.columns += [(name, np.int8) for name in self.component_names]
+        self.frames = 0
+
+        os.makedirs(path, exist_ok=True)
+        meta_path = os.path.join(path, COLUMNAR_META_FILE)
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        self._files = {name: open(os.path.join(path, f'{name}.bin'), 'wb') for name, _ in self.columns}
+
+    def write(self, frame_numbers, scores, action_level_codes, components=None):
+        values = {'frame': frame_numbers, 'score': scores, 'action_level': action_level_codes}
+        for name in self.component_names:
+            values[name] = components[name]
+        for name, dtype in self.columns:
+            self._files[name].write(np.ascontiguousarray(values[name], dtype=dtype).tobytes())
+        self.frames += len(scores)
+
+    def close(self, complete=True):
+        # Without the metadata an incomplete output is rejected by load_risk_scores
+        for file in self._files.values():
+            file.close()
+        if not complete:
+            return
+        meta = {
+            'frames': self.frames,
+            'columns': {name: np.dtype(dtype).str for name, dtype in self.columns},
+            'action_levels': self.action_levels,
+            'components': self.component_names,
+        }
+        with open(os.path.join(self.path, COLUMNAR_META_FILE), 'w') as file:
+            json.dump(meta, file, indent=2)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(complete=exc_type is None)
+
+def is_columnar_path(path):
+    # CSV files are written as text, every other output path as a columnar directory
+    return not path.lower().endswith('.csv')
+
+def open_risk_writer(path, action_levels, component_names=()):
+    """
+    Open a writer for path, choosing the output format from the path.
+    """
+    if is_columnar_path(path):
+        return ColumnarRiskWriter(path, action_levels, component_names)
+    return CsvRiskWriter(path, action_levels, component_names)
+
+def load_risk_scores(path, mmap=True):
+    """
+    Load a columnar risk score directory written by ColumnarRiskWriter.
+    Returns a tuple of (columns, meta): columns maps every column name to an array,
+    memory-mapped read-only unless mmap is False, and meta is the parsed meta.json.
+    """
+    with open(os.path.join(path, COLUMNAR_META_FILE)) as file:
+        meta = json.load(file)
+
+    columns = {}
+    for name, dtype in meta['columns'].items():
+        column_path = os.path.join(path, f'{name}.bin')
+        if mmap and meta['frames']:
+            columns[name] = np.memmap(column_path, dtype=np.dtype(dtype), mode='r', shape=(meta['frames'],))
+        else:
+            columns[name] = np.fromfile(column_path, dtype=np.dtype(dtype), count=meta['frames'])
+    return columns, meta
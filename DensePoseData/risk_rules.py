@@ -0,0 +1,541 @@
+from collections import namedtuple
+import numpy as np
+
+from landmarks import PoseLandmark
+
+# A scoring rule: the measure of a frame is binned by the ascending bin edges and
+# the bin picks one of the len(bins) + 1 scores, which is added to the component.
+# A value equal to an edge falls in the bin above it; use above() for edges that
+# belong to the bin below. The rule scores 0 unless every landmark it measures,
+# and every landmark in requires, is present.
+#
+# Measures are nested tuples:
+#   ('angle', p1, p2, p3)  angle in degrees at p2 between p1 and p3 (x and y only)
+#   ('bend', p1, p2, p3)   180 - angle, i.e. how far p1-p2-p3 bends from a straight line
+#   ('dx', p1, p2)         p1.x - p2.x
+#   ('dy', p1, p2)         p1.y - p2.y (image coordinates, y points down)
+#   ('dz', p1, p2)         p1.z - p2.z (3D tables only)
+#   ('abs', measure)       absolute value of a measure
+#   ('min', m1, m2)        minimum of two measures
+# Tables with dimensions=3 measure angle and bend in 3D and can also measure angles
+# projected onto the anatomical planes of the body frame (see body_frame_batch):
+#   ('flexion', p1, p2, p3)    angle at p2 in the sagittal plane
+#   ('abduction', p1, p2, p3)  angle at p2 in the frontal plane
+#   ('twist', a1, a2, b1, b2)  angle between a1->a2 and b1->b2 in the transverse plane
+# Points are PoseLandmark names, ('mid', p1, p2) for the midpoint of two points or
+# ('xy', p1, p2) for the point with the x (and z) of p1 and the y of p2.
+#
+# '{side}' in the component name and in landmark names is replaced by the side of
+# the rule (lower case in components, upper case in landmarks). Rules without a
+# side take the side of the rule table.
+Rule = namedtuple('Rule', ['component', 'measure', 'bins', 'scores', 'side', 'requires'])
+Rule.__new__.__defaults__ = (None, ())
+
+# A lookup table combining terms (components or earlier lookups) into a new term.
+# The table is indexed by the input scores starting at 1; scores outside the table
+# (such as 0 for a component with missing landmarks) are clipped to its edges.
+Lookup = namedtuple('Lookup', ['name', 'inputs', 'table'])
+
+def above(edge):
+    """
+    Bin edge for rules that only move a measure to the next bin when it is strictly
+    greater than edge.
+    """
+    return float(np.nextafter(edge, np.inf))
+
+def calculate_angle_batch(p1, p2, p3):
+    """
+    Vectorized version of pose_estimation.calculate_angle.
+    Points are given as (..., 2) or (..., 3) arrays; only the x and y coordinates are used.
+    Returns the angles in degrees, computed exactly as calculate_angle does.
+    """
+    # Calculate the vectors from point 2 to point 1 and point 3
+    vector21_x = p1[..., 0] - p2[..., 0]
+    vector21_y = p1[..., 1] - p2[..., 1]
+    vector23_x = p3[..., 0] - p2[..., 0]
+    vector23_y = p3[..., 1] - p2[..., 1]
+
+    # Calculate the dot product and magnitude of the vectors
+    dot_product = vector21_x * vector23_x + vector21_y * vector23_y
+    magnitude21 = np.sqrt(vector21_x**2 + vector21_y**2)
+    magnitude23 = np.sqrt(vector23_x**2 + vector23_y**2)
+    magnitudes = magnitude21 * magnitude23
+
+    # Clamping to [-1, 1] reproduces the collinear fallback of calculate_angle,
+    # and degenerate (zero-length) vectors fall back the same way
+    with np.errstate(divide='ignore', invalid='ignore'):
+        angle = np.arccos(np.clip(dot_product / magnitudes, -1.0, 1.0))
+    angle = np.where(magnitudes == 0, np.where(dot_product < 0, np.pi, 0.0), angle)
+    return np.degrees(angle)
+
+def vector_angle_batch(v1, v2):
+    """
+    Angles in degrees between two arrays of vectors, given as (..., D) arrays.
+    The cosine is clamped to [-1, 1] and zero-length vectors give 180 degrees if the
+    dot product is negative and 0 otherwise, like calculate_angle_batch.
+    """
+    dot_product = np.einsum('...i,...i->...', v1, v2)
+    magnitudes = np.sqrt(np.einsum('...i,...i->...', v1, v1) * np.einsum('...i,...i->...', v2, v2))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        angle = np.arccos(np.clip(dot_product / magnitudes, -1.0, 1.0))
+    angle = np.where(magnitudes == 0, np.where(dot_product < 0, np.pi, 0.0), angle)
+    return np.degrees(angle)
+
+def calculate_angle_batch_3d(p1, p2, p3):
+    """
+    3D version of calculate_angle_batch: the angle at p2 between p1 and p3, given as
+    (..., 3) arrays, using all three coordinates.
+    """
+    return vector_angle_batch(p1 - p2, p3 - p2)
+
+# Landmarks spanning the body frame
+BODY_FRAME_LANDMARKS = ('LEFT_HIP', 'RIGHT_HIP', 'LEFT_SHOULDER', 'RIGHT_SHOULDER')
+
+# Anatomical planes by the body frame axis normal to them
+PLANE_AXES = {
+    'flexion': 0,    # sagittal plane, normal to the lateral axis
+    'abduction': 1,  # frontal plane, normal to the anterior axis
+    'twist': 2,      # transverse plane, normal to the longitudinal axis
+}
+
+def body_frame_batch(left_hip, right_hip, left_shoulder, right_shoulder):
+    """
+    Orthonormal body frame of every frame from (..., 3) hip and shoulder positions.
+    Returns the lateral (left to right), anterior and longitudinal (hips to shoulders)
+    unit axes stacked as a (3, ..., 3) array. The lateral axis averages the hip and
+    shoulder lines and is made orthogonal to the longitudinal axis.
+    """
+    longitudinal = (left_shoulder + right_shoulder - left_hip - right_hip) / 2
+    lateral = (right_hip - left_hip) + (right_shoulder - left_shoulder)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        longitudinal = longitudinal / np.linalg.norm(longitudinal, axis=-1, keepdims=True)
+        lateral = lateral - np.einsum('...i,...i->...', lateral, longitudinal)[..., None] * longitudinal
+        lateral = lateral / np.linalg.norm(lateral, axis=-1, keepdims=True)
+    anterior = np.cross(longitudinal, lateral)
+    return np.stack([lateral, anterior, longitudinal])
+
+def plane_angle_batch(v1, v2, normal):
+    """
+    Angles in degrees between two arrays of (..., 3) vectors after projecting both onto
+    the planes with the given unit normals.
+    """
+    v1 = v1 - np.einsum('...i,...i->...', v1, normal)[..., None] * normal
+    v2 = v2 - np.einsum('...i,...i->...', v2, normal)[..., None] * normal
+    return vector_angle_batch(v1, v2)
+
+def _with_side(expression, side):
+    if isinstance(expression, str):
+        return expression.format(side=side.upper()) if side else expression
+    return tuple(_with_side(item, side) if isinstance(item, (str, tuple)) else item for item in expression)
+
+class RuleTable:
+    """
+    A declarative ergonomic scoring method compiled into array lookups.
+    Every distinct point and measure of the rules is computed once per batch: all
+    angles in one calculate_angle_batch call and all coordinate differences in one
+    gather. All rules are then binned together by comparing their measures with a
+    padded (N_rules, N_bins) edge matrix, so the cost of a batch is a fixed number of
+    array operations however many rules are active. Component sub-scores are the
+    sums of their rules' scores, lookups combine them, and the total is the sum of
+    the terms in total (the components by default).
+    """
+    def __init__(self, rules, component_names, action_levels, action_level_thresholds, lookups=(),
+                 total=None, side=None, dimensions=2):
+        if dimensions not in (2, 3):
+            raise ValueError(f"Rule tables are 2D or 3D, not {dimensions}D")
+        self.dimensions = dimensions
+        self.component_names = tuple(component_names)
+        self.component_dtype = np.dtype([(component_name, np.int8) for component_name in self.component_names])
+        self.action_levels = tuple(action_levels)
+        self.action_level_thresholds = tuple(action_level_thresholds)
+
+        self._landmark_columns = {}
+        self._points = {}
+        self._derived_points = []
+        self._measures = {}
+        self._angles = []
+        self._differences = []
+        self._plane_angles = []
+        self._compounds = []
+
+        rule_measures = []
+        rule_components = []
+        rule_requires = []
+        rule_bins = []
+        rule_scores = []
+        for rule in rules:
+            rule_side = rule.side or side
+            component_name = rule.component.format(side=rule_side.lower()) if rule_side else rule.component
+            if component_name not in self.component_names:
+                raise ValueError(f"Rule for unknown component: {component_name}")
+            if len(rule.scores) != len(rule.bins) + 1:
+                raise ValueError(f"Rule for {component_name} needs one score more than bin edges")
+            if list(rule.bins) != sorted(rule.bins):
+                raise ValueError(f"Bin edges of the rule for {component_name} must be ascending")
+            measure = _with_side(rule.measure, rule_side)
+            rule_measures.append(self._add_measure(measure))
+            rule_components.append(self.component_names.index(component_name))
+            rule_requires.append(self._measure_landmarks(measure) |
+                                 {self._add_point_landmark(_with_side(name, rule_side)) for name in rule.requires})
+            rule_bins.append(rule.bins)
+            rule_scores.append(rule.scores)
+
+        # Rules in matrix form: padded bin edges and scores, required landmarks and components
+        num_rules = len(rule_measures)
+        num_bins = max((len(bins) for bins in rule_bins), default=0)
+        self._rule_measures = np.array(rule_measures, dtype=np.intp)
+        self._rule_bins = np.full((num_rules, num_bins), np.inf)
+        self._rule_scores = np.zeros((num_rules, num_bins + 1))
+        self._rule_requires = np.zeros((num_rules, len(self._landmark_columns)))
+        self._rule_components = np.zeros((num_rules, len(self.component_names)))
+        for index in range(num_rules):
+            self._rule_bins[index, :len(rule_bins[index])] = rule_bins[index]
+            self._rule_scores[index, :len(rule_scores[index])] = rule_scores[index]
+            self._rule_requires[index, list(rule_requires[index])] = 1
+            self._rule_components[index, rule_components[index]] = 1
+        self._rule_score_offsets = np.arange(num_rules) * (num_bins + 1)
+
+        # Lookups and the total refer to components and earlier lookups by name
+        terms = list(self.component_names)
+        self.lookups = []
+        for lookup in lookups:
+            inputs = [terms.index(name) for name in lookup.inputs]
+            table = np.asarray(lookup.table)
+            if table.ndim != len(inputs):
+                raise ValueError(f"Lookup {lookup.name} has {len(inputs)} inputs but a {table.ndim}-d table")
+            self.lookups.append((inputs, table))
+            terms.append(lookup.name)
+        self._total = [terms.index(name) for name in (total or self.component_names)]
+
+        self._landmark_indices = np.array(
+            [PoseLandmark[name] for name in self._landmark_columns], dtype=np.intp)
+        self._landmark_points = np.array(
+            [self._points[name] for name in self._landmark_columns], dtype=np.intp)
+        self._angle_points = np.array([points for points, _ in self._angles], dtype=np.intp).reshape(-1, 3)
+        self._angle_columns = np.array([self._measures[measure] for _, measure in self._angles], dtype=np.intp)
+        self._bend_columns = np.array([self._measures[measure] for _, measure in self._angles
+                                       if measure[0] == 'bend'], dtype=np.intp)
+        self._difference_points = np.array([points for points, _, _ in self._differences],
+                                           dtype=np.intp).reshape(-1, 2)
+        self._difference_axes = np.array([axis for _, axis, _ in self._differences], dtype=np.intp)
+        self._difference_columns = np.array([self._measures[measure] for _, _, measure in self._differences],
+                                            dtype=np.intp)
+        self._plane_points = np.array([points for points, _, _ in self._plane_angles], dtype=np.intp).reshape(-1, 4)
+        self._plane_axes = np.array([axis for _, axis, _ in self._plane_angles], dtype=np.intp)
+        self._plane_columns = np.array([self._measures[measure] for _, _, measure in self._plane_angles],
+                                       dtype=np.intp)
+        self._body_frame_points = np.array([self._points.get(name, -1) for name in BODY_FRAME_LANDMARKS],
+                                           dtype=np.intp)
+
+    def _add_landmark(self, name):
+        if name not in PoseLandmark.__members__:
+            raise ValueError(f"Unknown landmark: {name}")
+        return self._landmark_columns.setdefault(name, len(self._landmark_columns))
+
+    def _add_point_landmark(self, name):
+        self._add_point(name)
+        return self._landmark_columns[name]
+
+    def _add_point(self, point):
+        if point in self._points:
+            return self._points[point]
+        if isinstance(point, str):
+            self._add_landmark(point)
+        elif point[0] in ('mid', 'xy'):
+            operands = (self._add_point(point[1]), self._add_point(point[2]))
+            self._derived_points.append((point[0], len(self._points), operands))
+        else:
+            raise ValueError(f"Unknown point: {point}")
+        return self._points.setdefault(point, len(self._points))
+
+    def _add_measure(self, measure):
+        if measure in self._measures:
+            return self._measures[measure]
+        kind = measure[0]
+        if kind in ('angle', 'bend'):
+            self._angles.append((tuple(self._add_point(point) for point in measure[1:]), measure))
+        elif kind in ('dx', 'dy', 'dz'):
+            if kind == 'dz' and self.dimensions < 3:
+                raise ValueError(f"{measure} needs a 3D rule table")
+            points = (self._add_point(measure[1]), self._add_point(measure[2]))
+            self._differences.append((points, 'xyz'.index(kind[1]), measure))
+        elif kind in PLANE_AXES:
+            if self.dimensions < 3:
+                raise ValueError(f"{measure} needs a 3D rule table")
+            for name in BODY_FRAME_LANDMARKS:
+                self._add_point(name)
+            points = tuple(self._add_point(point) for point in measure[1:])
+            if kind != 'twist':
+                # The angle at p2 is the angle between p2->p1 and p2->p3
+                points = (points[1], points[0], points[1], points[2])
+            self._plane_angles.append((points, PLANE_AXES[kind], measure))
+        elif kind in ('abs', 'min'):
+            operands = tuple(self._add_measure(operand) for operand in measure[1:])
+            self._compounds.append((kind, len(self._measures), operands))
+        else:
+            raise ValueError(f"Unknown measure: {measure}")
+        return self._measures.setdefault(measure, len(self._measures))
+
+    def _measure_landmarks(self, expression):
+        if isinstance(expression, str):
+            return {self._landmark_columns[expression]} if expression in self._landmark_columns else set()
+        landmarks = set()
+        if expression[0] in PLANE_AXES:
+            landmarks = {self._landmark_columns[name] for name in BODY_FRAME_LANDMARKS}
+        for item in expression[1:]:
+            if isinstance(item, (str, tuple)):
+                landmarks |= self._measure_landmarks(item)
+        return landmarks
+
+    def measure(self, landmarks):
+        """
+        Compute every distinct measure of the rules for an (N_frames, N_landmarks, 3)
+        landmark array. Returns the (N_measures, N_frames) measures and the
+        (N_used_landmarks, N_frames) presence of the landmarks the rules use.
+        Both are measure-major, so every gather below copies whole rows of frames.
+        """
+        landmarks = np.asarray(landmarks, dtype=np.float64)
+        used = landmarks[:, self._landmark_indices].transpose(1, 2, 0)
+        present = ~np.isnan(used).any(axis=1)
+
+        points = np.empty((len(self._points), self.dimensions, len(landmarks)))
+        points[self._landmark_points] = used[:, :self.dimensions]
+        for kind, column, (first, second) in self._derived_points:
+            if kind == 'mid':
+                points[column] = (points[first] + points[second]) / 2
+            else:
+                points[column] = points[first]
+                points[column, 1] = points[second, 1]
+
+        measures = np.empty((len(self._measures), len(landmarks)))
+        if len(self._angle_columns):
+            # calculate_angle_batch takes the coordinates on the last axis
+            angle_points = [points[self._angle_points[:, index]].swapaxes(1, 2) for index in range(3)]
+            if self.dimensions == 3:
+                measures[self._angle_columns] = calculate_angle_batch_3d(*angle_points)
+            else:
+                measures[self._angle_columns] = calculate_angle_batch(*angle_points)
+            measures[self._bend_columns] = 180 - measures[self._bend_columns]
+        if len(self._difference_columns):
+            measures[self._difference_columns] = (points[self._difference_points[:, 0], self._difference_axes] -
+                                                  points[self._difference_points[:, 1], self._difference_axes])
+        if len(self._plane_columns):
+            frame = body_frame_batch(*(points[column].T for column in self._body_frame_points))
+            plane_points = [points[self._plane_points[:, index]].swapaxes(1, 2) for index in range(4)]
+            measures[self._plane_columns] = plane_angle_batch(plane_points[1] - plane_points[0],
+                                                              plane_points[3] - plane_points[2],
+                                                              frame[self._plane_axes])
+        for kind, column, operands in self._compounds:
+            if kind == 'abs':
+                measures[column] = np.abs(measures[operands[0]])
+            else:
+                measures[column] = np.minimum(measures[operands[0]], measures[operands[1]])
+        return measures, present
+
+    def __call__(self, landmarks, return_components=False):
+        """
+        Score an (N_frames, N_landmarks, 3) array indexed by MediaPipe PoseLandmark, with
+        NaN for missing landmarks. Returns (scores, action_level_codes) and, with
+        return_components, the component sub-scores as a structured array with
+        component_dtype.
+        """
+        measures, present = self.measure(landmarks)
+        rule_values = measures[self._rule_measures]
+
+        # Bin every rule at once: the bin is the number of edges at or below the value
+        bins = np.zeros(rule_values.shape, dtype=np.intp)
+        with np.errstate(invalid='ignore'):
+            for index in range(self._rule_bins.shape[1]):
+                bins += rule_values >= self._rule_bins[:, index, None]
+        rule_scores = self._rule_scores.ravel()[bins + self._rule_score_offsets[:, None]]
+        rule_scores *= (self._rule_requires @ ~present) == 0
+
+        component_scores = np.rint(self._rule_components.T @ rule_scores).astype(np.int8)
+        terms = list(component_scores.astype(np.int64))
+        for inputs, table in self.lookups:
+            indices = tuple(np.clip(terms[term] - 1, 0, size - 1) for term, size in zip(inputs, table.shape))
+            terms.append(table[indices].astype(np.int64))
+        scores = np.zeros(present.shape[1], dtype=np.int64)
+        for term in self._total:
+            scores += terms[term]
+
+        action_level_codes = np.digitize(scores, self.action_level_thresholds).astype(np.int8)
+        if return_components:
+            components = np.ascontiguousarray(component_scores.T).view(self.component_dtype).reshape(-1)
+            return scores, action_level_codes, components
+        return scores, action_level_codes
+
+# Arm abduction in 2D: the elbow is more than 0.1 (of the image width) beside the shoulder
+RULA_ABDUCTION_RULES = (
+    Rule('{side}_shoulder', ('abs', ('dx', '{side}_ELBOW', '{side}_SHOULDER')),
+         (above(0.1),), (0, 2), side='right', requires=('{side}_HIP',)),
+    Rule('{side}_shoulder', ('abs', ('dx', '{side}_ELBOW', '{side}_SHOULDER')),
+         (above(0.1),), (0, 1), side='left', requires=('{side}_HIP',)),
+)
+
+# RULA-based rules of the ergonomic risk score. The right and left arms are scored
+# with different angle bins, as in calculate_ergonomic_risk.
+RULA_RULES = RULA_ABDUCTION_RULES + (
+    Rule('{side}_upper_arm', ('angle', '{side}_SHOULDER', '{side}_ELBOW', '{side}_WRIST'),
+         (60, 100, 140), (1, 2, 3, 4), side='right'),
+    Rule('{side}_wrist', ('angle', '{side}_WRIST', '{side}_PINKY', '{side}_ELBOW'),
+         (above(20),), (0, 2), side='right', requires=('{side}_SHOULDER',)),
+    Rule('{side}_lower_arm', ('angle', '{side}_SHOULDER', '{side}_ELBOW', '{side}_WRIST'),
+         (above(0), 60, above(120)), (0, 2, 0, 2), side='right'),
+    Rule('neck', ('angle', 'LEFT_SHOULDER', ('mid', 'LEFT_SHOULDER', 'RIGHT_SHOULDER'), 'NOSE'),
+         (20, 45), (1, 2, 3)),
+    Rule('trunk', ('angle', 'LEFT_SHOULDER', ('xy', 'LEFT_SHOULDER', ('mid', 'LEFT_HIP', 'RIGHT_HIP')),
+                   ('mid', 'LEFT_HIP', 'RIGHT_HIP')),
+         (20, 45), (1, 2, 3)),
+    Rule('legs', ('min', ('dy', 'RIGHT_FOOT_INDEX', 'RIGHT_HIP'), ('dy', 'LEFT_FOOT_INDEX', 'LEFT_HIP')),
+         (above(0),), (2, 1)),
+    Rule('{side}_shoulder', ('dy', '{side}_SHOULDER', '{side}_HIP'), (0,), (2, 0), side='right'),
+    Rule('{side}_shoulder', ('dy', '{side}_ELBOW', '{side}_SHOULDER'),
+         (0,), (0, 2), side='right', requires=('{side}_HIP',)),
+    Rule('{side}_upper_arm', ('angle', '{side}_SHOULDER', '{side}_ELBOW', '{side}_WRIST'),
+         (20, above(45), above(90)), (1, 2, 3, 4), side='left'),
+    Rule('{side}_wrist', ('angle', '{side}_WRIST', '{side}_PINKY', '{side}_ELBOW'),
+         (above(20),), (0, 1), side='left', requires=('{side}_SHOULDER',)),
+    Rule('{side}_shoulder', ('dy', '{side}_SHOULDER', '{side}_HIP'), (0,), (1, 0), side='left'),
+    Rule('{side}_shoulder', ('dy', '{side}_ELBOW', '{side}_SHOULDER'),
+         (0,), (0, 1), side='left', requires=('{side}_HIP',)),
+)
+
+RULA_RULE_TABLE = RuleTable(
+    RULA_RULES,
+    component_names=(
+        'right_upper_arm',
+        'right_wrist',
+        'right_lower_arm',
+        'neck',
+        'trunk',
+        'legs',
+        'right_shoulder',
+        'left_upper_arm',
+        'left_wrist',
+        'left_shoulder',
+    ),
+    action_levels=(
+        "Low risk - maintain current practices",
+        "Monitor and review",
+        "Further investigation and change soon",
+        "Immediate action required",
+    ),
+    action_level_thresholds=(3, 5, 7),
+)
+
+# Action levels of the default rule table, indexed by the action-level codes of the batch scorer
+ACTION_LEVELS = RULA_RULE_TABLE.action_levels
+
+# Minimum risk score of every action level above the lowest one
+ACTION_LEVEL_THRESHOLDS = RULA_RULE_TABLE.action_level_thresholds
+
+# Components of the ergonomic risk score of the default rule table, in the order they are scored
+COMPONENT_NAMES = RULA_RULE_TABLE.component_names
+
+# The RULA-based rules in 3D: joint angles use depth, arm abduction is measured in
+# the frontal plane instead of from the elbow offset and trunk twist adds to the trunk
+RULA_3D_RULES = tuple(rule for rule in RULA_RULES if rule not in RULA_ABDUCTION_RULES) + (
+    Rule('{side}_shoulder', ('abduction', '{side}_HIP', '{side}_SHOULDER', '{side}_ELBOW'),
+         (above(20),), (0, 2), side='right'),
+    Rule('{side}_shoulder', ('abduction', '{side}_HIP', '{side}_SHOULDER', '{side}_ELBOW'),
+         (above(20),), (0, 1), side='left'),
+    Rule('trunk', ('twist', 'LEFT_HIP', 'RIGHT_HIP', 'LEFT_SHOULDER', 'RIGHT_SHOULDER'), (above(10),), (0, 1)),
+)
+
+RULA_3D_RULE_TABLE = RuleTable(
+    RULA_3D_RULES,
+    component_names=RULA_RULE_TABLE.component_names,
+    action_levels=RULA_RULE_TABLE.action_levels,
+    action_level_thresholds=RULA_RULE_TABLE.action_level_thresholds,
+    dimensions=3,
+)
+
+# REBA posture scores of one side of the body, from 2D landmarks. Flexion is measured
+# without its direction, so extension scores like flexion of the same angle.
+REBA_RULES = (
+    Rule('trunk', ('angle', ('mid', 'LEFT_SHOULDER', 'RIGHT_SHOULDER'), ('mid', 'LEFT_HIP', 'RIGHT_HIP'),
+                   ('xy', ('mid', 'LEFT_HIP', 'RIGHT_HIP'), ('mid', 'LEFT_SHOULDER', 'RIGHT_SHOULDER'))),
+         (5, 20, above(60)), (1, 2, 3, 4)),
+    Rule('neck', ('bend', ('mid', 'LEFT_HIP', 'RIGHT_HIP'), ('mid', 'LEFT_SHOULDER', 'RIGHT_SHOULDER'),
+                  ('mid', 'LEFT_EAR', 'RIGHT_EAR')),
+         (above(20),), (1, 2)),
+    # Weight on one leg when the ankles are at clearly different heights
+    Rule('legs', ('abs', ('dy', 'LEFT_ANKLE', 'RIGHT_ANKLE')), (above(0.05),), (1, 2)),
+    Rule('legs', ('bend', '{side}_HIP', '{side}_KNEE', '{side}_ANKLE'), (30, above(60)), (0, 1, 2)),
+    Rule('upper_arm', ('angle', '{side}_HIP', '{side}_SHOULDER', '{side}_ELBOW'),
+         (20, above(45), above(90)), (1, 2, 3, 4)),
+    # Abducted arm
+    Rule('upper_arm', ('abs', ('dx', '{side}_ELBOW', '{side}_SHOULDER')), (above(0.1),), (0, 1)),
+    Rule('lower_arm', ('bend', '{side}_SHOULDER', '{side}_ELBOW', '{side}_WRIST'), (60, above(100)), (2, 1, 2)),
+    Rule('wrist', ('bend', '{side}_ELBOW', '{side}_WRIST', '{side}_INDEX'), (above(15),), (1, 2)),
+)
+
+# REBA Table A, indexed by trunk, neck and legs scores
+REBA_TABLE_A = (
+    ((1, 2, 3, 4), (1, 2, 3, 4), (3, 3, 5, 6)),
+    ((2, 3, 4, 5), (3, 4, 5, 6), (4, 5, 6, 7)),
+    ((2, 4, 5, 6), (4, 5, 6, 7), (5, 6, 7, 8)),
+    ((3, 5, 6, 7), (5, 6, 7, 8), (6, 7, 8, 9)),
+    ((4, 6, 7, 8), (6, 7, 8, 9), (7, 8, 9, 9)),
+)
+
+# REBA Table B, indexed by upper arm, lower arm and wrist scores
+REBA_TABLE_B = (
+    ((1, 2, 2), (1, 2, 3)),
+    ((1, 2, 3), (2, 3, 4)),
+    ((3, 4, 5), (4, 5, 5)),
+    ((4, 5, 5), (5, 6, 7)),
+    ((6, 7, 8), (7, 8, 8)),
+    ((7, 8, 8), (8, 9, 9)),
+)
+
+# REBA Table C, indexed by score A and score B
+REBA_TABLE_C = (
+    (1, 1, 1, 2, 3, 3, 4, 5, 6, 7, 7, 7),
+    (1, 2, 2, 3, 4, 4, 5, 6, 6, 7, 7, 8),
+    (2, 3, 3, 3, 4, 5, 6, 7, 7, 8, 8, 8),
+    (3, 4, 4, 4, 5, 6, 7, 8, 8, 9, 9, 9),
+    (4, 4, 4, 5, 6, 7, 8, 8, 9, 9, 9, 9),
+    (6, 6, 6, 7, 8, 8, 9, 9, 10, 10, 10, 10),
+    (7, 7, 7, 8, 9, 9, 9, 10, 10, 11, 11, 11),
+    (8, 8, 8, 9, 10, 10, 10, 10, 10, 11, 11, 11),
+    (9, 9, 9, 10, 10, 10, 11, 11, 11, 12, 12, 12),
+    (10, 10, 10, 11, 11, 11, 11, 12, 12, 12, 12, 12),
+    (11, 11, 11, 11, 12, 12, 12, 12, 12, 12, 12, 12),
+    (12, 12, 12, 12, 12, 12, 12, 12, 12, 12, 12, 12),
+)
+
+def reba_rule_table(side='right'):
+    """
+    REBA rule table scoring the arm and knee of the given side. No load, coupling or
+    activity scores are added, so the score is Table C of the posture scores.
+    """
+    return RuleTable(
+        REBA_RULES,
+        component_names=('trunk', 'neck', 'legs', 'upper_arm', 'lower_arm', 'wrist'),
+        action_levels=(
+            "Negligible risk",
+            "Low risk - change may be needed",
+            "Medium risk - further investigation and change soon",
+            "High risk - investigate and implement change",
+            "Very high risk - implement change",
+        ),
+        action_level_thresholds=(2, 4, 8, 11),
+        lookups=(
+            Lookup('score_a', ('trunk', 'neck', 'legs'), REBA_TABLE_A),
+            Lookup('score_b', ('upper_arm', 'lower_arm', 'wrist'), REBA_TABLE_B),
+            Lookup('score_c', ('score_a', 'score_b'), REBA_TABLE_C),
+        ),
+        total=('score_c',),
+        side=side,
+    )
+
+REBA_RULE_TABLE = reba_rule_table()
+
+# Rule tables selectable by name
+RULE_TABLES = {
+    'rula': RULA_RULE_TABLE,
+    'rula3d': RULA_3D_RULE_TABLE,
+    'reba': REBA_RULE_TABLE,
+}
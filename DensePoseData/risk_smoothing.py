@@ -0,0 +1,123 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import lfilter
+
+from risk_rules import ACTION_LEVEL_THRESHOLDS
+
+class RollingMedian:
+    """
+    Causal rolling median over the last `window` values of a stream.
+    Only the last window - 1 values are kept between calls, so memory does not
+    grow with the length of the stream. The first frames of a stream use the
+    shorter windows that are available.
+    """
+    def __init__(self, window=5):
+        self.window = window
+        self._history = np.empty(0)
+
+    def __call__(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        padded = np.concatenate([self._history, values])
+        smoothed = np.empty(len(values))
+
+        # Frames at the start of the stream that do not have a full window yet
+        partial = min(max(self.window - 1 - len(self._history), 0), len(values))
+        for index in range(partial):
+            smoothed[index] = np.median(padded[:len(self._history) + index + 1])
+        if len(values) > partial:
+            smoothed[partial:] = np.median(sliding_window_view(padded, self.window), axis=1)[-(len(values) - partial):]
+
+        self._history = padded[-(self.window - 1):] if self.window > 1 else np.empty(0)
+        return smoothed
+
+class ExponentialMovingAverage:
+    """
+    Exponential moving average of a stream, seeded with its first value.
+    alpha defaults to 2 / (window + 1), the usual span-equivalent smoothing factor.
+    """
+    def __init__(self, window=5, alpha=None):
+        self.alpha = alpha if alpha is not None else 2.0 / (window + 1)
+        self._last = None
+
+    def __call__(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return values
+        if self._last is None:
+            self._last = values[0]
+        # y[t] = alpha * x[t] + (1 - alpha) * y[t - 1]
+        smoothed, _ = lfilter([self.alpha], [1.0, self.alpha - 1.0], values, zi=[(1.0 - self.alpha) * self._last])
+        self._last = smoothed[-1]
+        return smoothed
+
+class ActionLevelHysteresis:
+    """
+    Suppress flickering action-level transitions.
+    A new action level is only reported once it has been seen for min_frames
+    consecutive frames; shorter excursions keep the previously reported level.
+    The state carried between calls is the reported level and the current run.
+    """
+    def __init__(self, min_frames=1):
+        self.min_frames = max(min_frames, 1)
+        self._level = None
+        self._run_level = None
+        self._run_length = 0
+
+    def __call__(self, levels):
+        levels = np.asarray(levels)
+        if len(levels) == 0:
+            return levels
+        if self._level is None:
+            self._level = levels[0]
+
+        # Runs of consecutive frames at the same level
+        starts = np.concatenate([[0], np.flatnonzero(levels[1:] != levels[:-1]) + 1])
+        lengths = np.diff(np.append(starts, len(levels)))
+        run_levels = levels[starts]
+        carried = np.zeros(len(starts), dtype=np.int64)
+        if run_levels[0] == self._run_level:
+            carried[0] = self._run_length
+
+        # A run switches the reported level on the frame where it reaches min_frames
+        accepted = (carried < self.min_frames) & (carried + lengths >= self.min_frames)
+        switch_frames = starts[accepted] + self.min_frames - carried[accepted] - 1
+
+        # Forward-fill the reported level from every switch
+        marker = np.zeros(len(levels), dtype=np.int64)
+        marker[switch_frames] = np.arange(1, len(switch_frames) + 1)
+        reported = np.concatenate([[self._level], run_levels[accepted]]).astype(levels.dtype)
+        smoothed = reported[np.maximum.accumulate(marker)]
+
+        self._level = smoothed[-1]
+        self._run_level = run_levels[-1]
+        self._run_length = carried[-1] + lengths[-1]
+        return smoothed
+
+class RiskSmoothingStage:
+    """
+    Streaming post-processing of frame-level risk scores.
+    Scores are smoothed with a rolling median or an EMA over `window` frames,
+    mapped to action levels by action_level_thresholds and passed through
+    ActionLevelHysteresis. Feed the scores of one stream chunk by chunk;
+    memory stays constant per stream.
+    """
+    def __init__(self, method='median', window=5, min_frames=1, action_level_thresholds=ACTION_LEVEL_THRESHOLDS):
+        if method == 'median':
+            self.smoother = RollingMedian(window)
+        elif method == 'ema':
+            self.smoother = ExponentialMovingAverage(window)
+        elif method == 'none':
+            self.smoother = None
+        else:
+            raise ValueError(f"Unknown smoothing method: {method}")
+        self.action_level_thresholds = action_level_thresholds
+        self.hysteresis = ActionLevelHysteresis(min_frames)
+
+    def __call__(self, scores):
+        """
+        Return the smoothed scores, rounded to integers, and their action-level codes.
+        """
+        if self.smoother is not None:
+            scores = np.rint(self.smoother(scores)).astype(np.int64)
+        action_level_codes = np.digitize(scores, self.action_level_thresholds).astype(np.int8)
+        return scores, self.hysteresis(action_level_codes)
@@ -0,0 +1,52 @@
+import os
+import logging
+import argparse
+import numpy as np
+
+from pose_estimation import (ACTION_LEVELS, COMPONENT_NAMES, DEFAULT_CHUNK_SIZE,
+                             calculate_ergonomic_risk_batch)
+from risk_output import open_risk_writer
+
+logger = logging.getLogger(__name__)
+
+def load_detectron_landmarks(landmarks_path):
+    """
+    Load the landmarks saved by tools/infer_landmarks.py: an (N_persons, 33, 3) landmark
+    array in the MediaPipe pose layout, the index of the image of every person and the
+    image names.
+    """
+    with np.load(landmarks_path) as data:
+        return data['landmarks'], data['image_index'], data['image_names'].tolist()
+
+def score_detectron_landmarks(landmarks_path, output_path='ergonomic_risk_scores', chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Score every person detected by Keypoint R-CNN and write one row per person, with the
+    image index as the frame number. Returns the number of scored persons.
+    """
+    landmarks, image_index, image_names = load_detectron_landmarks(landmarks_path)
+    with open_risk_writer(output_path, ACTION_LEVELS, COMPONENT_NAMES) as writer:
+        for start in range(0, len(landmarks), chunk_size):
+            scores, action_level_codes, components = calculate_ergonomic_risk_batch(
+                landmarks[start:start + chunk_size], return_components=True)
+            writer.write(image_index[start:start + chunk_size], scores, action_level_codes, components)
+            logger.debug("Scored persons %d to %d", start, start + len(scores) - 1)
+    logger.info("Scored %d persons from %d images", len(landmarks), len(image_names))
+    return len(landmarks)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Calculate ergonomic risk scores from Keypoint R-CNN landmarks.')
+    parser.add_argument('landmarks_path', help='Landmarks file written by tools/infer_landmarks.py')
+    parser.add_argument('--output', default='ergonomic_risk_scores',
+                        help='Path to write the risk scores to; paths not ending in .csv are '
+                             'written as a columnar directory')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help='Number of persons to score at a time')
+    parser.add_argument('-v', '--verbose', action='count', default=0,
+                        help='Log progress (-v) or per-chunk diagnostics (-vv)')
+
+    # Parse the command-line arguments
+    args = parser.parse_args()
+    logging.basicConfig(level=[logging.WARNING, logging.INFO, logging.DEBUG][min(args.verbose, 2)],
+                        format='%(levelname)s %(name)s: %(message)s')
+
+    score_detectron_landmarks(os.path.expanduser(args.landmarks_path), args.output, args.chunk_size)
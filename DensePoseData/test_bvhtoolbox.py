@@ -1,20 +1,17 @@
-from bvhtoolbox import BvhTree
+from bvh_kinematics import read_bvh_header
 
 # Path to a sample BVH file from the "AirplaneRiveting" dataset
 sample_bvh_file = 'AirplaneRiveting/S01/PLNS01P01R01.bvh'
 
 # Function to read and print information from a BVH file
 def read_bvh_file(file_path):
-    with open(file_path, 'r') as file:
-        bvh_data = file.read()
+    # Only the HIERARCHY and the MOTION header are read, not the frames
+    skeleton, num_frames, frame_time = read_bvh_header(file_path)
 
-    # Create a BvhTree object from the BVH data
-    bvh_tree = BvhTree(bvh_data)
-
-    # Print out some basic information about the BVH file
-    print(f"Number of joints: {len(bvh_tree.get_joints())}")
-    print(f"Frame time: {bvh_tree.frame_time}")
-    print(f"Number of frames: {bvh_tree.nframes}")
+    # Print out some basic information about the BVH file (end sites are not joints)
+    print(f"Number of joints: {sum(1 for channels in skeleton.channels if channels)}")
+    print(f"Frame time: {frame_time}")
+    print(f"Number of frames: {num_frames}")
 
 # Call the function with the path to the sample BVH file
 read_bvh_file(sample_bvh_file)
@@ -0,0 +1,333 @@
+import os
+import time
+import queue
+import logging
+import argparse
+import threading
+from collections import deque
+import numpy as np
+import cv2
+
+from pose_estimation import ACTION_LEVELS, COMPONENT_NAMES, NUM_LANDMARKS, calculate_ergonomic_risk_batch, mp_pose
+from risk_output import load_risk_scores, open_risk_writer
+
+logger = logging.getLogger(__name__)
+
+class LatencyStats:
+    """
+    Latency of one pipeline stage. Count, mean and max cover the whole run;
+    percentiles are taken over the most recent `history` samples.
+    """
+    def __init__(self, name, history=10000):
+        self.name = name
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._recent = deque(maxlen=history)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self._recent.append(seconds)
+
+    def __str__(self):
+        if not self.count:
+            return f"{self.name}: no samples"
+        p50, p95 = np.percentile(self._recent, [50, 95]) * 1000
+        return (f"{self.name}: {self.count} samples, mean {self.total / self.count * 1000:.2f} ms, "
+                f"p50 {p50:.2f} ms, p95 {p95:.2f} ms, max {self.max * 1000:.2f} ms")
+
+# Size of the downscaled grayscale frames used to measure motion between frames
+MOTION_IMAGE_SIZE = (64, 36)
+
+class PipelineStopped(Exception):
+    """
+    Raised in a pipeline stage that is waiting for input after another stage failed.
+    """
+
+def pose_landmarks_to_array(pose_landmarks):
+    """
+    Convert MediaPipe pose_landmarks into an (N_landmarks, 3) array, all NaN if no pose was found.
+    """
+    landmarks = np.full((NUM_LANDMARKS, 3), np.nan)
+    if pose_landmarks is not None:
+        landmarks[:] = [(landmark.x, landmark.y, landmark.z) for landmark in pose_landmarks.landmark]
+    return landmarks
+
+class VideoRiskPipeline:
+    """
+    Score ergonomic risk on a video file or camera with three decoupled threads:
+    frame capture, MediaPipe pose inference, and batch scoring plus result writing.
+    The stages are connected by bounded queues. When drop_frames is set (the default
+    for cameras), captured frames are dropped while the inference queue is full
+    instead of letting latency build up; the written frame indices then have gaps.
+
+    In adaptive mode, pose inference only runs on keyframes: frames whose mean absolute
+    difference from the last keyframe (on small grayscale copies) exceeds motion_threshold
+    gray levels, or that follow max_skip skipped frames. Landmarks of the skipped frames
+    are linearly interpolated between the surrounding keyframes.
+
+    If a stage raises, the other stages stop and run() re-raises the first exception.
+    """
+    def __init__(self, source, output_path, queue_size=8, batch_size=32, drop_frames=None,
+                 max_frames=None, model_complexity=1, smoothing=None, adaptive=False,
+                 motion_threshold=2.0, max_skip=10):
+        self.source = source
+        self.output_path = output_path
+        self.batch_size = batch_size
+        self.drop_frames = isinstance(source, int) if drop_frames is None else drop_frames
+        self.max_frames = max_frames
+        self.model_complexity = model_complexity
+        self.smoothing = smoothing
+        self.adaptive = adaptive
+        self.motion_threshold = motion_threshold
+        self.max_skip = max_skip
+
+        self.frame_queue = queue.Queue(maxsize=queue_size)
+        self.landmark_queue = queue.Queue(maxsize=queue_size)
+        self.stop_event = threading.Event()
+        self.error = None
+
+        self.frames_read = 0
+        self.frames_dropped = 0
+        self.frames_scored = 0
+        self.frames_skipped = 0
+        self.elapsed = None
+        self.stats = {name: LatencyStats(name) for name in ('capture', 'inference', 'scoring', 'end_to_end')}
+
+    def run(self):
+        """
+        Run the pipeline until the source is exhausted, max_frames is reached or
+        the run is interrupted, then log the stage latency report. Re-raises the first
+        exception raised by a stage.
+        """
+        threads = [threading.Thread(target=self._run_stage, args=(stage,), name=stage.__name__.strip('_'))
+                   for stage in (self._capture, self._infer, self._score)]
+        start_time = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(0.1)
+        except KeyboardInterrupt:
+            self.stop_event.set()
+            for thread in threads:
+                thread.join()
+        self.elapsed = time.perf_counter() - start_time
+
+        logger.info("Read %d frames, dropped %d, skipped inference on %d, scored %d in %.2f s (%.1f frames/s scored)",
+                    self.frames_read, self.frames_dropped, self.frames_skipped, self.frames_scored, self.elapsed,
+                    self.frames_scored / max(self.elapsed, 1e-9))
+        for stats in self.stats.values():
+            logger.info("%s", stats)
+        if self.error is not None:
+            raise self.error
+
+    def _run_stage(self, stage):
+        # Record the first failure and stop the other stages
+        try:
+            stage()
+        except BaseException as error:
+            if self.error is None:
+                self.error = error
+            self.stop_event.set()
+            if not isinstance(error, PipelineStopped):
+                logger.error("Pipeline stage %s failed", threading.current_thread().name, exc_info=True)
+
+    def _put(self, target_queue, item):
+        # Blocking put that still notices a stop request. Frames are given up on any stop,
+        # the end-of-stream marker only after a failure, when its consumer may be gone
+        while True:
+            try:
+                target_queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                if self.stop_event.is_set() and (item is not None or self.error is not None):
+                    return
+
+    def _get(self, source_queue):
+        # Blocking get that raises PipelineStopped once another stage has failed
+        while True:
+            if self.error is not None:
+                raise PipelineStopped()
+            try:
+                return source_queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+    def _capture(self):
+        capture = cv2.VideoCapture(self.source)
+        try:
+            while not self.stop_event.is_set():
+                if self.max_frames is not None and self.frames_read >= self.max_frames:
+                    break
+                start_time = time.perf_counter()
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                self.stats['capture'].add(time.perf_counter() - start_time)
+                item = (self.frames_read, start_time, frame)
+                self.frames_read += 1
+
+                if self.drop_frames:
+                    try:
+                        self.frame_queue.put_nowait(item)
+                    except queue.Full:
+                        self.frames_dropped += 1
+                else:
+                    self._put(self.frame_queue, item)
+        finally:
+            capture.release()
+            self._put(self.frame_queue, None)
+
+    def _infer(self):
+        keyframe_index, keyframe_image, keyframe_landmarks = None, None, None
+        skipped = []  # (frame_index, capture_time) of frames waiting for the next keyframe
+        try:
+            with mp_pose.Pose(static_image_mode=False, model_complexity=self.model_complexity) as pose:
+                while True:
+                    item = self._get(self.frame_queue)
+                    if item is None:
+                        break
+                    frame_index, capture_time, frame = item
+
+                    if self.adaptive:
+                        motion_image = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), MOTION_IMAGE_SIZE,
+                                                  interpolation=cv2.INTER_AREA).astype(np.float32)
+                        if (keyframe_image is not None and len(skipped) < self.max_skip and
+                                np.abs(motion_image - keyframe_image).mean() <= self.motion_threshold):
+                            skipped.append((frame_index, capture_time))
+                            self.frames_skipped += 1
+                            continue
+                        keyframe_image = motion_image
+
+                    start_time = time.perf_counter()
+                    results = pose.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+                    landmarks = pose_landmarks_to_array(results.pose_landmarks)
+                    self.stats['inference'].add(time.perf_counter() - start_time)
+
+                    if skipped:
+                        # Interpolate the skipped frames between the previous keyframe and this one
+                        weights = (np.array([index for index, _ in skipped]) - keyframe_index) / (frame_index - keyframe_index)
+                        interpolated = keyframe_landmarks + (landmarks - keyframe_landmarks) * weights[:, None, None]
+                        for (skipped_index, skipped_time), skipped_landmarks in zip(skipped, interpolated):
+                            self._put(self.landmark_queue, (skipped_index, skipped_time, skipped_landmarks))
+                        skipped = []
+                    keyframe_index, keyframe_landmarks = frame_index, landmarks
+                    self._put(self.landmark_queue, (frame_index, capture_time, landmarks))
+
+            # Frames after the last keyframe keep its landmarks
+            for skipped_index, skipped_time in skipped:
+                self._put(self.landmark_queue, (skipped_index, skipped_time, keyframe_landmarks))
+        finally:
+            self._put(self.landmark_queue, None)
+
+    def _score(self):
+        with open_risk_writer(self.output_path, ACTION_LEVELS, COMPONENT_NAMES) as writer:
+            done = False
+            while not done:
+                # Block for one frame, then take whatever else is already waiting
+                batch = [self._get(self.landmark_queue)]
+                while batch[-1] is not None and len(batch) < self.batch_size:
+                    try:
+                        batch.append(self.landmark_queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if batch[-1] is None:
+                    batch.pop()
+                    done = True
+                if not batch:
+                    continue
+
+                start_time = time.perf_counter()
+                frame_numbers = np.array([frame_index for frame_index, _, _ in batch])
+                landmarks = np.stack([frame_landmarks for _, _, frame_landmarks in batch])
+                ergonomic_risk_scores, action_level_codes, components = calculate_ergonomic_risk_batch(
+                    landmarks, return_components=True)
+                if self.smoothing is not None:
+                    ergonomic_risk_scores, action_level_codes = self.smoothing(ergonomic_risk_scores)
+                writer.write(frame_numbers, ergonomic_risk_scores, action_level_codes, components)
+                end_time = time.perf_counter()
+
+                self.stats['scoring'].add((end_time - start_time) / len(batch))
+                for _, capture_time, _ in batch:
+                    self.stats['end_to_end'].add(end_time - capture_time)
+                self.frames_scored += len(batch)
+
+def compare_adaptive_with_full_rate(source, output_path, **pipeline_kwargs):
+    """
+    Score a video file at full rate and in adaptive mode and report the accuracy of
+    the adaptive scores against the full-rate ones together with the speedup.
+    Both runs are written as columnar outputs next to output_path.
+    """
+    output_path = output_path[:-4] if output_path.lower().endswith('.csv') else output_path
+    pipelines = {}
+    for mode in ('full', 'adaptive'):
+        pipelines[mode] = VideoRiskPipeline(source, f'{output_path}_{mode}', drop_frames=False,
+                                            adaptive=mode == 'adaptive', **pipeline_kwargs)
+        pipelines[mode].run()
+
+    full, _ = load_risk_scores(f'{output_path}_full')
+    adaptive, _ = load_risk_scores(f'{output_path}_adaptive')
+    score_error = np.abs(full['score'].astype(np.int64) - adaptive['score'])
+    inference_runs = {mode: pipeline.stats['inference'].count for mode, pipeline in pipelines.items()}
+    print(f"Frames: {len(full['score'])}, inference runs: {inference_runs['full']} full rate, "
+          f"{inference_runs['adaptive']} adaptive")
+    print(f"Speedup: {pipelines['full'].elapsed / max(pipelines['adaptive'].elapsed, 1e-9):.2f}x wall time, "
+          f"{inference_runs['full'] / max(inference_runs['adaptive'], 1):.2f}x fewer inference runs")
+    print(f"Accuracy: {np.mean(score_error == 0) * 100:.2f}% identical scores, "
+          f"{np.mean(full['action_level'] == adaptive['action_level']) * 100:.2f}% identical action levels, "
+          f"mean absolute score error {score_error.mean():.3f}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Calculate ergonomic risk scores live from a camera or video file.')
+    parser.add_argument('source', help='Camera index or path to a video file')
+    parser.add_argument('--output', default='video_ergonomic_risk_scores',
+                        help='Path to write the risk scores to; paths not ending in .csv are '
+                             'written as a columnar directory')
+    parser.add_argument('--queue-size', type=int, default=8,
+                        help='Capacity of the queues between the pipeline stages')
+    parser.add_argument('--batch-size', type=int, default=32,
+                        help='Maximum number of frames scored at a time')
+    parser.add_argument('--drop-frames', action=argparse.BooleanOptionalAction, default=None,
+                        help='Drop frames under backpressure (defaults to on for cameras, off for files)')
+    parser.add_argument('--max-frames', type=int, default=None,
+                        help='Stop after this many frames, e.g. for benchmarking')
+    parser.add_argument('--model-complexity', type=int, choices=[0, 1, 2], default=1,
+                        help='MediaPipe pose model complexity')
+    parser.add_argument('--smoothing', choices=['none', 'median', 'ema'], default='none',
+                        help='Temporal smoothing applied to the frame-level risk scores')
+    parser.add_argument('--window', type=int, default=5,
+                        help='Window of the rolling median or EMA, in frames')
+    parser.add_argument('--min-frames', type=int, default=1,
+                        help='Frames a new action level must persist before it is reported')
+    parser.add_argument('--mode', choices=['full', 'adaptive', 'compare'], default='full',
+                        help='Run pose inference on every frame, only on keyframes with interpolation in '
+                             'between, or benchmark adaptive against full-rate scoring on a video file')
+    parser.add_argument('--motion-threshold', type=float, default=2.0,
+                        help='Mean gray-level change from the last keyframe that triggers a new keyframe')
+    parser.add_argument('--max-skip', type=int, default=10,
+                        help='Maximum number of frames skipped between keyframes')
+
+    # Parse the command-line arguments
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s %(name)s: %(message)s')
+
+    smoothing = None
+    if args.smoothing != 'none' or args.min_frames > 1:
+        from risk_smoothing import RiskSmoothingStage
+        smoothing = RiskSmoothingStage(args.smoothing, args.window, args.min_frames)
+
+    source = int(args.source) if args.source.isdigit() else os.path.expanduser(args.source)
+    if args.mode == 'compare':
+        compare_adaptive_with_full_rate(source, os.path.expanduser(args.output), queue_size=args.queue_size,
+                                        batch_size=args.batch_size, max_frames=args.max_frames,
+                                        model_complexity=args.model_complexity,
+                                        motion_threshold=args.motion_threshold, max_skip=args.max_skip)
+    else:
+        pipeline = VideoRiskPipeline(source, os.path.expanduser(args.output), args.queue_size, args.batch_size,
+                                     args.drop_frames, args.max_frames, args.model_complexity, smoothing,
+                                     args.mode == 'adaptive', args.motion_threshold, args.max_skip)
+        pipeline.run()
@@ -1,9 +1,35 @@
+import argparse
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 
-# Load the CSV file into a DataFrame
-df = pd.read_csv('ergonomic_risk_scores.csv')
+from risk_output import is_columnar_path, load_risk_scores
+
+def load_risk_scores_dataframe(path):
+    """
+    Load risk scores written by pose_estimation.py into a DataFrame.
+    Columnar outputs are memory-mapped instead of parsed, with the action level
+    loaded as a categorical column followed by any component sub-scores.
+    """
+    if not is_columnar_path(path):
+        return pd.read_csv(path)
+    columns, meta = load_risk_scores(path)
+    df = pd.DataFrame({
+        'Frame': columns['frame'],
+        'Ergonomic Risk Score': columns['score'],
+        'Action Level': pd.Categorical.from_codes(columns['action_level'], categories=meta['action_levels']),
+    })
+    for component_name in meta['components']:
+        df[component_name] = columns[component_name]
+    return df
+
+parser = argparse.ArgumentParser(description='Plot the distribution of ergonomic risk scores.')
+parser.add_argument('risk_scores_path', nargs='?', default='ergonomic_risk_scores',
+                    help='Risk scores written by pose_estimation.py, as CSV or a columnar directory')
+args = parser.parse_args()
+
+# Load the risk scores into a DataFrame
+df = load_risk_scores_dataframe(args.risk_scores_path)
 
 # Set the style for seaborn
 sns.set(style="whitegrid")
@@ -1019,6 +1019,16 @@ __C.EXPECTED_RESULTS_EMAIL = b''
 # specified by DOWNLOAD_CACHE
 __C.DOWNLOAD_CACHE = b'/tmp/detectron-download-cache'
 
+# Roidbs are cached in ROIDB_CACHE_DIR, keyed by the checksums of the dataset
+# annotation files and the config options that affect them (see
+# detectron/datasets/roidb_cache.py); set to '' to always rebuild them
+__C.ROIDB_CACHE_DIR = b'/tmp/detectron-roidb-cache'
+
+# DensePose annotations are converted to a cache next to their json file (see
+# detectron/datasets/densepose_annotations.py), or in DENSEPOSE_CACHE_DIR if
+# that is not writable
+__C.DENSEPOSE_CACHE_DIR = b'/tmp/detectron-densepose-cache'
+
 
 # ---------------------------------------------------------------------------- #
 # Cluster options
@@ -0,0 +1,289 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+##############################################################################
+
+"""Columnar on-disk cache of the DensePose annotations of a COCO json file.
+
+The dp_x, dp_y, dp_I, dp_U and dp_V point annotations of all annotations are
+stored as flat typed arrays (float16 coordinates, uint8 part index) with
+per-annotation offsets. The 14 part masks of an annotation are merged into one
+256x256 part label map, exactly as segm_utils.GetDensePoseMask does, and stored
+run-length encoded. The arrays are saved as .npy files in '<json file>.densepose'
+(or under cfg.DENSEPOSE_CACHE_DIR if the json directory is not writable) and
+memory-mapped when loaded, so roidbs only carry row numbers into them.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import hashlib
+import logging
+import numpy as np
+import os
+import shutil
+import threading
+
+from detectron.core.config import cfg
+from detectron.datasets.json_index import IndexedCOCO
+import detectron.utils.segms as segm_utils
+
+logger = logging.getLogger(__name__)
+
+# Bumped whenever the layout of the cache changes
+CACHE_VERSION = 1
+
+# Side of the square DensePose part label map
+MASK_SIZE = 256
+
+# Number of annotations read from the json file at a time when building
+_BUILD_BATCH_SIZE = 1000
+
+_POINT_DTYPES = {
+    'dp_x': np.float16,
+    'dp_y': np.float16,
+    'dp_I': np.uint8,
+    'dp_U': np.float16,
+    'dp_V': np.float16,
+}
+
+_ARRAY_NAMES = (
+    'ann_ids', 'point_offsets', 'mask_offsets', 'mask_values', 'mask_lengths'
+) + tuple(sorted(_POINT_DTYPES))
+
+# DensePoseAnnotations loaded in this process, by json file
+_LOADED = {}
+_LOADED_LOCK = threading.Lock()
+
+
+def get_cache_dir(json_file):
+    """Return the default cache directory of a json file."""
+    return json_file + '.densepose'
+
+
+def get_fallback_cache_dir(json_file):
+    """Return the cache directory of a json file under cfg.DENSEPOSE_CACHE_DIR,
+    used when the default one cannot be written.
+    """
+    path_hash = hashlib.sha1(
+        os.path.abspath(json_file).encode('utf-8')
+    ).hexdigest()
+    return os.path.join(
+        cfg.DENSEPOSE_CACHE_DIR,
+        '{}_{}.densepose'.format(os.path.basename(json_file), path_hash[:16])
+    )
+
+
+def encode_label_map(label_map):
+    """Run-length encode a label map (in C order) into uint8 values and uint32
+    run lengths.
+    """
+    flat = np.asarray(label_map).ravel()
+    starts = np.flatnonzero(np.r_[True, flat[1:] != flat[:-1]])
+    lengths = np.diff(np.r_[starts, flat.size])
+    return flat[starts].astype(np.uint8), lengths.astype(np.uint32)
+
+
+def decode_label_map(values, lengths):
+    """Inverse of encode_label_map; returns a float64 MASK_SIZE x MASK_SIZE
+    label map like segm_utils.GetDensePoseMask.
+    """
+    return np.repeat(values, lengths).reshape(
+        (MASK_SIZE, MASK_SIZE)
+    ).astype(np.float64)
+
+
+class DensePoseAnnotations(object):
+    """DensePose points and part label maps of the annotations of a dataset,
+    addressed by row. Rows are in increasing annotation id order.
+    """
+
+    def __init__(self, arrays):
+        for name in _ARRAY_NAMES:
+            setattr(self, '_' + name, arrays[name])
+
+    def __len__(self):
+        return len(self._ann_ids)
+
+    def rows(self, ann_ids):
+        """Return the rows of the given annotation ids, -1 for annotations
+        without DensePose annotations.
+        """
+        ann_ids = np.asarray(ann_ids, dtype=np.int64)
+        if len(self._ann_ids) == 0:
+            return -np.ones(ann_ids.shape, dtype=np.int64)
+        rows = np.searchsorted(self._ann_ids, ann_ids)
+        rows = np.minimum(rows, len(self._ann_ids) - 1)
+        found = self._ann_ids[rows] == ann_ids
+        return np.where(found, rows, -1).astype(np.int64)
+
+    def points(self, row):
+        """Return the (I, U, V, x, y) point annotations of a row as float64
+        arrays.
+        """
+        start, end = self._point_offsets[row:row + 2]
+        return tuple(
+            np.array(getattr(self, '_' + name)[start:end], dtype=np.float64)
+            for name in ('dp_I', 'dp_U', 'dp_V', 'dp_x', 'dp_y')
+        )
+
+    def mask(self, row):
+        """Return the part label map of a row (see decode_label_map)."""
+        start, end = self._mask_offsets[row:row + 2]
+        return decode_label_map(
+            self._mask_values[start:end], self._mask_lengths[start:end]
+        )
+
+
+def build_densepose_annotations(coco_index, cache_dir=None):
+    """Convert the DensePose annotations of a json file, read through its
+    json_index.IndexedCOCO, to the columnar format and save them in cache_dir
+    (default: get_cache_dir(json file), falling back to
+    get_fallback_cache_dir(json file)). Returns the arrays. Raises IOError if
+    the arrays cannot be saved, since get_densepose_annotations reads them back.
+    """
+    json_file = coco_index.annotation_file
+    logger.info('Converting DensePose annotations of {}'.format(json_file))
+    stat = os.stat(json_file)
+    ann_ids = sorted(coco_index.getAnnIds())
+
+    kept_ids = []
+    points = {name: [] for name in _POINT_DTYPES}
+    point_counts = []
+    mask_values = []
+    mask_lengths = []
+    mask_counts = []
+    for i in range(0, len(ann_ids), _BUILD_BATCH_SIZE):
+        for obj in coco_index.loadAnns(ann_ids[i:i + _BUILD_BATCH_SIZE]):
+            if 'dp_x' not in obj:
+                continue
+            kept_ids.append(obj['id'])
+            for name, dtype in _POINT_DTYPES.items():
+                points[name].append(np.array(obj[name], dtype=dtype))
+            point_counts.append(len(obj['dp_x']))
+            values, lengths = encode_label_map(
+                segm_utils.GetDensePoseMask(obj['dp_masks'])
+            )
+            mask_values.append(values)
+            mask_lengths.append(lengths)
+            mask_counts.append(len(values))
+
+    arrays = {
+        'ann_ids': np.array(kept_ids, dtype=np.int64),
+        'point_offsets': np.r_[0, np.cumsum(point_counts)].astype(np.int64),
+        'mask_offsets': np.r_[0, np.cumsum(mask_counts)].astype(np.int64),
+        'mask_values': _concatenate(mask_values, np.uint8),
+        'mask_lengths': _concatenate(mask_lengths, np.uint32),
+    }
+    for name, dtype in _POINT_DTYPES.items():
+        arrays[name] = _concatenate(points[name], dtype)
+    meta = np.array([CACHE_VERSION, stat.st_size, stat.st_mtime])
+
+    cache_dirs = _get_cache_dirs(json_file, cache_dir)
+    for cache_dir in cache_dirs:
+        try:
+            _save_arrays(arrays, meta, cache_dir)
+            logger.info(
+                'Wrote DensePose annotations of {} objects to {}'.format(
+                    len(kept_ids), cache_dir
+                )
+            )
+            return arrays
+        except (IOError, OSError) as e:
+            logger.warning('Could not write {}: {}'.format(cache_dir, e))
+    raise IOError(
+        'Could not write the DensePose annotations of {} to any of: {}'.format(
+            json_file, ', '.join(cache_dirs)
+        )
+    )
+
+
+def load_densepose_annotations(coco_index, cache_dir=None):
+    """Return the DensePoseAnnotations of a json file read through coco_index,
+    memory-mapped from cache_dir and built first if missing or out of date.
+    Loaded annotations are shared by all users in the process (see
+    get_densepose_annotations).
+    """
+    return _load(coco_index.annotation_file, cache_dir, lambda: coco_index)
+
+
+def get_densepose_annotations(json_file):
+    """Return the DensePoseAnnotations of a json file, e.g. for a roidb entry
+    whose 'dp_annotations' field names it. Loads the cache if the annotations
+    are not loaded in this process yet, and builds it through a
+    json_index.IndexedCOCO if it is missing or out of date.
+    """
+    return _load(json_file, None, lambda: IndexedCOCO(json_file))
+
+
+def _load(json_file, cache_dir, get_coco_index):
+    with _LOADED_LOCK:
+        if json_file not in _LOADED:
+            for d in _get_cache_dirs(json_file, cache_dir):
+                arrays = _load_arrays(json_file, d)
+                if arrays is not None:
+                    break
+            else:
+                arrays = build_densepose_annotations(
+                    get_coco_index(), cache_dir
+                )
+            _LOADED[json_file] = DensePoseAnnotations(arrays)
+        return _LOADED[json_file]
+
+
+def _get_cache_dirs(json_file, cache_dir):
+    """Return the directories the cache of a json file is looked up and saved
+    in, in order of preference.
+    """
+    if cache_dir is not None:
+        return [cache_dir]
+    cache_dirs = [get_cache_dir(json_file)]
+    if cfg.DENSEPOSE_CACHE_DIR:
+        cache_dirs.append(get_fallback_cache_dir(json_file))
+    return cache_dirs
+
+
+def _save_arrays(arrays, meta, cache_dir):
+    tmp_dir = '{}.{}.tmp'.format(cache_dir, os.getpid())
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+    try:
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_dir, name + '.npy'), array)
+        np.save(os.path.join(tmp_dir, 'meta.npy'), meta)
+        if os.path.exists(cache_dir):
+            shutil.rmtree(cache_dir)
+        os.rename(tmp_dir, cache_dir)
+    finally:
+        if os.path.exists(tmp_dir):
+            shutil.rmtree(tmp_dir)
+
+
+def _load_arrays(json_file, cache_dir):
+    """Memory-map the arrays in cache_dir, or return None if it is missing or
+    out of date.
+    """
+    meta_file = os.path.join(cache_dir, 'meta.npy')
+    if not os.path.exists(meta_file):
+        return None
+    stat = os.stat(json_file)
+    version, size, mtime = np.load(meta_file)
+    if (int(version) != CACHE_VERSION or int(size) != stat.st_size or
+            mtime != stat.st_mtime):
+        logger.info('DensePose cache {} is out of date'.format(cache_dir))
+        return None
+    return {
+        name: np.load(os.path.join(cache_dir, name + '.npy'), mmap_mode='r')
+        for name in _ARRAY_NAMES
+    }
+
+
+def _concatenate(arrays, dtype):
+    if len(arrays) == 0:
+        return np.zeros((0, ), dtype=dtype)
+    return np.concatenate(arrays).astype(dtype, copy=False)
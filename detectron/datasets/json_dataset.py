@@ -17,7 +17,6 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
-import copy
 import cPickle as pickle
 import logging
 import numpy as np
@@ -32,6 +31,9 @@ from pycocotools import mask as COCOmask
 from pycocotools.coco import COCO
 
 from detectron.core.config import cfg
+from detectron.datasets.densepose_annotations import load_densepose_annotations
+from detectron.datasets.json_index import IndexedCOCO
+import detectron.datasets.roidb_cache as roidb_cache
 from detectron.utils.timer import Timer
 import detectron.datasets.dataset_catalog as dataset_catalog
 import detectron.utils.boxes as box_utils
@@ -53,17 +55,24 @@ class JsonDataset(object):
         self.name = name
         self.image_directory = dataset_catalog.get_im_dir(name)
         self.image_prefix = dataset_catalog.get_im_prefix(name)
-        self.COCO = COCO(dataset_catalog.get_ann_fn(name))
+        # Roidbs are built through a byte-offset index of the json file, which
+        # reads only the images and annotations that are asked for; the full
+        # COCO api object (self.COCO) is only loaded if used, e.g. to evaluate
+        self.annotation_file = dataset_catalog.get_ann_fn(name)
+        self.coco_index = IndexedCOCO(self.annotation_file)
+        self._COCO = None
         self.debug_timer = Timer()
         # Set up dataset classes
-        category_ids = self.COCO.getCatIds()
-        categories = [c['name'] for c in self.COCO.loadCats(category_ids)]
+        category_ids = self.coco_index.getCatIds()
+        categories = [
+            c['name'] for c in self.coco_index.loadCats(category_ids)
+        ]
         self.category_to_id_map = dict(zip(categories, category_ids))
         self.classes = ['__background__'] + categories
         self.num_classes = len(self.classes)
         self.json_category_id_to_contiguous_id = {
             v: i + 1
-            for i, v in enumerate(self.COCO.getCatIds())
+            for i, v in enumerate(self.coco_index.getCatIds())
         }
         self.contiguous_category_id_to_json_id = {
             v: k
@@ -71,26 +80,69 @@ class JsonDataset(object):
         }
         self._init_keypoints()
 
+    @property
+    def COCO(self):
+        """The pycocotools COCO api object of the whole json file, loaded on
+        first use.
+        """
+        if self._COCO is None:
+            self._COCO = COCO(self.annotation_file)
+        return self._COCO
+
+    @property
+    def densepose_annotations(self):
+        """The DensePose annotations of the json file (see
+        densepose_annotations.DensePoseAnnotations), loaded on first use.
+        """
+        return load_densepose_annotations(self.coco_index)
+
     def get_roidb(
         self,
         gt=False,
         proposal_file=None,
         min_proposal_size=2,
         proposal_limit=-1,
-        crowd_filter_thresh=0
+        crowd_filter_thresh=0,
+        use_cache=True
     ):
         """Return an roidb corresponding to the json dataset. Optionally:
            - include ground truth boxes in the roidb
            - add proposals specified in a proposals file
            - filter proposals based on a minimum side length
            - filter proposals that intersect with crowd regions
+        The roidb is loaded from the roidb cache (see roidb_cache) if use_cache
+        is True and the cache holds it.
         """
         assert gt is True or crowd_filter_thresh == 0, \
             'Crowd filter threshold must be 0 if ground-truth annotations ' \
             'are not included.'
-        image_ids = self.COCO.getImgIds()
+        if not use_cache:
+            return self._build_roidb(
+                gt, proposal_file, min_proposal_size, proposal_limit,
+                crowd_filter_thresh
+            )
+        return roidb_cache.cached_roidb(
+            [self],
+            lambda: self._build_roidb(
+                gt, proposal_file, min_proposal_size, proposal_limit,
+                crowd_filter_thresh
+            ),
+            function='JsonDataset.get_roidb',
+            gt=gt,
+            proposal_file=roidb_cache.get_file_key(proposal_file),
+            min_proposal_size=min_proposal_size,
+            proposal_limit=proposal_limit,
+            crowd_filter_thresh=crowd_filter_thresh
+        )
+
+    def _build_roidb(
+        self, gt, proposal_file, min_proposal_size, proposal_limit,
+        crowd_filter_thresh
+    ):
+        """Build the roidb returned by get_roidb."""
+        image_ids = self.coco_index.getImgIds()
         image_ids.sort()
-        roidb = copy.deepcopy(self.COCO.loadImgs(image_ids))
+        roidb = self.coco_index.loadImgs(image_ids)
         for entry in roidb:
             self._prep_roidb_entry(entry)
         if gt:
@@ -132,14 +184,6 @@ class JsonDataset(object):
         # Empty placeholders
         entry['boxes'] = np.empty((0, 4), dtype=np.float32)
         entry['segms'] = []
-        # densepose entries
-        entry['dp_x'] = []
-        entry['dp_y'] = []
-        entry['dp_I'] = []
-        entry['dp_U'] = []
-        entry['dp_V'] = []
-        entry['dp_masks'] = []
-        #
         entry['gt_classes'] = np.empty((0), dtype=np.int32)
         entry['seg_areas'] = np.empty((0), dtype=np.float32)
         entry['gt_overlaps'] = scipy.sparse.csr_matrix(
@@ -155,6 +199,10 @@ class JsonDataset(object):
             )
         if cfg.MODEL.BODY_UV_ON:
             entry['ignore_UV_body'] = np.empty((0),  dtype=np.bool)
+            # DensePose annotations are rows of the columnar cache of the json
+            # file (see densepose_annotations), -1 for objects without any
+            entry['dp_annotations'] = self.annotation_file
+            entry['dp_rows'] = np.empty((0), dtype=np.int64)
         #    entry['Box_image_links_body'] = []
         # Remove unwanted fields that come from the json file (if they exist)
         for k in ['date_captured', 'url', 'license', 'file_name']:
@@ -163,19 +211,11 @@ class JsonDataset(object):
 
     def _add_gt_annotations(self, entry):
         """Add ground truth annotation metadata to an roidb entry."""
-        ann_ids = self.COCO.getAnnIds(imgIds=entry['id'], iscrowd=None)
-        objs = self.COCO.loadAnns(ann_ids)
+        ann_ids = self.coco_index.getAnnIds(imgIds=entry['id'], iscrowd=None)
+        objs = self.coco_index.loadAnns(ann_ids)
         # Sanitize bboxes -- some are invalid
         valid_objs = []
         valid_segms = []
-        ####
-        valid_dp_x = []
-        valid_dp_y = []
-        valid_dp_I = []
-        valid_dp_U = []
-        valid_dp_V = []
-        valid_dp_masks = []
-        ####
         width = entry['width']
         height = entry['height']
         for obj in objs:
@@ -199,22 +239,6 @@ class JsonDataset(object):
                 obj['clean_bbox'] = [x1, y1, x2, y2]
                 valid_objs.append(obj)
                 valid_segms.append(obj['segmentation'])
-                ###
-                if 'dp_x' in obj.keys():
-                    valid_dp_x.append(obj['dp_x'])
-                    valid_dp_y.append(obj['dp_y'])
-                    valid_dp_I.append(obj['dp_I'])
-                    valid_dp_U.append(obj['dp_U'])
-                    valid_dp_V.append(obj['dp_V'])
-                    valid_dp_masks.append(obj['dp_masks'])
-                else:
-                    valid_dp_x.append([])
-                    valid_dp_y.append([])
-                    valid_dp_I.append([])
-                    valid_dp_U.append([])
-                    valid_dp_V.append([])
-                    valid_dp_masks.append([])
-                ###
         num_valid_objs = len(valid_objs)
         ##
         boxes = np.zeros((num_valid_objs, 4), dtype=entry['boxes'].dtype)
@@ -235,6 +259,9 @@ class JsonDataset(object):
             )
         if cfg.MODEL.BODY_UV_ON:
             ignore_UV_body = np.zeros((num_valid_objs))
+            dp_rows = self.densepose_annotations.rows(
+                [obj['id'] for obj in valid_objs]
+            )
             #Box_image_body  = [None]*num_valid_objs
 
         im_has_visible_keypoints = False
@@ -266,12 +293,6 @@ class JsonDataset(object):
                 gt_overlaps[ix, cls] = 1.0
         entry['boxes'] = np.append(entry['boxes'], boxes, axis=0)
         entry['segms'].extend(valid_segms)
-        entry['dp_x'].extend(valid_dp_x)
-        entry['dp_y'].extend(valid_dp_y)
-        entry['dp_I'].extend(valid_dp_I)
-        entry['dp_U'].extend(valid_dp_U)
-        entry['dp_V'].extend(valid_dp_V)
-        entry['dp_masks'].extend(valid_dp_masks)
         entry['gt_classes'] = np.append(entry['gt_classes'], gt_classes)
         entry['seg_areas'] = np.append(entry['seg_areas'], seg_areas)
         entry['gt_overlaps'] = np.append(
@@ -289,6 +310,7 @@ class JsonDataset(object):
             entry['has_visible_keypoints'] = im_has_visible_keypoints
         if cfg.MODEL.BODY_UV_ON:
             entry['ignore_UV_body'] = np.append(entry['ignore_UV_body'], ignore_UV_body)
+            entry['dp_rows'] = np.append(entry['dp_rows'], dp_rows)
             #entry['Box_image_links_body'].extend(Box_image_body)
             entry['has_body_uv'] = im_has_any_body_uv
 
@@ -331,7 +353,9 @@ class JsonDataset(object):
         self.num_keypoints = 0
         # Thus far only the 'person' category has keypoints
         if 'person' in self.category_to_id_map:
-            cat_info = self.COCO.loadCats([self.category_to_id_map['person']])
+            cat_info = self.coco_index.loadCats(
+                [self.category_to_id_map['person']]
+            )
         else:
             return
 
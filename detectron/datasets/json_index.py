@@ -0,0 +1,251 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+##############################################################################
+
+"""Byte-offset index of a COCO json annotation file.
+
+The index is built by streaming the json file once. It records where the json
+object of every image and annotation starts and ends in the file, so that any
+image or annotation can be loaded later by reading and parsing only its own
+bytes. The index is stored next to the json file as '<json file>.index.npz'
+and rebuilt whenever the json file changes.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import hashlib
+import json
+import logging
+import mmap
+import numpy as np
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+# Bumped whenever the layout of the index file changes
+INDEX_VERSION = 2
+
+# Top-level arrays of json objects that are indexed
+INDEXED_SECTIONS = ('images', 'annotations', 'categories')
+
+# A complete json string (skipped as a whole) or a structural character
+_JSON_TOKEN_RE = re.compile(br'"[^"\\]*(?:\\.[^"\\]*)*"|[\[\]{}]')
+
+
+def get_index_file(json_file):
+    """Return the default index file path of a json file."""
+    return json_file + '.index.npz'
+
+
+def scan_json_objects(json_file, sections=INDEXED_SECTIONS):
+    """Stream a json file once and return, for every section in sections that is
+    a top-level array, the (#objects, 2) array of [start, end) byte offsets of
+    the objects in that array, and the SHA-1 of the file.
+    """
+    offsets = {section: [] for section in sections}
+    sha1 = hashlib.sha1()
+    with open(json_file, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            empty = np.zeros((0, 2), dtype=np.int64)
+            return {s: empty for s in sections}, sha1.hexdigest()
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            sha1.update(mm)
+            depth = 0
+            last_key = None
+            section = None
+            start = None
+            for m in _JSON_TOKEN_RE.finditer(mm):
+                s = m.start()
+                c = mm[s:s + 1]
+                if c == b'"':
+                    if depth == 1:
+                        last_key = mm[s + 1:m.end() - 1].decode('utf-8')
+                elif c == b'{' or c == b'[':
+                    if depth == 1:
+                        section = last_key if c == b'[' else None
+                    elif depth == 2 and c == b'{' and section in offsets:
+                        start = s
+                    depth += 1
+                else:
+                    depth -= 1
+                    if depth == 2 and start is not None:
+                        offsets[section].append((start, m.end()))
+                        start = None
+                    elif depth == 1:
+                        section = None
+        finally:
+            mm.close()
+    offsets = {
+        s: np.array(o, dtype=np.int64).reshape((-1, 2))
+        for s, o in offsets.items()
+    }
+    return offsets, sha1.hexdigest()
+
+
+def build_json_index(json_file, index_file=None):
+    """Build the index of a COCO json file in a single pass and save it to
+    index_file (default: get_index_file(json_file)). Returns the index arrays.
+    """
+    if index_file is None:
+        index_file = get_index_file(json_file)
+    logger.info('Indexing {}'.format(json_file))
+    stat = os.stat(json_file)
+    offsets, sha1 = scan_json_objects(json_file)
+
+    # Ids are parsed from the object bytes just located
+    index = {}
+    with open(json_file, 'rb') as f:
+        for section in INDEXED_SECTIONS:
+            keys = ['id', 'image_id'] if section == 'annotations' else ['id']
+            ids = np.zeros((len(offsets[section]), len(keys)), dtype=np.int64)
+            for i, (start, end) in enumerate(offsets[section]):
+                f.seek(start)
+                obj = json.loads(f.read(end - start).decode('utf-8'))
+                ids[i] = [obj[k] for k in keys]
+            index[section + '_ids'] = ids[:, 0]
+            index[section + '_offsets'] = offsets[section]
+            if section == 'annotations':
+                index['annotations_image_ids'] = ids[:, 1]
+
+    # Annotations grouped by image (in file order within an image, as in the
+    # COCO api), so that the annotations of an image are a contiguous slice
+    order = np.argsort(index['annotations_image_ids'], kind='mergesort')
+    index['annotations_order'] = order.astype(np.int64)
+    index['version'] = np.int64(INDEX_VERSION)
+    index['source_size'] = np.int64(stat.st_size)
+    index['source_mtime'] = np.float64(stat.st_mtime)
+    index['source_sha1'] = np.array(sha1)
+
+    try:
+        tmp_file = index_file + '.tmp'
+        with open(tmp_file, 'wb') as f:
+            np.savez(f, **index)
+        os.rename(tmp_file, index_file)
+        logger.info(
+            'Wrote index of {} images and {} annotations to {}'.format(
+                len(index['images_ids']), len(index['annotations_ids']),
+                index_file
+            )
+        )
+    except (IOError, OSError) as e:
+        logger.warning('Could not write {}: {}'.format(index_file, e))
+    return index
+
+
+def load_json_index(json_file, index_file=None):
+    """Load the index of a json file, building it first if it is missing or out
+    of date.
+    """
+    if index_file is None:
+        index_file = get_index_file(json_file)
+    if os.path.exists(index_file):
+        stat = os.stat(json_file)
+        with np.load(index_file) as data:
+            index = {k: data[k] for k in data.files}
+        if (int(index.get('version', -1)) == INDEX_VERSION and
+                int(index['source_size']) == stat.st_size and
+                float(index['source_mtime']) == stat.st_mtime):
+            return index
+        logger.info('Index {} is out of date'.format(index_file))
+    return build_json_index(json_file, index_file)
+
+
+class IndexedCOCO(object):
+    """Read-only access to a COCO json file through its byte-offset index.
+
+    Implements the parts of the pycocotools COCO api used to build roidbs
+    (getCatIds, loadCats, getImgIds, loadImgs, getAnnIds and loadAnns) without
+    loading the whole file. Images and annotations are read and parsed on
+    demand; categories are small and loaded up front.
+    """
+
+    def __init__(self, annotation_file, index_file=None):
+        self.annotation_file = annotation_file
+        index = load_json_index(annotation_file, index_file)
+        # SHA-1 of the json file, e.g. to key caches derived from it
+        self.checksum = str(index['source_sha1'])
+        self._img_ids = index['images_ids']
+        self._img_offsets = index['images_offsets']
+        self._img_rows = {int(k): i for i, k in enumerate(self._img_ids)}
+        self._ann_ids = index['annotations_ids']
+        self._ann_offsets = index['annotations_offsets']
+        self._ann_rows = {int(k): i for i, k in enumerate(self._ann_ids)}
+        # Annotations of every image are a contiguous slice of _ann_order
+        self._ann_order = index['annotations_order']
+        self._ann_image_ids = index['annotations_image_ids'][self._ann_order]
+        self.cats = {
+            c['id']: c
+            for c in self._load(index['categories_offsets'],
+                                list(range(len(index['categories_ids']))))
+        }
+
+    def _load(self, offsets, rows):
+        """Parse the json objects at the given rows of an offsets array, reading
+        them in file order.
+        """
+        rows = list(rows)
+        objs = [None] * len(rows)
+        with open(self.annotation_file, 'rb') as f:
+            for i in sorted(
+                range(len(rows)), key=lambda i: offsets[rows[i], 0]
+            ):
+                start, end = offsets[rows[i]]
+                f.seek(start)
+                objs[i] = json.loads(f.read(end - start).decode('utf-8'))
+        return objs
+
+    def getCatIds(self):
+        return sorted(self.cats.keys())
+
+    def loadCats(self, ids=()):
+        return [self.cats[i] for i in _as_list(ids)]
+
+    def getImgIds(self):
+        return [int(i) for i in self._img_ids]
+
+    def loadImgs(self, ids=()):
+        return self._load(
+            self._img_offsets, [self._img_rows[i] for i in _as_list(ids)]
+        )
+
+    def getAnnIds(self, imgIds=(), iscrowd=None):
+        """Return the ids of all annotations of the given images. As in the COCO
+        api, iscrowd=None returns all annotations; otherwise only those whose
+        iscrowd flag matches (which requires parsing them).
+        """
+        img_ids = _as_list(imgIds)
+        if len(img_ids) == 0:
+            rows = np.arange(len(self._ann_ids))
+        else:
+            rows = np.concatenate([
+                self._ann_order[
+                    np.searchsorted(self._ann_image_ids, i, 'left'):
+                    np.searchsorted(self._ann_image_ids, i, 'right')
+                ] for i in img_ids
+            ])
+        ann_ids = [int(i) for i in self._ann_ids[rows]]
+        if iscrowd is not None:
+            ann_ids = [
+                a['id'] for a in self.loadAnns(ann_ids)
+                if bool(a['iscrowd']) == bool(iscrowd)
+            ]
+        return ann_ids
+
+    def loadAnns(self, ids=()):
+        return self._load(
+            self._ann_offsets, [self._ann_rows[i] for i in _as_list(ids)]
+        )
+
+
+def _as_list(ids):
+    if isinstance(ids, (list, tuple, np.ndarray)):
+        return list(ids)
+    return [ids]
@@ -18,6 +18,7 @@ import numpy as np
 
 from detectron.core.config import cfg
 from detectron.datasets.json_dataset import JsonDataset
+import detectron.datasets.roidb_cache as roidb_cache
 import detectron.utils.boxes as box_utils
 import detectron.utils.keypoints as keypoint_utils
 import detectron.utils.segms as segm_utils
@@ -29,13 +30,15 @@ def combined_roidb_for_training(dataset_names, proposal_files):
     """Load and concatenate roidbs for one or more datasets, along with optional
     object proposals. The roidb entries are then prepared for use in training,
     which involves caching certain types of metadata for each roidb entry.
+    The prepared roidb is loaded from the roidb cache (see roidb_cache) if it
+    holds one for the same datasets, proposals and config.
     """
-    def get_roidb(dataset_name, proposal_file):
-        ds = JsonDataset(dataset_name)
+    def get_roidb(ds, proposal_file):
         roidb = ds.get_roidb(
             gt=True,
             proposal_file=proposal_file,
-            crowd_filter_thresh=cfg.TRAIN.CROWD_FILTER_THRESH
+            crowd_filter_thresh=cfg.TRAIN.CROWD_FILTER_THRESH,
+            use_cache=False
         )
         if cfg.TRAIN.USE_FLIPPED:
             logger.info('Appending horizontally-flipped training examples...')
@@ -50,15 +53,26 @@ def combined_roidb_for_training(dataset_names, proposal_files):
     if len(proposal_files) == 0:
         proposal_files = (None, ) * len(dataset_names)
     assert len(dataset_names) == len(proposal_files)
-    roidbs = [get_roidb(*args) for args in zip(dataset_names, proposal_files)]
-    roidb = roidbs[0]
-    for r in roidbs[1:]:
-        roidb.extend(r)
-    roidb = filter_for_training(roidb)
-
-    logger.info('Computing bounding-box regression targets...')
-    add_bbox_regression_targets(roidb)
-    logger.info('done')
+    datasets = [JsonDataset(name) for name in dataset_names]
+
+    def build_roidb():
+        roidbs = [get_roidb(*args) for args in zip(datasets, proposal_files)]
+        roidb = roidbs[0]
+        for r in roidbs[1:]:
+            roidb.extend(r)
+        roidb = filter_for_training(roidb)
+
+        logger.info('Computing bounding-box regression targets...')
+        add_bbox_regression_targets(roidb)
+        logger.info('done')
+        return roidb
+
+    roidb = roidb_cache.cached_roidb(
+        datasets,
+        build_roidb,
+        function='combined_roidb_for_training',
+        proposal_files=[roidb_cache.get_file_key(f) for f in proposal_files]
+    )
 
     _compute_and_log_stats(roidb)
 
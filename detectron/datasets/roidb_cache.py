@@ -0,0 +1,287 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+##############################################################################
+
+"""On-disk cache of roidbs.
+
+A cached roidb is keyed by the checksums of the annotation files of its
+datasets, the config options that affect roidbs (_CFG_KEYS) and the arguments
+it was built with. It is stored in a directory under cfg.ROIDB_CACHE_DIR:
+
+  - every field that is a numpy array in all entries is concatenated along its
+    first axis into one .npy file, with the per-entry offsets in another. It is
+    memory-mapped when loaded and every entry gets a view of its rows;
+  - scipy.sparse fields (gt_overlaps) are stored as the concatenated CSR data,
+    indices and row pointers of all entries, with per-entry row and nonzero
+    offsets, and every entry gets a CSR matrix over its slices;
+  - fields holding a scalar or string in all entries are stored as one array;
+  - any other values (e.g., segms) are pickled.
+
+Entries refer back to their dataset, which is not cached: the datasets are
+passed in again when loading. Ground truth DensePose entries refer to rows of
+the DensePose annotation cache of their json file (see densepose_annotations),
+which is loaded, and rebuilt if needed, when a roidb with such rows is loaded.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from past.builtins import basestring
+import cPickle as pickle
+import hashlib
+import json
+import logging
+import numpy as np
+import os
+import scipy.sparse
+import shutil
+
+from detectron.core.config import cfg
+from detectron.datasets.densepose_annotations import load_densepose_annotations
+
+logger = logging.getLogger(__name__)
+
+# Bumped whenever the roidb construction or the cache layout changes
+ROIDB_CACHE_VERSION = 2
+
+# Config options that affect the content of roidbs
+_CFG_KEYS = (
+    'MODEL.BBOX_REG_WEIGHTS',
+    'MODEL.BODY_UV_ON',
+    'MODEL.CLS_AGNOSTIC_BBOX_REG',
+    'MODEL.KEYPOINTS_ON',
+    'BODY_UV_RCNN.BODY_UV_IMS',
+    'TRAIN.BBOX_THRESH',
+    'TRAIN.BG_THRESH_HI',
+    'TRAIN.BG_THRESH_LO',
+    'TRAIN.CROWD_FILTER_THRESH',
+    'TRAIN.FG_THRESH',
+    'TRAIN.GT_MIN_AREA',
+    'TRAIN.USE_FLIPPED',
+)
+
+_ARRAY, _SPARSE, _SCALAR = 'array', 'sparse', 'scalar'
+
+
+def cached_roidb(datasets, build_roidb, **key_args):
+    """Return the roidb returned by build_roidb() for the given datasets, loaded
+    from the cache if it holds one for the same datasets, config and key_args
+    (e.g., the arguments of the function that builds it). The roidb is cached
+    after being built. The cache is disabled if cfg.ROIDB_CACHE_DIR is empty.
+    """
+    if not cfg.ROIDB_CACHE_DIR:
+        return build_roidb()
+    cache_dir = os.path.join(
+        cfg.ROIDB_CACHE_DIR, get_cache_key(datasets, **key_args)
+    )
+    roidb = load_roidb(cache_dir, datasets)
+    if roidb is not None:
+        logger.info('Loaded roidb from cache: {}'.format(cache_dir))
+        if cfg.MODEL.BODY_UV_ON:
+            _load_densepose_annotations(roidb, datasets)
+        return roidb
+    roidb = build_roidb()
+    try:
+        save_roidb(roidb, cache_dir, datasets)
+        logger.info('Cached roidb in: {}'.format(cache_dir))
+    except (IOError, OSError) as e:
+        logger.warning('Could not cache roidb in {}: {}'.format(cache_dir, e))
+    return roidb
+
+
+def get_cache_key(datasets, **key_args):
+    """Return the cache key of a roidb of the given datasets built with the
+    current config.
+    """
+    key = {
+        'version': ROIDB_CACHE_VERSION,
+        'cfg': {k: _get_cfg_value(k) for k in _CFG_KEYS},
+        'datasets': [
+            [
+                ds.name, ds.coco_index.checksum, ds.image_directory,
+                ds.image_prefix
+            ] for ds in datasets
+        ],
+        'args': key_args,
+    }
+    return hashlib.sha1(
+        json.dumps(key, sort_keys=True, default=repr).encode('utf-8')
+    ).hexdigest()
+
+
+def get_file_key(file_name):
+    """Return a cache key component for an input file other than annotations
+    (e.g., a proposal file): its absolute path, size and mtime.
+    """
+    if file_name is None:
+        return None
+    stat = os.stat(file_name)
+    return [os.path.abspath(file_name), stat.st_size, stat.st_mtime]
+
+
+def save_roidb(roidb, cache_dir, datasets):
+    """Save a roidb of the given datasets to cache_dir (see the module
+    docstring for the format).
+    """
+    common_keys = set(roidb[0].keys()) if len(roidb) > 0 else set()
+    for entry in roidb[1:]:
+        common_keys &= set(entry.keys())
+    common_keys.discard('dataset')
+
+    dataset_inds = {id(ds): i for i, ds in enumerate(datasets)}
+    manifest = {
+        'version': ROIDB_CACHE_VERSION,
+        'num_entries': len(roidb),
+        'fields': {},
+        'objects': {},
+        # Number of columns of the sparse fields
+        'sparse_columns': {},
+        # Fields that not all entries have
+        'extra': [
+            {k: v for k, v in e.items() if k not in common_keys and
+             k != 'dataset'} for e in roidb
+        ],
+    }
+    arrays = {
+        'dataset': np.array(
+            [dataset_inds[id(e['dataset'])] for e in roidb], dtype=np.int32
+        )
+    }
+    for k in sorted(common_keys):
+        values = [e[k] for e in roidb]
+        kind = _field_kind(values)
+        if kind is None:
+            manifest['objects'][k] = values
+            continue
+        manifest['fields'][k] = kind
+        if kind == _SCALAR:
+            arrays[k] = np.array(values)
+            continue
+        arrays[k + '.offsets'] = np.r_[
+            0, np.cumsum([v.shape[0] for v in values])
+        ].astype(np.int64)
+        if kind == _ARRAY:
+            arrays[k] = np.concatenate(values)
+            continue
+        values = [scipy.sparse.csr_matrix(v) for v in values]
+        manifest['sparse_columns'][k] = values[0].shape[1]
+        arrays[k + '.data'] = np.concatenate([v.data for v in values])
+        arrays[k + '.indices'] = np.concatenate([v.indices for v in values])
+        # Row pointers into the nonzeros of every entry, without the leading 0
+        arrays[k + '.indptr'] = np.concatenate(
+            [v.indptr[1:] for v in values]
+        ).astype(np.int64)
+        arrays[k + '.nnz_offsets'] = np.r_[
+            0, np.cumsum([v.nnz for v in values])
+        ].astype(np.int64)
+
+    tmp_dir = '{}.{}.tmp'.format(cache_dir, os.getpid())
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+    for k, v in arrays.items():
+        np.save(os.path.join(tmp_dir, k + '.npy'), v)
+    with open(os.path.join(tmp_dir, 'manifest.pkl'), 'wb') as f:
+        pickle.dump(manifest, f, pickle.HIGHEST_PROTOCOL)
+    try:
+        os.rename(tmp_dir, cache_dir)
+    except OSError:
+        # Another process cached the same roidb first
+        shutil.rmtree(tmp_dir)
+        if not os.path.exists(cache_dir):
+            raise
+
+
+def load_roidb(cache_dir, datasets):
+    """Load a roidb saved with save_roidb, or return None if cache_dir holds
+    none. Array fields are views of memory-mapped (read-only) arrays.
+    """
+    manifest_file = os.path.join(cache_dir, 'manifest.pkl')
+    if not os.path.exists(manifest_file):
+        return None
+    with open(manifest_file, 'rb') as f:
+        manifest = pickle.load(f)
+    if manifest['version'] != ROIDB_CACHE_VERSION:
+        return None
+
+    def load_array(name):
+        return np.load(os.path.join(cache_dir, name + '.npy'), mmap_mode='r')
+
+    roidb = [dict(extra) for extra in manifest['extra']]
+    for entry, i in zip(roidb, load_array('dataset')):
+        entry['dataset'] = datasets[i]
+    for k, kind in manifest['fields'].items():
+        if kind == _SCALAR:
+            for entry, v in zip(roidb, load_array(k).tolist()):
+                entry[k] = v
+            continue
+        offsets = load_array(k + '.offsets')
+        if kind == _ARRAY:
+            values = load_array(k)
+            for i, entry in enumerate(roidb):
+                entry[k] = values[offsets[i]:offsets[i + 1]]
+            continue
+        data = load_array(k + '.data')
+        indices = load_array(k + '.indices')
+        indptr = load_array(k + '.indptr')
+        nnz_offsets = load_array(k + '.nnz_offsets')
+        num_columns = manifest['sparse_columns'][k]
+        for i, entry in enumerate(roidb):
+            start, end = nnz_offsets[i], nnz_offsets[i + 1]
+            entry[k] = scipy.sparse.csr_matrix(
+                (
+                    data[start:end], indices[start:end],
+                    np.r_[0, indptr[offsets[i]:offsets[i + 1]]]
+                ),
+                shape=(offsets[i + 1] - offsets[i], num_columns)
+            )
+    for k, values in manifest['objects'].items():
+        for entry, v in zip(roidb, values):
+            entry[k] = v
+    return roidb
+
+
+def _load_densepose_annotations(roidb, datasets):
+    """Load the DensePose annotations that the dp_rows of a cached roidb index.
+    They are validated separately from the roidb cache key, so a missing or
+    stale DensePose cache is rebuilt here rather than in the data loader.
+    Roidbs without ground truth DensePose rows (e.g., for testing) load none.
+    """
+    dataset_ids = set(
+        id(e['dataset']) for e in roidb if len(e.get('dp_rows', ())) > 0
+    )
+    for ds in datasets:
+        if id(ds) in dataset_ids:
+            load_densepose_annotations(ds.coco_index)
+
+
+def _field_kind(values):
+    """Return how the values of a field in all entries of a roidb are stored,
+    or None to pickle them.
+    """
+    if all(isinstance(v, np.ndarray) and v.ndim > 0 for v in values):
+        if len(set((v.dtype, v.shape[1:]) for v in values)) == 1:
+            return _ARRAY
+    elif all(scipy.sparse.issparse(v) for v in values):
+        if len(set((v.dtype, v.shape[1:]) for v in values)) == 1:
+            return _SPARSE
+    elif all(
+        isinstance(v, (bool, int, float, basestring, np.generic))
+        for v in values
+    ):
+        # Mixed types would be coerced to a common one
+        if len(set(type(v) for v in values)) == 1:
+            return _SCALAR
+    return None
+
+
+def _get_cfg_value(full_key):
+    value = cfg
+    for k in full_key.split('.'):
+        value = value[k]
+    return value
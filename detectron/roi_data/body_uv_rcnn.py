@@ -17,20 +17,16 @@ import numpy as np
 #
 
 from detectron.core.config import cfg
+from detectron.datasets.densepose_annotations import get_densepose_annotations
 import detectron.utils.blob as blob_utils
 import detectron.utils.boxes as box_utils
-import detectron.utils.segms as segm_utils
 import detectron.utils.densepose_methods as dp_utils
 
-#
-from memory_profiler import profile
 #
 import os
 #
 logger = logging.getLogger(__name__)
 #
-DP = dp_utils.DensePoseMethods()
-#
 
 def add_body_uv_rcnn_blobs(blobs, sampled_boxes, roidb, im_scale, batch_idx):
     IsFlipped = roidb['flipped']
@@ -82,22 +78,23 @@ def add_body_uv_rcnn_blobs(blobs, sampled_boxes, roidb, im_scale, batch_idx):
             rois_fg.astype(np.float32, copy=False),
             boxes_from_polys.astype(np.float32, copy=False))
         fg_polys_inds = np.argmax(overlaps_bbfg_bbpolys, axis=1)
+        #
+        dp_annotations = get_densepose_annotations(roidb['dp_annotations'])
 
         for i in range(rois_fg.shape[0]):
             #
             fg_polys_ind = polys_gt_inds[ fg_polys_inds[i] ]
             #
-            Ilabel = segm_utils.GetDensePoseMask( roidb['dp_masks'][ fg_polys_ind ] )
+            dp_row = roidb['dp_rows'][ fg_polys_ind ]
+            Ilabel = dp_annotations.mask( dp_row )
             #
-            GT_I = np.array(roidb['dp_I'][ fg_polys_ind ])
-            GT_U = np.array(roidb['dp_U'][ fg_polys_ind ])
-            GT_V = np.array(roidb['dp_V'][ fg_polys_ind ])
-            GT_x = np.array(roidb['dp_x'][ fg_polys_ind ])
-            GT_y = np.array(roidb['dp_y'][ fg_polys_ind ])
+            GT_I,GT_U,GT_V,GT_x,GT_y = dp_annotations.points( dp_row )
             GT_weights = np.ones(GT_I.shape).astype(np.float32)
             #
             ## Do the flipping of the densepose annotation !
             if(IsFlipped):
+                # The UV assets are loaded (once per process) on first use
+                DP = dp_utils.get_densepose_methods()
                 GT_I,GT_U,GT_V,GT_x,GT_y,Ilabel = DP.get_symmetric_densepose(GT_I,GT_U,GT_V,GT_x,GT_y,Ilabel)
             #
             roi_fg = rois_fg[i]
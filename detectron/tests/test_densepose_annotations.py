@@ -0,0 +1,150 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+##############################################################################
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import json
+import numpy as np
+import os
+import shutil
+import tempfile
+import unittest
+
+from pycocotools import mask as COCOmask
+
+from detectron.core.config import cfg
+from detectron.datasets.json_index import IndexedCOCO
+import detectron.datasets.densepose_annotations as dp_annotations
+import detectron.utils.segms as segm_utils
+
+
+def random_dp_annotation(rng, ann_id, image_id):
+    """Return a COCO annotation with random DensePose points and part masks."""
+    num_points = rng.randint(1, 20)
+    masks = []
+    for _ in range(14):
+        if rng.rand() < 0.5:
+            masks.append([])
+            continue
+        y0, x0 = rng.randint(0, 200, size=2)
+        part = np.zeros((256, 256), dtype=np.uint8, order='F')
+        part[y0:y0 + rng.randint(1, 56), x0:x0 + rng.randint(1, 56)] = 1
+        rle = COCOmask.encode(part)
+        rle['counts'] = rle['counts'].decode('ascii')
+        masks.append(rle)
+    return {
+        'id': ann_id,
+        'image_id': image_id,
+        'category_id': 1,
+        'iscrowd': 0,
+        'dp_x': (rng.rand(num_points) * 256).tolist(),
+        'dp_y': (rng.rand(num_points) * 256).tolist(),
+        'dp_I': rng.randint(1, 25, size=num_points).tolist(),
+        'dp_U': rng.rand(num_points).tolist(),
+        'dp_V': rng.rand(num_points).tolist(),
+        'dp_masks': masks,
+    }
+
+
+class TestDensePoseAnnotations(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.tmp_dir = tempfile.mkdtemp()
+        self.json_file = os.path.join(self.tmp_dir, 'densepose.json')
+        anns = [
+            random_dp_annotation(rng, ann_id, image_id)
+            for ann_id, image_id in [(7, 1), (3, 1), (12, 2), (5, 3)]
+        ]
+        # An annotation without DensePose annotations
+        anns.append({'id': 9, 'image_id': 2, 'category_id': 1, 'iscrowd': 0})
+        self.anns = {a['id']: a for a in anns}
+        with open(self.json_file, 'w') as f:
+            json.dump({
+                'images': [{'id': i} for i in (1, 2, 3)],
+                'annotations': anns,
+                'categories': [{'id': 1, 'name': 'person'}],
+            }, f)
+        self.fallback_dir = cfg.DENSEPOSE_CACHE_DIR
+        cfg.DENSEPOSE_CACHE_DIR = os.path.join(self.tmp_dir, 'fallback')
+        dp_annotations._LOADED.clear()
+
+    def tearDown(self):
+        cfg.DENSEPOSE_CACHE_DIR = self.fallback_dir
+        dp_annotations._LOADED.clear()
+        shutil.rmtree(self.tmp_dir)
+
+    def _check(self, annotations):
+        rows = annotations.rows([3, 5, 7, 9, 12, 100])
+        np.testing.assert_array_equal(rows, [0, 1, 2, -1, 3, -1])
+        for ann_id, row in zip([3, 5, 7, 12], rows[[0, 1, 2, 4]]):
+            ann = self.anns[ann_id]
+            for name, points in zip(
+                ('dp_I', 'dp_U', 'dp_V', 'dp_x', 'dp_y'),
+                annotations.points(row)
+            ):
+                expected = np.array(ann[name], dtype=np.float16)
+                np.testing.assert_array_equal(points, expected)
+                self.assertEqual(points.dtype, np.float64)
+            np.testing.assert_array_equal(
+                annotations.mask(row),
+                segm_utils.GetDensePoseMask(ann['dp_masks'])
+            )
+
+    def test_label_map_roundtrip(self):
+        rng = np.random.RandomState(1)
+        label_map = np.repeat(
+            rng.randint(0, 15, size=256), 256
+        ).reshape((256, 256))
+        label_map[rng.rand(256, 256) < 0.1] = 0
+        values, lengths = dp_annotations.encode_label_map(label_map)
+        decoded = dp_annotations.decode_label_map(values, lengths)
+        np.testing.assert_array_equal(decoded, label_map)
+        self.assertEqual(decoded.dtype, np.float64)
+
+    def test_build_and_load(self):
+        coco_index = IndexedCOCO(self.json_file)
+        self._check(dp_annotations.load_densepose_annotations(coco_index))
+        cache_dir = dp_annotations.get_cache_dir(self.json_file)
+        self.assertTrue(os.path.isdir(cache_dir))
+
+        # Reloaded from the cache
+        dp_annotations._LOADED.clear()
+        self._check(dp_annotations.get_densepose_annotations(self.json_file))
+
+    def test_get_builds_missing_cache(self):
+        self._check(dp_annotations.get_densepose_annotations(self.json_file))
+        self.assertTrue(
+            os.path.isdir(dp_annotations.get_cache_dir(self.json_file))
+        )
+
+    def test_fallback_cache_dir(self):
+        # The default cache directory cannot be written
+        with open(dp_annotations.get_cache_dir(self.json_file), 'w'):
+            pass
+        self._check(dp_annotations.get_densepose_annotations(self.json_file))
+        fallback_dir = dp_annotations.get_fallback_cache_dir(self.json_file)
+        self.assertTrue(os.path.isdir(fallback_dir))
+
+        # Reloaded from the fallback cache without rebuilding
+        dp_annotations._LOADED.clear()
+        annotations = dp_annotations.get_densepose_annotations(self.json_file)
+        self.assertIsInstance(annotations._ann_ids, np.memmap)
+        self._check(annotations)
+
+    def test_unwritable_cache_raises(self):
+        cfg.DENSEPOSE_CACHE_DIR = ''
+        with open(dp_annotations.get_cache_dir(self.json_file), 'w'):
+            pass
+        with self.assertRaises(IOError):
+            dp_annotations.get_densepose_annotations(self.json_file)
+
+
+if __name__ == '__main__':
+    unittest.main()
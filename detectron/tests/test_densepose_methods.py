@@ -0,0 +1,170 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+##############################################################################
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import numpy as np
+import os
+import shutil
+import tempfile
+import unittest
+
+from scipy.io import loadmat, savemat
+from scipy.spatial import Delaunay
+
+import detectron.utils.densepose_methods as dp_utils
+
+
+def write_synthetic_uv_data(uv_data_dir, rng, num_mesh_vertices=200):
+    """Write UV_Processed.mat and UV_symmetry_transforms.mat of a small random
+    mesh: a Delaunay triangulation of random UV points for every part, with some
+    faces removed so that some points fall outside all faces.
+    """
+    U, V, faces, face_indices = [], [], [], []
+    for part in range(1, 25):
+        uv = rng.rand(40, 2) * 0.8 + 0.1
+        part_faces = Delaunay(uv).simplices
+        part_faces = part_faces[rng.rand(len(part_faces)) > 0.2]
+        faces.append(part_faces + sum(len(u) for u in U))
+        face_indices.append(np.full(len(part_faces), part))
+        U.append(uv[:, 0])
+        V.append(uv[:, 1])
+    savemat(os.path.join(uv_data_dir, 'UV_Processed.mat'), {
+        'All_FaceIndices': np.concatenate(face_indices)[:, np.newaxis],
+        'All_Faces': np.concatenate(faces) + 1,
+        'All_U_norm': np.concatenate(U)[:, np.newaxis],
+        'All_V_norm': np.concatenate(V)[:, np.newaxis],
+        'All_vertices': rng.randint(
+            1, num_mesh_vertices + 1, size=(1, sum(len(u) for u in U))
+        ),
+    })
+    transforms = {}
+    for name in ('U_transforms', 'V_transforms'):
+        transforms[name] = np.empty((1, 24), dtype=object)
+        for i in range(24):
+            transforms[name][0, i] = rng.rand(256, 256)
+    savemat(os.path.join(uv_data_dir, 'UV_symmetry_transforms.mat'), transforms)
+
+
+def get_symmetric_densepose_loop(DP, transforms, I, U, V, x, y, Mask):
+    """get_symmetric_densepose as it was implemented with loops over the parts
+    and mask labels, on the transforms read from UV_symmetry_transforms.mat.
+    """
+    Labels_sym = np.zeros(I.shape)
+    U_sym = np.zeros(U.shape)
+    V_sym = np.zeros(V.shape)
+    for i in range(24):
+        if i + 1 in I:
+            Labels_sym[I == (i + 1)] = DP.Index_Symmetry_List[i]
+            jj = np.where(I == (i + 1))
+            U_loc = (U[jj] * 255).astype(np.int64)
+            V_loc = (V[jj] * 255).astype(np.int64)
+            V_sym[jj] = transforms['V_transforms'][0, i][V_loc, U_loc]
+            U_sym[jj] = transforms['U_transforms'][0, i][V_loc, U_loc]
+    Mask_flip = np.fliplr(Mask)
+    Mask_flipped = np.zeros(Mask.shape)
+    for i in range(14):
+        Mask_flipped[Mask_flip == (i + 1)] = DP.SemanticMaskSymmetries[i + 1]
+    y_max, x_max = Mask_flip.shape
+    return Labels_sym, U_sym, V_sym, x_max - x, y, Mask_flipped
+
+
+class TestDensePoseMethods(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.rng = np.random.RandomState(0)
+        cls.uv_data_dir = tempfile.mkdtemp()
+        write_synthetic_uv_data(cls.uv_data_dir, cls.rng)
+        cls.DP = dp_utils.DensePoseMethods(cls.uv_data_dir)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.uv_data_dir)
+
+    def random_points(self, n, steps=255):
+        I = self.rng.randint(0, 25, size=n)
+        U = self.rng.randint(0, steps + 1, size=n) / float(steps)
+        V = self.rng.randint(0, steps + 1, size=n) / float(steps)
+        return I, U, V
+
+    def test_iuv2fbc_batch(self):
+        I, U, V = self.random_points(2000)
+        # Points off the 8-bit grid too
+        U[:500] = self.rng.rand(500)
+        FaceIndex, bc1, bc2, bc3 = self.DP.IUV2FBC_batch(I, U, V)
+        num_fallbacks = 0
+        for i in range(len(I)):
+            if I[i] == 0:
+                self.assertEqual(FaceIndex[i], -1)
+                self.assertTrue(np.isnan([bc1[i], bc2[i], bc3[i]]).all())
+                continue
+            expected = self.DP.IUV2FBC(I[i], U[i], V[i])
+            self.assertEqual(FaceIndex[i], expected[0])
+            np.testing.assert_allclose(
+                [bc1[i], bc2[i], bc3[i]], expected[1:], rtol=0, atol=1e-12
+            )
+            num_fallbacks += sorted(expected[1:]) == [0., 0., 1.]
+        # The nearest-vertex fallback was exercised
+        self.assertGreater(num_fallbacks, 0)
+
+    def test_iuv2fbc_lookup(self):
+        size = 64
+        I, U, V = self.random_points(2000, steps=size - 1)
+        FaceIndex, bc1, bc2, bc3 = self.DP.IUV2FBC_batch(I, U, V)
+        lookup = self.DP.IUV2FBC_lookup(I, U, V, size=size)
+        np.testing.assert_array_equal(lookup[0], FaceIndex)
+        for bc, lookup_bc in zip((bc1, bc2, bc3), lookup[1:]):
+            np.testing.assert_allclose(lookup_bc, bc, rtol=0, atol=1e-6)
+
+    def test_fbc2point_on_surface_batch(self):
+        I, U, V = self.random_points(500)
+        FaceIndex, bc1, bc2, bc3 = self.DP.IUV2FBC_batch(I, U, V)
+        Vertices = self.rng.rand(200, 3)
+        points = self.DP.FBC2PointOnSurface_batch(
+            FaceIndex, bc1, bc2, bc3, Vertices
+        )
+        for i in range(len(I)):
+            if FaceIndex[i] < 0:
+                self.assertTrue(np.isnan(points[i]).all())
+                continue
+            np.testing.assert_array_equal(
+                points[i],
+                self.DP.FBC2PointOnSurface(
+                    FaceIndex[i], bc1[i], bc2[i], bc3[i], Vertices
+                )
+            )
+        # A stack of meshes
+        stacked = self.DP.FBC2PointOnSurface_batch(
+            FaceIndex, bc1, bc2, bc3, np.stack((Vertices, 2 * Vertices))
+        )
+        np.testing.assert_array_equal(stacked[0], points)
+        np.testing.assert_allclose(stacked[1], 2 * points)
+
+    def test_get_symmetric_densepose(self):
+        I, U, V = self.random_points(300)
+        x = self.rng.rand(300) * 256
+        y = self.rng.rand(300) * 256
+        Mask = self.rng.randint(0, 15, size=(256, 256)).astype(np.float64)
+        transforms = loadmat(
+            os.path.join(self.uv_data_dir, 'UV_symmetry_transforms.mat')
+        )
+        expected = get_symmetric_densepose_loop(
+            self.DP, transforms, I.astype(np.float64), U, V, x, y, Mask
+        )
+        result = self.DP.get_symmetric_densepose(
+            I.astype(np.float64), U, V, x, y, Mask
+        )
+        for r, e in zip(result, expected):
+            self.assertEqual(np.asarray(r).dtype, np.asarray(e).dtype)
+            np.testing.assert_array_equal(r, e)
+
+
+if __name__ == '__main__':
+    unittest.main()
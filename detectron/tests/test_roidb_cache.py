@@ -0,0 +1,167 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+##############################################################################
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import json
+import numpy as np
+import os
+import scipy.sparse
+import shutil
+import tempfile
+import unittest
+
+from detectron.core.config import cfg
+from detectron.datasets.json_index import IndexedCOCO
+import detectron.datasets.densepose_annotations as dp_annotations
+import detectron.datasets.roidb_cache as roidb_cache
+
+
+class FakeDataset(object):
+    def __init__(self, name, json_file):
+        self.name = name
+        self.image_directory = '/images/' + name
+        self.image_prefix = ''
+        self.coco_index = IndexedCOCO(json_file)
+
+
+def random_roidb(datasets, num_entries=20):
+    rng = np.random.RandomState(0)
+    roidb = []
+    for i in range(num_entries):
+        num_boxes = rng.randint(0, 5)
+        overlaps = rng.rand(num_boxes, 3).astype(np.float32)
+        overlaps[overlaps < 0.5] = 0
+        entry = {
+            'id': i,
+            'image': '/images/{}.jpg'.format(i),
+            'flipped': bool(i % 2),
+            'dataset': datasets[i % len(datasets)],
+            'boxes': rng.rand(num_boxes, 4).astype(np.float32),
+            'gt_classes': np.arange(num_boxes, dtype=np.int32),
+            'gt_overlaps': scipy.sparse.csr_matrix(overlaps),
+            'segms': [[[1.0, 2.0, 3.0, 4.0, 5.0, 6.0]]] * num_boxes,
+        }
+        if i == 3:
+            entry['only_in_one_entry'] = np.zeros(2)
+        roidb.append(entry)
+    return roidb
+
+
+class TestRoidbCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.json_file = os.path.join(self.tmp_dir, 'dataset.json')
+        with open(self.json_file, 'w') as f:
+            json.dump({
+                'images': [{'id': 1}],
+                'annotations': [{
+                    'id': 1, 'image_id': 1, 'category_id': 1, 'iscrowd': 0,
+                    'dp_x': [1.0], 'dp_y': [2.0], 'dp_I': [3], 'dp_U': [0.5],
+                    'dp_V': [0.25], 'dp_masks': [[]] * 14,
+                }],
+                'categories': [{'id': 1, 'name': 'person'}],
+            }, f)
+        self.datasets = [
+            FakeDataset('a', self.json_file),
+            FakeDataset('b', self.json_file)
+        ]
+        self.cfg_values = (cfg.ROIDB_CACHE_DIR, cfg.MODEL.BODY_UV_ON)
+        cfg.ROIDB_CACHE_DIR = os.path.join(self.tmp_dir, 'roidb-cache')
+        cfg.MODEL.BODY_UV_ON = False
+        dp_annotations._LOADED.clear()
+
+    def tearDown(self):
+        cfg.ROIDB_CACHE_DIR, cfg.MODEL.BODY_UV_ON = self.cfg_values
+        dp_annotations._LOADED.clear()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_save_load_roundtrip(self):
+        roidb = random_roidb(self.datasets)
+        cache_dir = os.path.join(self.tmp_dir, 'roidb')
+        roidb_cache.save_roidb(roidb, cache_dir, self.datasets)
+        loaded = roidb_cache.load_roidb(cache_dir, self.datasets)
+        self.assertEqual(len(loaded), len(roidb))
+        for entry, loaded_entry in zip(roidb, loaded):
+            self.assertEqual(set(entry.keys()), set(loaded_entry.keys()))
+            for k, v in entry.items():
+                loaded_v = loaded_entry[k]
+                if k == 'dataset':
+                    self.assertIs(loaded_v, v)
+                elif scipy.sparse.issparse(v):
+                    self.assertTrue(scipy.sparse.isspmatrix_csr(loaded_v))
+                    self.assertEqual(loaded_v.shape, v.shape)
+                    self.assertEqual(loaded_v.dtype, v.dtype)
+                    np.testing.assert_array_equal(
+                        loaded_v.toarray(), v.toarray()
+                    )
+                elif isinstance(v, np.ndarray):
+                    self.assertEqual(loaded_v.dtype, v.dtype)
+                    np.testing.assert_array_equal(loaded_v, v)
+                else:
+                    self.assertEqual(loaded_v, v)
+                    self.assertEqual(type(loaded_v), type(v))
+
+    def test_cached_roidb(self):
+        roidb = random_roidb(self.datasets)
+        builds = []
+
+        def build_roidb():
+            builds.append(1)
+            return roidb
+
+        self.assertIs(
+            roidb_cache.cached_roidb(self.datasets, build_roidb, gt=True),
+            roidb
+        )
+        loaded = roidb_cache.cached_roidb(self.datasets, build_roidb, gt=True)
+        self.assertEqual(len(builds), 1)
+        self.assertEqual([e['id'] for e in loaded], [e['id'] for e in roidb])
+
+        # A different key builds the roidb again
+        roidb_cache.cached_roidb(self.datasets, build_roidb, gt=False)
+        self.assertEqual(len(builds), 2)
+
+    def test_cached_roidb_loads_densepose_annotations(self):
+        cfg.MODEL.BODY_UV_ON = True
+        roidb = random_roidb(self.datasets)
+        for entry in roidb:
+            entry['dp_rows'] = np.zeros(len(entry['boxes']), dtype=np.int64)
+        roidb_cache.cached_roidb(self.datasets, lambda: roidb)
+        # As JsonDataset does when building a ground truth roidb
+        dp_annotations.get_densepose_annotations(self.json_file)
+
+        # On a cache hit, a missing DensePose cache is built again
+        dp_annotations._LOADED.clear()
+        shutil.rmtree(dp_annotations.get_cache_dir(self.json_file))
+        roidb_cache.cached_roidb(self.datasets, lambda: None)
+        self.assertIn(self.json_file, dp_annotations._LOADED)
+        self.assertTrue(
+            os.path.isdir(dp_annotations.get_cache_dir(self.json_file))
+        )
+
+    def test_cached_roidb_without_densepose_rows(self):
+        cfg.MODEL.BODY_UV_ON = True
+        roidb = random_roidb(self.datasets)
+        for entry in roidb:
+            entry['dp_rows'] = np.zeros(0, dtype=np.int64)
+        roidb_cache.cached_roidb(self.datasets, lambda: roidb)
+
+        # A cache hit without DensePose rows (e.g., a test roidb) does not
+        # convert the DensePose annotations
+        roidb_cache.cached_roidb(self.datasets, lambda: None)
+        self.assertNotIn(self.json_file, dp_annotations._LOADED)
+        self.assertFalse(
+            os.path.exists(dp_annotations.get_cache_dir(self.json_file))
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
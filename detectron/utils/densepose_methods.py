@@ -9,49 +9,178 @@ import copy
 import cv2
 from scipy.io  import loadmat
 import scipy.spatial.distance
+import logging
 import os 
+import shutil
+import threading
+
+
+# Directory of UV_Processed.mat and UV_symmetry_transforms.mat
+UV_DATA_DIR = os.path.join(os.path.dirname(__file__), '../../DensePoseData/UV_data')
+# Bumped whenever the content of the cached UV assets changes
+UV_ASSETS_VERSION = 1
+# Side of the uniform grid over the UV square that indexes the faces of every part
+UV_GRID_SIZE = 64
+# Number of points whose candidate faces are tested at once in IUV2FBC_batch
+IUV2FBC_BATCH_SIZE = 65536
+# Side of the per-part UV rasters of IUV2FBC_lookup; U and V are quantized to
+# 8 bits (k / 255) in the body UV results, so 256 makes the lookup exact for them
+UV_LOOKUP_SIZE = 256
+# Bumped whenever the content of the cached UV lookup rasters changes
+UV_LOOKUP_VERSION = 1
+
+logger = logging.getLogger(__name__)
+
+# The DensePoseMethods of this process (see get_densepose_methods)
+_DENSEPOSE_METHODS = None
+_DENSEPOSE_METHODS_LOCK = threading.Lock()
+
+
+def get_densepose_methods():
+    ## The DensePoseMethods shared by all users in this process, created on first use,
+    ## so that processes that never need the UV assets never load them.
+    global _DENSEPOSE_METHODS
+    with _DENSEPOSE_METHODS_LOCK:
+        if _DENSEPOSE_METHODS is None:
+            _DENSEPOSE_METHODS = DensePoseMethods()
+    return _DENSEPOSE_METHODS
+
+
+def load_uv_assets(uv_data_dir=UV_DATA_DIR):
+    ## The arrays DensePoseMethods works with (see convert_uv_assets). They are converted
+    ## from the .mat files once and cached as .npy files in <uv_data_dir>/UV_assets,
+    ## which are memory-mapped read-only: all processes that load them (loader
+    ## threads, multi-GPU test subprocesses, ...) share one copy in the page cache.
+    cache_dir = os.path.join(uv_data_dir, 'UV_assets')
+    source_key = _uv_assets_source_key(uv_data_dir)
+    meta_filename = os.path.join(cache_dir, 'meta.npy')
+    if os.path.exists(meta_filename) and np.array_equal(np.load(meta_filename), source_key):
+        return {name[:-4]: np.load(os.path.join(cache_dir, name), mmap_mode='r')
+                for name in os.listdir(cache_dir) if name.endswith('.npy') and name != 'meta.npy'}
+    assets = convert_uv_assets(uv_data_dir)
+    try:
+        tmp_dir = '{}.{}.tmp'.format(cache_dir, os.getpid())
+        if os.path.exists(tmp_dir):
+            shutil.rmtree(tmp_dir)
+        os.makedirs(tmp_dir)
+        for name, array in assets.items():
+            np.save(os.path.join(tmp_dir, name + '.npy'), array)
+        np.save(os.path.join(tmp_dir, 'meta.npy'), source_key)
+        if os.path.exists(cache_dir):
+            shutil.rmtree(cache_dir)
+        os.rename(tmp_dir, cache_dir)
+    except (IOError, OSError) as e:
+        logger.warning('Could not cache the DensePose UV assets in {}: {}'.format(cache_dir, e))
+    return assets
+
+
+def _uv_assets_source_key(uv_data_dir):
+    key = [UV_ASSETS_VERSION, UV_GRID_SIZE]
+    for filename in ('UV_Processed.mat', 'UV_symmetry_transforms.mat'):
+        source = os.stat(os.path.join(uv_data_dir, filename))
+        key += [source.st_size, source.st_mtime]
+    return np.array(key, dtype=np.float64)
+
+
+def convert_uv_assets(uv_data_dir=UV_DATA_DIR):
+    ## Read the UV data .mat files into plain arrays, and precompute the symmetry
+    ## transforms and the UV face grid.
+    ALP_UV = loadmat( os.path.join(uv_data_dir, 'UV_Processed.mat') )
+    assets = {
+        'FaceIndices': np.array( ALP_UV['All_FaceIndices']).squeeze(),
+        'FacesDensePose': ALP_UV['All_Faces']-1,
+        'U_norm': ALP_UV['All_U_norm'].squeeze(),
+        'V_norm': ALP_UV['All_V_norm'].squeeze(),
+        'All_vertices': ALP_UV['All_vertices'][0],
+    }
+    UV_symmetry_transformations = loadmat( os.path.join(uv_data_dir, 'UV_symmetry_transforms.mat') )
+    ## The U/V transforms of the 24 parts stacked into (24, 256, 256) arrays
+    assets['U_transforms'] = np.stack([UV_symmetry_transformations['U_transforms'][0, i] for i in range(24)])
+    assets['V_transforms'] = np.stack([UV_symmetry_transformations['V_transforms'][0, i] for i in range(24)])
+    assets.update(uv_face_grid(assets['FaceIndices'], assets['FacesDensePose'], assets['U_norm'], assets['V_norm']))
+    return assets
+
+
+def uv_face_grid(FaceIndices, FacesDensePose, U_norm, V_norm):
+    ## Spatial index of the UV faces for IUV2FBC_batch: for every part and cell of
+    ## a UV_GRID_SIZE x UV_GRID_SIZE grid over the UV square, the faces of the part
+    ## whose UV bounding box overlaps the cell, in increasing face index order.
+    G = UV_GRID_SIZE
+    Face_U = U_norm[FacesDensePose]
+    Face_V = V_norm[FacesDensePose]
+    u0 = _uv_cell(Face_U.min(axis=1)); u1 = _uv_cell(Face_U.max(axis=1))
+    v0 = _uv_cell(Face_V.min(axis=1)); v1 = _uv_cell(Face_V.max(axis=1))
+    ## One (cell, face) pair for every cell that a face's bounding box covers
+    width = u1 - u0 + 1
+    counts = width * (v1 - v0 + 1)
+    faces = np.repeat(np.arange(len(counts)), counts)
+    local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    cells = (FaceIndices[faces].astype(np.int64) * G + v0[faces] + local // width[faces]) * G + \
+            u0[faces] + local % width[faces]
+    order = np.lexsort((faces, cells))
+    return {
+        'Face_U': Face_U,
+        'Face_V': Face_V,
+        'UV_grid_faces': faces[order],
+        'UV_grid_offsets': np.searchsorted(cells[order], np.arange(25 * G * G + 1)),
+    }
+
+
+def _uv_cell(uv):
+    return np.clip((np.asarray(uv) * UV_GRID_SIZE).astype(np.int64), 0, UV_GRID_SIZE - 1)
 
 
 class DensePoseMethods:
-    def __init__(self):
-        #
-        ALP_UV = loadmat( os.path.join(os.path.dirname(__file__), '../../DensePoseData/UV_data/UV_Processed.mat')  )
-        self.FaceIndices = np.array( ALP_UV['All_FaceIndices']).squeeze()
-        self.FacesDensePose = ALP_UV['All_Faces']-1
-        self.U_norm = ALP_UV['All_U_norm'].squeeze()
-        self.V_norm = ALP_UV['All_V_norm'].squeeze()
-        self.All_vertices =  ALP_UV['All_vertices'][0]
+    def __init__(self, uv_data_dir=UV_DATA_DIR):
+        #
+        self.UV_processed_filename = os.path.join(uv_data_dir, 'UV_Processed.mat')
+        assets = load_uv_assets(uv_data_dir)
+        self.FaceIndices = assets['FaceIndices']
+        self.FacesDensePose = assets['FacesDensePose']
+        self.U_norm = assets['U_norm']
+        self.V_norm = assets['V_norm']
+        self.All_vertices = assets['All_vertices']
         ## Info to compute symmetries.
         self.SemanticMaskSymmetries = [0,1,3,2,5,4,7,6,9,8,11,10,13,12,14]
         self.Index_Symmetry_List = [1,2,4,3,6,5,8,7,10,9,12,11,14,13,16,15,18,17,20,19,22,21,24,23];
-        UV_symmetry_filename = os.path.join(os.path.dirname(__file__), '../../DensePoseData/UV_data/UV_symmetry_transforms.mat')
-        self.UV_symmetry_transformations = loadmat( UV_symmetry_filename )
+        ## Lookup tables of get_symmetric_densepose: the stacked U/V transforms and the
+        ## symmetric part index of every I (0 stays 0) and mask label.
+        self.U_transforms = assets['U_transforms']
+        self.V_transforms = assets['V_transforms']
+        self.Index_Symmetry_LUT = np.array([0] + self.Index_Symmetry_List, dtype=np.float64)
+        self.SemanticMaskSymmetries_LUT = np.array(self.SemanticMaskSymmetries, dtype=np.float64)
+        ## UV face grid of IUV2FBC_batch
+        self.Face_U = assets['Face_U']
+        self.Face_V = assets['Face_V']
+        self.UV_grid_faces = assets['UV_grid_faces']
+        self.UV_grid_offsets = assets['UV_grid_offsets']
+        self.UV_lookups = {}
+
     
 
     def get_symmetric_densepose(self,I,U,V,x,y,Mask):
         ### This is a function to get the mirror symmetric UV labels.
+        ### I, U, V, x and y can have any shape, e.g. all points of a batch of ROIs, and
+        ### Mask can be one label map or a stack of them.
+        I = np.asarray(I)
         Labels_sym= np.zeros(I.shape)
-        U_sym= np.zeros(U.shape)
-        V_sym= np.zeros(V.shape)
+        U_sym= np.zeros(np.shape(U))
+        V_sym= np.zeros(np.shape(V))
         ###
-        for i in ( range(24)):
-            if i+1 in I:
-                Labels_sym[I == (i+1)] = self.Index_Symmetry_List[i]
-                jj = np.where(I == (i+1))
-                ###
-                U_loc = (U[jj]*255).astype(np.int64)
-                V_loc = (V[jj]*255).astype(np.int64)
-                ###
-                V_sym[jj] = self.UV_symmetry_transformations['V_transforms'][0,i][V_loc,U_loc]
-                U_sym[jj] = self.UV_symmetry_transformations['U_transforms'][0,i][V_loc,U_loc]
+        jj = (I >= 1) & (I <= 24)
+        I_loc = I[jj].astype(np.int64)
+        Labels_sym[jj] = self.Index_Symmetry_LUT[I_loc]
+        U_loc = (np.asarray(U)[jj]*255).astype(np.int64)
+        V_loc = (np.asarray(V)[jj]*255).astype(np.int64)
+        V_sym[jj] = self.V_transforms[I_loc - 1, V_loc, U_loc]
+        U_sym[jj] = self.U_transforms[I_loc - 1, V_loc, U_loc]
         ##
-        Mask_flip = np.fliplr(Mask)
-        Mask_flipped = np.zeros(Mask.shape)
-        #
-        for i in ( range(14)):
-            Mask_flipped[Mask_flip == (i+1)] = self.SemanticMaskSymmetries[i+1]
+        Mask_flip = np.flip(Mask, axis=-1)
+        Mask_labels = Mask_flip.astype(np.int64)
+        valid = (Mask_labels == Mask_flip) & (Mask_labels >= 0) & (Mask_labels <= 14)
+        Mask_flipped = np.where(valid, self.SemanticMaskSymmetries_LUT[np.where(valid, Mask_labels, 0)], 0.)
         #
-        [y_max , x_max ] = Mask_flip.shape
+        x_max = Mask_flip.shape[-1]
         y_sym = y
         x_sym = x_max-x
         #
@@ -131,6 +260,120 @@ class DensePoseMethods:
             return(  FaceIndicesNow[0][np.argmin(D3)] , 0.,0.,1. )
 
 
+    def IUV2FBC_batch( self, I, U, V ):
+        ## Batched IUV2FBC: the same face and barycentric coordinates for arrays of
+        ## points. Points are only tested against the faces of their part indexed in
+        ## their UV grid cell. Points of parts without faces (e.g. I = 0) get face -1
+        ## and NaN coordinates.
+        I = np.asarray(I).astype(np.int64).ravel()
+        U = np.asarray(U, dtype=np.float64).ravel()
+        V = np.asarray(V, dtype=np.float64).ravel()
+        FaceIndex = np.full(I.shape, -1, dtype=np.int64)
+        bc = np.full((len(I), 3), np.nan)
+        for start in range(0, len(I), IUV2FBC_BATCH_SIZE):
+            end = start + IUV2FBC_BATCH_SIZE
+            FaceIndex[start:end], bc[start:end] = self._IUV2FBC_in_faces(I[start:end], U[start:end], V[start:end])
+        ## If the found UV is not inside any faces, select the vertex that is closest!
+        outside = np.flatnonzero((FaceIndex < 0) & (I >= 1) & (I <= 24))
+        for part in np.unique(I[outside]):
+            points = outside[I[outside] == part]
+            FaceIndicesNow = np.flatnonzero(self.FaceIndices == part)
+            if len(FaceIndicesNow):
+                for start in range(0, len(points), 4096):
+                    chunk = points[start:start + 4096]
+                    FaceIndex[chunk], bc[chunk] = self._closest_vertex(U[chunk], V[chunk], FaceIndicesNow)
+        return FaceIndex, bc[:, 0], bc[:, 1], bc[:, 2]
+
+    def _IUV2FBC_in_faces( self, I, U, V ):
+        ## Candidate faces of every point: (point, face) pairs from the point's grid cell
+        G = UV_GRID_SIZE
+        cells = (np.clip(I, 0, 24) * G + _uv_cell(V)) * G + _uv_cell(U)
+        starts = self.UV_grid_offsets[cells]
+        counts = np.where((I >= 1) & (I <= 24), self.UV_grid_offsets[cells + 1] - starts, 0)
+        points = np.repeat(np.arange(len(I)), counts)
+        faces = self.UV_grid_faces[np.arange(counts.sum()) + np.repeat(starts - (np.cumsum(counts) - counts), counts)]
+        ## barycentric_coordinates_exists and barycentric_coordinates of all pairs at once
+        ## (the cross products of points in the UV plane only have a z component)
+        FU = self.Face_U[faces]; FV = self.Face_V[faces]
+        ux = FU[:, 1] - FU[:, 0]; uy = FV[:, 1] - FV[:, 0]
+        vx = FU[:, 2] - FU[:, 0]; vy = FV[:, 2] - FV[:, 0]
+        wx = U[points] - FU[:, 0]; wy = V[points] - FV[:, 0]
+        vCrossW = vx * wy - vy * wx
+        vCrossU = vx * uy - vy * ux
+        uCrossW = ux * wy - uy * wx
+        uCrossV = ux * vy - uy * vx
+        with np.errstate(divide='ignore', invalid='ignore'):
+            denom = np.abs(uCrossV)
+            r = np.abs(vCrossW) / denom
+            t = np.abs(uCrossW) / denom
+            inside = ~(vCrossW * vCrossU < 0) & ~(uCrossW * uCrossV < 0) & (r <= 1) & (t <= 1) & (r + t <= 1)
+        ## The first face containing a point, as the faces of a cell are in index order
+        inside = np.flatnonzero(inside)
+        found, first = np.unique(points[inside], return_index=True)
+        pairs = inside[first]
+        FaceIndex = np.full(I.shape, -1, dtype=np.int64)
+        bc = np.full((len(I), 3), np.nan)
+        FaceIndex[found] = faces[pairs]
+        bc[found] = np.stack((1 - (r[pairs] + t[pairs]), r[pairs], t[pairs]), axis=1)
+        return FaceIndex, bc
+
+    def _closest_vertex( self, U, V, FaceIndicesNow ):
+        ## The nearest-vertex fallback of IUV2FBC for points of the part of FaceIndicesNow
+        UV = np.stack((U, V), axis=1)
+        D = [scipy.spatial.distance.cdist(UV, np.stack((self.Face_U[FaceIndicesNow, k],
+                                                        self.Face_V[FaceIndicesNow, k]), axis=1)) for k in range(3)]
+        minD = np.stack([d.min(axis=1) for d in D], axis=1)
+        ## Same tie-breaking as IUV2FBC: vertex 1 or 2 only if strictly closest, else vertex 3
+        vertex = np.full(len(U), 2)
+        vertex[(minD[:, 1] < minD[:, 0]) & (minD[:, 1] < minD[:, 2])] = 1
+        vertex[(minD[:, 0] < minD[:, 1]) & (minD[:, 0] < minD[:, 2])] = 0
+        argmin = np.stack([d.argmin(axis=1) for d in D], axis=1)[np.arange(len(U)), vertex]
+        return FaceIndicesNow[argmin], np.eye(3)[vertex]
+
+    def IUV2FBC_lookup( self, I, U, V, size=UV_LOOKUP_SIZE ):
+        ## IUV2FBC_batch through precomputed rasters: U and V are rounded to the nearest
+        ## of size steps over [0, 1] and the face and barycentric coordinates of every
+        ## point are gathered from the raster of its part (see get_UV_lookup).
+        FaceIndex_raster, bc_raster = self.get_UV_lookup(size)
+        I = np.clip(np.asarray(I).astype(np.int64), 0, 24)
+        u = np.clip(np.rint(np.asarray(U) * (size - 1)).astype(np.int64), 0, size - 1)
+        v = np.clip(np.rint(np.asarray(V) * (size - 1)).astype(np.int64), 0, size - 1)
+        bc = bc_raster[I, v, u]
+        return FaceIndex_raster[I, v, u], bc[..., 0], bc[..., 1], bc[..., 2]
+
+    def get_UV_lookup( self, size=UV_LOOKUP_SIZE ):
+        ## Face index (25, size, size) int32 and barycentric coordinate (25, size, size, 3)
+        ## float32 rasters: [I, v, u] holds IUV2FBC_batch(I, u / (size - 1), v / (size - 1)).
+        ## Part 0 (background) holds face -1. The rasters are computed once and cached in
+        ## UV_face_lookup_<size>.npz next to UV_Processed.mat.
+        if size not in self.UV_lookups:
+            cache_filename = os.path.join(os.path.dirname(self.UV_processed_filename),
+                                          'UV_face_lookup_{}.npz'.format(size))
+            source = os.stat(self.UV_processed_filename)
+            source_key = np.array([UV_LOOKUP_VERSION, source.st_size, source.st_mtime])
+            lookup = None
+            if os.path.exists(cache_filename):
+                with np.load(cache_filename) as cache:
+                    if np.array_equal(cache['source'], source_key):
+                        lookup = (cache['FaceIndex'], cache['bc'])
+            if lookup is None:
+                lookup = self._compute_UV_lookup(size)
+                try:
+                    tmp_filename = cache_filename + '.tmp'
+                    with open(tmp_filename, 'wb') as f:
+                        np.savez(f, FaceIndex=lookup[0], bc=lookup[1], source=source_key)
+                    os.rename(tmp_filename, cache_filename)
+                except (IOError, OSError) as e:
+                    logger.warning('Could not write {}: {}'.format(cache_filename, e))
+            self.UV_lookups[size] = lookup
+        return self.UV_lookups[size]
+
+    def _compute_UV_lookup( self, size ):
+        I, v, u = np.meshgrid(np.arange(25), np.arange(size), np.arange(size), indexing='ij')
+        FaceIndex, bc1, bc2, bc3 = self.IUV2FBC_batch(I, u / (size - 1.), v / (size - 1.))
+        return (FaceIndex.reshape(I.shape).astype(np.int32),
+                np.stack((bc1, bc2, bc3), axis=1).reshape(I.shape + (3,)).astype(np.float32))
+
     def FBC2PointOnSurface( self, FaceIndex, bc1,bc2,bc3,Vertices ):
         ##
         Vert_indices = self.All_vertices[self.FacesDensePose[FaceIndex]]-1
@@ -139,5 +382,19 @@ class DensePoseMethods:
             Vertices[Vert_indices[1],:] * bc2 +  \
             Vertices[Vert_indices[2],:] * bc3 
         ##
-        return(p)    
+        return(p)
+
+    def FBC2PointOnSurface_batch( self, FaceIndex, bc1, bc2, bc3, Vertices ):
+        ## Batched FBC2PointOnSurface: the points of arrays of faces and barycentric
+        ## coordinates (N,) on a (V, 3) mesh, or on a (B, V, 3) stack of meshes (e.g.
+        ## many SMPL shapes) at once. Returns (N, 3), or (B, N, 3) points; faces -1 (see
+        ## IUV2FBC_batch) give NaN.
+        FaceIndex = np.asarray(FaceIndex).astype(np.int64).ravel()
+        Vertices = np.asarray(Vertices)
+        Vert_indices = self.All_vertices[self.FacesDensePose[FaceIndex]] - 1
+        p = np.zeros(Vertices.shape[:-2] + (len(FaceIndex), 3))
+        for k, bc in enumerate((bc1, bc2, bc3)):
+            p += Vertices[..., Vert_indices[:, k], :] * np.asarray(bc).ravel()[:, np.newaxis]
+        p[..., FaceIndex < 0, :] = np.nan
+        return p    
   
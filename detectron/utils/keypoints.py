@@ -55,6 +55,56 @@ def get_keypoints():
     return keypoints, keypoint_flip_map
 
 
+# Number of landmarks in the MediaPipe pose layout consumed by the ergonomic
+# risk scorer (DensePoseData/pose_estimation.py)
+NUM_POSE_LANDMARKS = 33
+
+# MediaPipe PoseLandmark index of every COCO keypoint
+POSE_LANDMARK_INDEX = {
+    'nose': 0,
+    'left_eye': 2,
+    'right_eye': 5,
+    'left_ear': 7,
+    'right_ear': 8,
+    'left_shoulder': 11,
+    'right_shoulder': 12,
+    'left_elbow': 13,
+    'right_elbow': 14,
+    'left_wrist': 15,
+    'right_wrist': 16,
+    'left_hip': 23,
+    'right_hip': 24,
+    'left_knee': 25,
+    'right_knee': 26,
+    'left_ankle': 27,
+    'right_ankle': 28
+}
+
+
+def keypoints_to_pose_landmarks(kp_predictions, im_shape, kp_thresh=2.0):
+    """Convert keypoint predictions of all rois, shaped (#rois, 4, #keypoints)
+    as returned by heatmaps_to_keypoints, into a (#rois, NUM_POSE_LANDMARKS, 3)
+    array in the MediaPipe pose layout used by the ergonomic risk scorer.
+
+    x and y are normalized by the image width and height and z is 0. Keypoints
+    with a logit below kp_thresh, and landmarks without a COCO equivalent, are
+    NaN (i.e., missing).
+    """
+    keypoints, _ = get_keypoints()
+    landmark_inds = np.array([POSE_LANDMARK_INDEX[kp] for kp in keypoints])
+    kp_predictions = np.asarray(kp_predictions, dtype=np.float64).reshape(
+        (-1, 4, len(keypoints)))
+
+    landmarks = np.full(
+        (kp_predictions.shape[0], NUM_POSE_LANDMARKS, 3), np.nan)
+    coords = np.zeros((kp_predictions.shape[0], len(keypoints), 3))
+    coords[:, :, 0] = kp_predictions[:, 0, :] / im_shape[1]
+    coords[:, :, 1] = kp_predictions[:, 1, :] / im_shape[0]
+    coords[kp_predictions[:, 2, :] < kp_thresh] = np.nan
+    landmarks[:, landmark_inds] = coords
+    return landmarks
+
+
 def get_person_class_index():
     """Index of the person class in COCO."""
     return 1
@@ -0,0 +1,169 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+##############################################################################
+
+"""Run Keypoint R-CNN inference on a single image or all images with a certain
+extension (e.g., .jpg) in a folder and save the person keypoints as pose
+landmarks for ergonomic risk scoring (see DensePoseData/score_detectron_landmarks.py).
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from collections import defaultdict
+import argparse
+import cv2  # NOQA (Must import before importing caffe2 due to bug in cv2)
+import glob
+import logging
+import numpy as np
+import os
+import sys
+import time
+
+from caffe2.python import workspace
+
+from detectron.core.config import assert_and_infer_cfg
+from detectron.core.config import cfg
+from detectron.core.config import merge_cfg_from_file
+from detectron.utils.io import cache_url
+from detectron.utils.logging import setup_logging
+from detectron.utils.timer import Timer
+import detectron.core.test_engine as infer_engine
+import detectron.utils.c2 as c2_utils
+import detectron.utils.keypoints as keypoint_utils
+
+c2_utils.import_detectron_ops()
+
+# OpenCL may be enabled by default in OpenCV3; disable it because it's not
+# thread safe and causes unwanted GPU memory allocations.
+cv2.ocl.setUseOpenCL(False)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Keypoint R-CNN inference to pose landmarks'
+    )
+    parser.add_argument(
+        '--cfg',
+        dest='cfg',
+        help='cfg model file (/path/to/model_config.yaml)',
+        default=None,
+        type=str
+    )
+    parser.add_argument(
+        '--wts',
+        dest='weights',
+        help='weights model file (/path/to/model_weights.pkl)',
+        default=None,
+        type=str
+    )
+    parser.add_argument(
+        '--output-file',
+        dest='output_file',
+        help='output landmarks file (default: /tmp/infer_landmarks.npz)',
+        default='/tmp/infer_landmarks.npz',
+        type=str
+    )
+    parser.add_argument(
+        '--image-ext',
+        dest='image_ext',
+        help='image file name extension (default: jpg)',
+        default='jpg',
+        type=str
+    )
+    parser.add_argument(
+        '--score-thresh',
+        dest='score_thresh',
+        help='minimum person detection score (default: 0.7)',
+        default=0.7,
+        type=float
+    )
+    parser.add_argument(
+        '--kp-thresh',
+        dest='kp_thresh',
+        help='minimum keypoint logit; lower keypoints are missing (default: 2)',
+        default=2.0,
+        type=float
+    )
+    parser.add_argument(
+        'im_or_folder', help='image or folder of images', default=None
+    )
+    if len(sys.argv) == 1:
+        parser.print_help()
+        sys.exit(1)
+    return parser.parse_args()
+
+
+def main(args):
+    logger = logging.getLogger(__name__)
+    merge_cfg_from_file(args.cfg)
+    cfg.NUM_GPUS = 1
+    args.weights = cache_url(args.weights, cfg.DOWNLOAD_CACHE)
+    assert_and_infer_cfg(cache_urls=False)
+    assert cfg.MODEL.KEYPOINTS_ON, 'Landmarks require a keypoint model'
+    model = infer_engine.initialize_model_from_cfg(args.weights)
+    person_idx = keypoint_utils.get_person_class_index()
+
+    if os.path.isdir(args.im_or_folder):
+        im_list = sorted(glob.glob(args.im_or_folder + '/*.' + args.image_ext))
+    else:
+        im_list = [args.im_or_folder]
+
+    all_landmarks = []
+    all_boxes = []
+    all_image_inds = []
+    for i, im_name in enumerate(im_list):
+        logger.info('Processing {}'.format(im_name))
+        im = cv2.imread(im_name)
+        timers = defaultdict(Timer)
+        t = time.time()
+        with c2_utils.NamedCudaScope(0):
+            cls_boxes, _, cls_keyps, _ = infer_engine.im_detect_all(
+                model, im, None, timers=timers
+            )
+        logger.info('Inference time: {:.3f}s'.format(time.time() - t))
+
+        boxes = cls_boxes[person_idx]
+        keep = boxes[:, 4] >= args.score_thresh
+        if not np.any(keep):
+            continue
+        # All persons of the image at once: (#persons, 4, #keypoints)
+        kps = np.array(cls_keyps[person_idx])[keep]
+        all_landmarks.append(
+            keypoint_utils.keypoints_to_pose_landmarks(
+                kps, im.shape, kp_thresh=args.kp_thresh
+            )
+        )
+        all_boxes.append(boxes[keep])
+        all_image_inds.append(np.full(kps.shape[0], i, dtype=np.int64))
+
+    num_landmarks = keypoint_utils.NUM_POSE_LANDMARKS
+    landmarks = np.concatenate(
+        all_landmarks or [np.empty((0, num_landmarks, 3))]
+    )
+    np.savez(
+        args.output_file,
+        landmarks=landmarks,
+        boxes=np.concatenate(all_boxes or [np.empty((0, 5))]),
+        image_index=np.concatenate(
+            all_image_inds or [np.empty(0, dtype=np.int64)]
+        ),
+        image_names=np.array(im_list)
+    )
+    logger.info(
+        'Wrote {} person landmarks from {} images to {}'.format(
+            landmarks.shape[0], len(im_list), args.output_file
+        )
+    )
+
+
+if __name__ == '__main__':
+    workspace.GlobalInit(['caffe2', '--caffe2_log_level=0'])
+    setup_logging(__name__)
+    args = parse_args()
+    main(args)